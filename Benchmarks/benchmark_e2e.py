@@ -0,0 +1,323 @@
+# Benchmark de ponta a ponta dos quatro servidores
+#
+# Para cada tamanho de catálogo (1k, 10k, 100k e 1M livros por omissão) gera
+# um livros.xml, arranca os quatro servidores como subprocessos sobre esse
+# ficheiro (como no docker-compose) e mede, com o ClienteLivrosAsync, cada
+# operação por esta ordem:
+#   inserir (REST) -> atualizar (SOAP) -> procurar (gRPC) -> eliminar (GraphQL)
+# A eliminação remove os livros inseridos, por isso o catálogo volta ao
+# tamanho inicial. Por operação regista pedidos/s, latências p50/p99 e o pico
+# de memória (RSS) do servidor, somando todos os processos (gunicorn).
+#
+# Os resultados são gravados em JSON; com --comparar o resultado é comparado
+# com uma execução anterior e o programa termina com código 1 se alguma
+# operação piorar mais do que a tolerância.
+#
+# Uso: python Benchmarks/benchmark_e2e.py [--tamanhos 1000,10000] [--pedidos 2000]
+#                                         [--concorrencia 32] [--saida e2e.json]
+#                                         [--comparar anterior.json] [--armazenamento sqlite]
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(RAIZ, "Servidor", "Comum"))
+sys.path.append(os.path.join(RAIZ, "Cliente"))
+
+from armazenamento import abrir_catalogo
+from livros_cliente import ClienteLivrosAsync
+
+# Servidor -> (pasta, script, porta)
+SERVIDORES = {
+    "rest": ("Rest", "servidor_REST.py", 5000),
+    "soap": ("Soap", "servidor_soap.py", 8000),
+    "grpc": ("gRPC", "servidor_Grpc.py", 50051),
+    "graphql": ("graphQL", "servidor_GraphQL.py", 4000),
+}
+
+# Operação medida -> servidor que a serve
+OPERACOES = {
+    "inserir_rest": "rest",
+    "atualizar_soap": "soap",
+    "procurar_grpc": "grpc",
+    "eliminar_graphql": "graphql",
+}
+
+TAMANHOS = "1000,10000,100000,1000000"
+
+
+# Armazenamento -> ficheiro do catálogo na pasta de cada execução
+FICHEIROS = {"xml": "livros.xml", "sqlite": "livros.db"}
+
+
+def criar_catalogo(caminho, quantidade):
+    """Gera um catálogo (XML ou SQLite, pela extensão) com `quantidade` livros."""
+    catalogo = abrir_catalogo(caminho)
+    catalogo.aplicar(("inserir", f"Livro {i}", f"Autor {i % 1000}", i % 100 + 0.99) for i in range(quantidade))
+    catalogo.compactar()
+    catalogo.fechar()
+
+
+def esperar_porta(porta, limite=120):
+    fim = time.time() + limite
+    while time.time() < fim:
+        try:
+            socket.create_connection(("127.0.0.1", porta), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"O servidor na porta {porta} não arrancou")
+
+
+def rss_arvore(pid):
+    """RSS (bytes) do processo e de todos os descendentes, lido do /proc (Linux)."""
+    filhos = {}
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as f:
+                # O nome do processo pode ter espaços: o ppid vem depois do último ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        filhos.setdefault(ppid, []).append(int(entrada))
+    total = 0
+    pendentes = [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        pendentes.extend(filhos.get(atual, ()))
+        try:
+            with open(f"/proc/{atual}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            pass
+    return total
+
+
+class MonitorMemoria(threading.Thread):
+    """Amostra periodicamente a RSS de cada servidor e guarda o pico desde o último reinício."""
+
+    def __init__(self, processos, intervalo=0.05):
+        super().__init__(daemon=True)
+        self.processos = processos  # servidor -> subprocess.Popen
+        self.intervalo = intervalo
+        self.picos = {servidor: 0 for servidor in processos}
+        self._parar = threading.Event()
+
+    def amostrar(self):
+        for servidor, processo in self.processos.items():
+            self.picos[servidor] = max(self.picos[servidor], rss_arvore(processo.pid))
+
+    def reiniciar(self):
+        self.picos = {servidor: 0 for servidor in self.processos}
+        self.amostrar()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            self.amostrar()
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+def arrancar_servidores(caminho, armazenamento, modo):
+    ambiente = dict(os.environ, LIVROS_ARMAZENAMENTO=armazenamento, SERVIDOR_MODO=modo,
+                    GRPC_ENDERECO="127.0.0.1:50051")
+    ambiente["LIVROS_SQLITE" if armazenamento == "sqlite" else "LIVROS_XML"] = caminho
+    processos = {}
+    try:
+        for servidor, (pasta, script, porta) in SERVIDORES.items():
+            processos[servidor] = subprocess.Popen(
+                [sys.executable, script], cwd=os.path.join(RAIZ, "Servidor", pasta), env=ambiente,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+        for _, _, porta in SERVIDORES.values():
+            esperar_porta(porta)
+    except BaseException:
+        parar_servidores(processos)
+        raise
+    return processos
+
+
+def parar_servidores(processos):
+    for processo in processos.values():
+        processo.terminate()
+    for processo in processos.values():
+        try:
+            processo.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            processo.kill()
+            processo.wait()
+
+
+def percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))]
+
+
+async def medir_operacao(funcao, argumentos, concorrencia):
+    """Chama funcao(*args) para cada elemento de `argumentos` com `concorrencia` pedidos em curso.
+
+    Devolve (duração em s, latências em ms, falhas, erros).
+    """
+    latencias = []
+    falhas = erros = 0
+    fila = iter(argumentos)
+
+    async def trabalhador():
+        nonlocal falhas, erros
+        for args in fila:
+            inicio = time.perf_counter()
+            try:
+                resultado = await funcao(*args)
+            except Exception:
+                erros += 1
+                continue
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            if not resultado.sucesso:
+                falhas += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return time.perf_counter() - inicio, latencias, falhas, erros
+
+
+async def medir_tamanho(livros, args, monitor):
+    resultados = {}
+    aleatorio = random.Random(livros)
+    novos = [f"Novo {i}" for i in range(args.pedidos)]
+    async with ClienteLivrosAsync("http://127.0.0.1:5000/REST", "http://127.0.0.1:8000/soap",
+                                  "127.0.0.1:50051", "http://127.0.0.1:4000/graphql",
+                                  ligacoes=args.concorrencia) as cliente:
+        # Aquecimento: o primeiro pedido de cada servidor carrega o catálogo
+        await cliente.procurar("Livro 0")
+        await cliente.atualizar("Livro 0", preco=0.99)
+        await cliente.eliminar("Inexistente")
+        monitor.reiniciar()
+        rss_inicial = dict(monitor.picos)
+
+        operacoes = {
+            "inserir_rest": (cliente.inserir, [(nome, "Autor", 9.99) for nome in novos]),
+            "atualizar_soap": (cliente.atualizar,
+                               [(f"Livro {aleatorio.randrange(livros)}", None, aleatorio.randrange(100) + 0.5)
+                                for _ in range(args.pedidos)]),
+            "procurar_grpc": (cliente.procurar,
+                              [(f"Livro {aleatorio.randrange(livros)}",) for _ in range(args.pedidos)]),
+            "eliminar_graphql": (cliente.eliminar, [(nome,) for nome in novos]),
+        }
+        for operacao, (funcao, argumentos) in operacoes.items():
+            servidor = OPERACOES[operacao]
+            monitor.reiniciar()
+            duracao, latencias, falhas, erros = await medir_operacao(funcao, argumentos, args.concorrencia)
+            monitor.amostrar()
+            latencias.sort()
+            resultados[operacao] = {
+                "pedidos": len(argumentos),
+                "falhas": falhas,
+                "erros": erros,
+                "pedidos_por_segundo": round(len(latencias) / duracao, 1) if duracao else 0.0,
+                "p50_ms": round(percentil(latencias, 50), 2),
+                "p99_ms": round(percentil(latencias, 99), 2),
+                "rss_pico_mib": round(monitor.picos[servidor] / 2 ** 20, 1),
+                "rss_inicial_mib": round(rss_inicial[servidor] / 2 ** 20, 1),
+            }
+            r = resultados[operacao]
+            print(f"{livros:>9} {operacao:<17} {r['pedidos_por_segundo']:>10.1f} {r['p50_ms']:>9.2f} "
+                  f"{r['p99_ms']:>9.2f} {r['rss_pico_mib']:>9.1f} {falhas + erros:>7}", flush=True)
+    return resultados
+
+
+# Métrica -> sentido em que é melhor (1 = maior, -1 = menor)
+METRICAS = {"pedidos_por_segundo": 1, "p99_ms": -1, "rss_pico_mib": -1}
+
+
+def comparar(atual, anterior, tolerancia):
+    """Lista as métricas que pioraram mais do que `tolerancia` (fração) face a `anterior`."""
+    regressoes = []
+    antes = {r["livros"]: r["operacoes"] for r in anterior["resultados"]}
+    for resultado in atual["resultados"]:
+        for operacao, depois in resultado["operacoes"].items():
+            base = antes.get(resultado["livros"], {}).get(operacao)
+            if base is None:
+                continue
+            for metrica, sentido in METRICAS.items():
+                if sentido * (depois[metrica] - base[metrica]) < -tolerancia * base[metrica]:
+                    regressoes.append(f"{resultado['livros']} livros, {operacao}: {metrica} "
+                                      f"{base[metrica]} -> {depois[metrica]}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta dos servidores REST, SOAP, gRPC e GraphQL.")
+    parser.add_argument("--tamanhos", default=TAMANHOS, help=f"livros no catálogo (omissão: {TAMANHOS})")
+    parser.add_argument("--pedidos", type=int, default=2000, help="pedidos por operação (omissão: 2000)")
+    parser.add_argument("--concorrencia", type=int, default=32, help="pedidos em simultâneo (omissão: 32)")
+    parser.add_argument("--modo", default="producao", choices=("producao", "desenvolvimento"),
+                        help="SERVIDOR_MODO dos servidores Flask")
+    parser.add_argument("--armazenamento", default="xml", choices=tuple(FICHEIROS),
+                        help="LIVROS_ARMAZENAMENTO dos servidores (omissão: xml)")
+    parser.add_argument("--saida", default="benchmark_e2e.json", help="ficheiro JSON dos resultados")
+    parser.add_argument("--comparar", metavar="ANTERIOR", help="JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.10,
+                        help="piora admitida face à execução anterior (omissão: 0.10)")
+    args = parser.parse_args()
+
+    relatorio = {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "maquina": {"sistema": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "parametros": {"pedidos": args.pedidos, "concorrencia": args.concorrencia, "modo": args.modo,
+                       "armazenamento": args.armazenamento},
+        "resultados": [],
+    }
+    print(f"{'livros':>9} {'operacao':<17} {'pedidos/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'RSS MiB':>9} {'falhas':>7}")
+    for livros in (int(t) for t in args.tamanhos.split(",")):
+        pasta = tempfile.mkdtemp(prefix=f"bench-e2e-{livros}-")
+        try:
+            caminho = os.path.join(pasta, FICHEIROS[args.armazenamento])
+            inicio = time.perf_counter()
+            criar_catalogo(caminho, livros)
+            print(f"Catálogo de {livros} livros criado em {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+
+            processos = arrancar_servidores(caminho, args.armazenamento, args.modo)
+            monitor = MonitorMemoria(processos)
+            monitor.start()
+            try:
+                operacoes = asyncio.run(medir_tamanho(livros, args, monitor))
+            finally:
+                monitor.parar()
+                parar_servidores(processos)
+            relatorio["resultados"].append({"livros": livros, "operacoes": operacoes})
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+        # Grava após cada tamanho para não perder resultados se uma execução longa for interrompida
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            regressoes = comparar(relatorio, json.load(f), args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO: {regressao}")
+        if regressoes:
+            sys.exit(1)
+        print("Sem regressões face à execução anterior.")
+
+
+if __name__ == "__main__":
+    main()
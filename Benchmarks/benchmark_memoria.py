@@ -0,0 +1,146 @@
+# Benchmark da memória ocupada pelo catálogo XML carregado
+#
+# Gera um livros.xml com N livros (1M por omissão) e carrega-o, cada modo num
+# processo novo, medindo o tempo de carregamento, o pico de RSS durante a
+# leitura, a RSS que fica depois e a parte dela que é privada do processo (a
+# que cada processo servidor paga; o resto são páginas da cache partilhadas):
+#   etree     - ET.parse da árvore inteira + dict {nome normalizado: Livro}
+#               (a leitura do catálogo antes da TabelaLivros)
+#   iterparse - leitura incremental + o mesmo dict de Livro
+#   catalogo  - CatalogoLivros sem snapshot binário: leitura incremental do XML
+#               para a TabelaLivros (colunas)
+#   binario   - CatalogoLivros com o livros.xml.bin já gerado, aberto com mmap
+#
+# Uso: python Benchmarks/benchmark_memoria.py [--livros 1000000] [--modos etree,catalogo]
+import argparse
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Servidor", "Comum"))
+os.environ.setdefault("LIVROS_COMPACTAR_INTERVALO", "0")
+os.environ.setdefault("METRICAS", "0")
+
+MODOS = ("etree", "iterparse", "catalogo", "binario")
+
+
+def gerar_xml(caminho, quantidade):
+    """Escreve um snapshot com `quantidade` livros (1000 autores, 100 preços)."""
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='utf-8'?>\n<livros seq=\"0\">")
+        for i in range(quantidade):
+            f.write(f"<livro><nome>{escape(f'Livro de teste número {i}')}</nome>"
+                    f"<autor>Autor {i % 1000}</autor><preco>{i % 100 + 0.99}</preco></livro>")
+        f.write("</livros>")
+
+
+def rss_atual():
+    """Devolve (RSS, RSS privada) do processo."""
+    with open("/proc/self/statm") as f:
+        campos = f.read().split()
+    pagina = os.sysconf("SC_PAGE_SIZE")
+    return int(campos[1]) * pagina, (int(campos[1]) - int(campos[2])) * pagina
+
+
+def carregar_etree(caminho):
+    from armazenamento import Livro, normalizar_nome
+
+    root = ET.parse(caminho).getroot()
+    livros = {}
+    for livro in root.findall("livro"):
+        nome = livro.findtext("nome", "").strip()
+        chave = normalizar_nome(nome)
+        if chave in livros:
+            continue
+        autor = livro.findtext("autor", "").strip()
+        preco = float(livro.findtext("preco", "0").strip() or 0)
+        livros[chave] = Livro(nome, autor, preco)
+    return livros
+
+
+def carregar_iterparse(caminho):
+    from armazenamento import Livro, normalizar_nome
+
+    livros = {}
+    raiz = None
+    for evento, elem in ET.iterparse(caminho, events=("start", "end")):
+        if raiz is None:
+            raiz = elem
+        elif evento == "end" and elem.tag == "livro":
+            nome = elem.findtext("nome", "").strip()
+            chave = normalizar_nome(nome)
+            if chave not in livros:
+                livros[chave] = Livro(nome, elem.findtext("autor", "").strip(),
+                                      float(elem.findtext("preco", "0").strip() or 0))
+            raiz.clear()
+    return livros
+
+
+def carregar_catalogo(caminho):
+    from armazenamento import CatalogoLivros
+
+    catalogo = CatalogoLivros(caminho)
+    catalogo.sincronizar()
+    return catalogo
+
+
+CARREGAR = {"etree": carregar_etree, "iterparse": carregar_iterparse,
+            "catalogo": carregar_catalogo, "binario": carregar_catalogo}
+
+
+def medir(modo, caminho):
+    """Corre num processo novo: carrega o catálogo e devolve as medições em JSON."""
+    os.environ["LIVROS_SNAPSHOT_BINARIO"] = "1" if modo == "binario" else "0"
+    # Os módulos são carregados antes da medição inicial: as importações não contam para o catálogo
+    importlib.import_module("armazenamento")
+
+    inicial, inicial_privada = rss_atual()
+    inicio = time.perf_counter()
+    catalogo = CARREGAR[modo](caminho)
+    duracao = time.perf_counter() - inicio
+    final, final_privada = rss_atual()
+    # ru_maxrss vem em KiB no Linux
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"modo": modo, "livros": len(catalogo), "segundos": duracao, "inicial": inicial,
+                      "pico": pico, "final": final, "privada": final_privada - inicial_privada}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--livros", type=int, default=1_000_000)
+    parser.add_argument("--modos", default=",".join(MODOS))
+    parser.add_argument("--medir", choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument("--ficheiro", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.medir:
+        medir(args.medir, args.ficheiro)
+        return
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "livros.xml")
+        gerar_xml(caminho, args.livros)
+        print(f"{args.livros} livros, {os.path.getsize(caminho) / 2**20:.0f} MiB em disco\n")
+        print(f"{'modo':<10} {'tempo':>8} {'pico RSS':>10} {'RSS final':>10} {'bytes/livro':>12} "
+              f"{'privados':>9}")
+        for modo in args.modos.split(","):
+            comando = [sys.executable, __file__, "--medir", modo, "--ficheiro", caminho]
+            if modo == "binario" and not os.path.exists(caminho + ".bin"):
+                # O primeiro carregamento lê o XML e gera o snapshot binário
+                subprocess.run(comando, check=True, capture_output=True)
+            saida = subprocess.run(comando, check=True, capture_output=True, text=True).stdout
+            r = json.loads(saida.strip().splitlines()[-1])
+            livros = max(r["livros"], 1)
+            print(f"{modo:<10} {r['segundos']:>7.2f}s {r['pico'] / 2**20:>8.0f}MiB "
+                  f"{r['final'] / 2**20:>8.0f}MiB {(r['final'] - r['inicial']) / livros:>12.0f} "
+                  f"{r['privada'] / livros:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
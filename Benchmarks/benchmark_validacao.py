@@ -0,0 +1,81 @@
+# Micro-benchmark da validação JSON Schema do servidor REST
+#
+# Compara três formas de validar o corpo de POST /REST:
+#   antes      - jsonschema.validate(instance, schema) em cada pedido
+#   compilado  - validador criado uma vez no arranque (validador_livro)
+#   rapido     - função gerada a partir do schema (validar_livro)
+# Mede validações/s isoladas e pedidos/s através do cliente de testes do Flask.
+#
+# Uso: python Benchmarks/benchmark_validacao.py [--pedidos 5000]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Servidor", "Rest"))
+os.environ.setdefault("LIVROS_DIARIO_FSYNC", "0")
+# Catálogo novo em cada execução, definido antes de importar o servidor (que o lê do ambiente):
+# os nomes inseridos repetem-se entre execuções e o /data/livros.xml não é tocado
+_dados = tempfile.mkdtemp(prefix="bench-validacao-")
+os.environ["LIVROS_XML"] = os.path.join(_dados, "livros.xml")
+os.environ["LIVROS_SQLITE"] = os.path.join(_dados, "livros.db")
+
+from jsonschema import validate, ValidationError
+from jsonschema.exceptions import best_match
+import servidor_REST
+
+
+def validar_antes(livro):
+    try:
+        validate(instance=livro, schema=servidor_REST.book_schema)
+    except ValidationError as e:
+        return e.message
+    return None
+
+
+def validar_compilado(livro):
+    falha = best_match(servidor_REST.validador_livro.iter_errors(livro))
+    return None if falha is None else falha.message
+
+
+MODOS = {
+    "antes": validar_antes,
+    "compilado": validar_compilado,
+    "rapido": servidor_REST.validar_livro,
+}
+
+
+def medir_validacoes(validar, quantidade):
+    livro = {"nome": "Livro", "autor": "Autor", "preco": 10.5}
+    inicio = time.perf_counter()
+    for _ in range(quantidade):
+        validar(livro)
+    return quantidade / (time.perf_counter() - inicio)
+
+
+def medir_pedidos(modo, validar, quantidade):
+    servidor_REST.validar_livro = validar
+    cliente = servidor_REST.app.test_client()
+    inicio = time.perf_counter()
+    for i in range(quantidade):
+        resposta = cliente.post("/REST", json={"nome": f"{modo}-{i}", "autor": "Autor", "preco": 10.5})
+        assert resposta.status_code == 201, resposta.get_json()
+    return quantidade / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--validacoes", type=int, default=50000)
+    parser.add_argument("--pedidos", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{'modo':<10} {'validações/s':>14} {'pedidos/s':>12}")
+    for modo, validar in MODOS.items():
+        por_segundo = medir_validacoes(validar, args.validacoes)
+        pedidos = medir_pedidos(modo, validar, args.pedidos)
+        print(f"{modo:<10} {por_segundo:>14.0f} {pedidos:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# Benchmark dos servidores Flask: app.run (desenvolvimento) vs gunicorn (produção)
+#
+# Para cada servidor (REST, SOAP e GraphQL) e cada modo, arranca o servidor
+# como subprocesso sobre uma cópia de um catálogo de teste e mede pedidos/s
+# com vários processos cliente, cada um com várias threads e ligações
+# keep-alive (requests.Session).
+#
+# Uso: python Benchmarks/benchmark_wsgi.py [--duracao 10] [--clientes 4] [--threads 8]
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(RAIZ, "Servidor", "Comum"))
+
+from armazenamento import CatalogoLivros
+
+SERVIDORES = {
+    "rest": ("Rest", "servidor_REST.py", 5000),
+    "soap": ("Soap", "servidor_soap.py", 8000),
+    "graphql": ("graphQL", "servidor_GraphQL.py", 4000),
+}
+
+ENVELOPE_SOAP = (
+    "<Envelope><Body><LivroUpdateRequest><nome>{nome}</nome><preco>{preco}</preco>"
+    "</LivroUpdateRequest></Body></Envelope>"
+)
+MUTACAO_GRAPHQL = 'mutation {{ eliminarLivro(nome: "{nome}") {{ sucesso mensagem }} }}'
+
+
+def pedido(servidor, sessao, porta, numero, livros):
+    """Faz um pedido da operação de cada servidor (o número torna os nomes únicos)."""
+    if servidor == "rest":
+        return sessao.post(f"http://127.0.0.1:{porta}/REST",
+                           json={"nome": f"Novo {numero}", "autor": "Autor", "preco": 9.99})
+    if servidor == "soap":
+        corpo = ENVELOPE_SOAP.format(nome=f"Livro {random.randrange(livros)}", preco=numero % 100)
+        return sessao.post(f"http://127.0.0.1:{porta}/soap", data=corpo,
+                           headers={"Content-Type": "application/xml"})
+    return sessao.post(f"http://127.0.0.1:{porta}/graphql",
+                       json={"query": MUTACAO_GRAPHQL.format(nome=f"Livro {numero}")})
+
+
+def cliente(servidor, porta, indice, clientes, threads, duracao, livros, fila):
+    """Processo cliente: `threads` threads a fazer pedidos até ao fim da duração."""
+    fim = time.perf_counter() + duracao
+    contagens = []
+
+    def trabalhador(t):
+        sessao = requests.Session()
+        feitos = 0
+        passo = clientes * threads
+        numero = indice * threads + t
+        while time.perf_counter() < fim:
+            pedido(servidor, sessao, porta, numero, livros).raise_for_status()
+            feitos += 1
+            numero += passo
+        contagens.append(feitos)
+
+    trabalhadores = [threading.Thread(target=trabalhador, args=(t,)) for t in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    for t in trabalhadores:
+        t.join()
+    fila.put(sum(contagens))
+
+
+def esperar_porta(porta, limite=30):
+    fim = time.time() + limite
+    while time.time() < fim:
+        try:
+            socket.create_connection(("127.0.0.1", porta), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"O servidor na porta {porta} não arrancou")
+
+
+def medir(servidor, modo, catalogo_base, args):
+    pasta, script, porta = SERVIDORES[servidor]
+    dados = tempfile.mkdtemp(prefix=f"bench-wsgi-{servidor}-")
+    shutil.copy(catalogo_base, os.path.join(dados, "livros.xml"))
+    ambiente = dict(os.environ, LIVROS_XML=os.path.join(dados, "livros.xml"), SERVIDOR_MODO=modo)
+    processo = subprocess.Popen([sys.executable, script], cwd=os.path.join(RAIZ, "Servidor", pasta),
+                                env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        esperar_porta(porta)
+        fila = multiprocessing.Queue()
+        clientes = [
+            multiprocessing.Process(target=cliente, args=(servidor, porta, i, args.clientes, args.threads,
+                                                          args.duracao, args.livros, fila))
+            for i in range(args.clientes)
+        ]
+        for c in clientes:
+            c.start()
+        total = sum(fila.get() for _ in clientes)
+        for c in clientes:
+            c.join()
+        return total / args.duracao
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duracao", type=float, default=10)
+    parser.add_argument("--clientes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--livros", type=int, default=20_000)
+    parser.add_argument("--servidores", default="rest,soap,graphql")
+    args = parser.parse_args()
+
+    # Catálogo de teste partilhado por todas as execuções (copiado para cada uma)
+    catalogo_base = os.path.join(tempfile.mkdtemp(prefix="bench-wsgi-"), "livros.xml")
+    catalogo = CatalogoLivros(catalogo_base)
+    catalogo.aplicar(("inserir", f"Livro {i}", f"Autor {i % 100}", 10.0) for i in range(args.livros))
+    catalogo.compactar()
+
+    print(f"{'servidor':<9} {'modo':<15} {'pedidos/s':>10}")
+    for servidor in args.servidores.split(","):
+        for modo in ("desenvolvimento", "producao"):
+            print(f"{servidor:<9} {modo:<15} {medir(servidor, modo, catalogo_base, args):>10.0f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
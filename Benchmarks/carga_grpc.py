@@ -0,0 +1,117 @@
+# Teste de carga do serviço gRPC: servidor com pool de threads vs grpc.aio
+#
+# Cria um catálogo local (100 mil livros por omissão), arranca os dois modos
+# do servidor_Grpc.py como subprocessos e mede, para cada um, pedidos/s e
+# latências p50/p99 de ProcurarLivro com muitos pedidos em simultâneo.
+#
+# Uso: python Benchmarks/carga_grpc.py [--livros 100000] [--concorrencia 64] [--duracao 10]
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PASTA_GRPC = os.path.join(RAIZ, "Servidor", "gRPC")
+sys.path.append(PASTA_GRPC)
+sys.path.append(os.path.join(RAIZ, "Servidor", "Comum"))
+
+import grpc
+import livro_pb2
+import livro_pb2_grpc
+from armazenamento import CatalogoLivros
+
+
+def criar_catalogo(caminho, quantidade):
+    """Gera um livros.xml com `quantidade` livros (snapshot já compactado)."""
+    catalogo = CatalogoLivros(caminho)
+    catalogo.aplicar(("inserir", f"Livro {i}", f"Autor {i % 1000}", i % 100 + 0.99) for i in range(quantidade))
+    catalogo.compactar()
+
+
+def arrancar_servidor(modo, porta, caminho, trabalhadores):
+    ambiente = dict(
+        os.environ,
+        LIVROS_XML=caminho,
+        GRPC_MODO=modo,
+        GRPC_ENDERECO=f"127.0.0.1:{porta}",
+        GRPC_TRABALHADORES=str(trabalhadores),
+    )
+    processo = subprocess.Popen([sys.executable, "servidor_Grpc.py"], cwd=PASTA_GRPC, env=ambiente)
+    with grpc.insecure_channel(f"127.0.0.1:{porta}") as canal:
+        grpc.channel_ready_future(canal).result(timeout=60)
+    return processo
+
+
+async def medir(porta, quantidade, concorrencia, duracao):
+    """Faz pedidos ProcurarLivro durante `duracao` segundos e devolve as latências (s)."""
+    latencias = []
+    erros = 0
+    async with grpc.aio.insecure_channel(f"127.0.0.1:{porta}") as canal:
+        stub = livro_pb2_grpc.LivroServiceStub(canal)
+        # Aquecimento: o primeiro pedido carrega o catálogo no servidor
+        await stub.ProcurarLivro(livro_pb2.LivroRequest(nome="Livro 0"))
+        fim = time.perf_counter() + duracao
+
+        async def trabalhador():
+            nonlocal erros
+            aleatorio = random.Random()
+            while time.perf_counter() < fim:
+                # ~10% dos nomes não existem para incluir respostas NOT_FOUND
+                nome = f"Livro {aleatorio.randrange(int(quantidade * 1.1))}"
+                inicio = time.perf_counter()
+                try:
+                    await stub.ProcurarLivro(livro_pb2.LivroRequest(nome=nome))
+                except grpc.aio.AioRpcError as e:
+                    if e.code() != grpc.StatusCode.NOT_FOUND:
+                        erros += 1
+                        continue
+                latencias.append(time.perf_counter() - inicio)
+
+        await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return latencias, erros
+
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--livros", type=int, default=100_000)
+    parser.add_argument("--concorrencia", type=int, default=64)
+    parser.add_argument("--duracao", type=float, default=10)
+    parser.add_argument("--trabalhadores", type=int, default=10)
+    parser.add_argument("--porta", type=int, default=50161)
+    args = parser.parse_args()
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix="carga-grpc-"), "livros.xml")
+    print(f"A criar catálogo com {args.livros} livros em {caminho}...")
+    criar_catalogo(caminho, args.livros)
+
+    processos = {}
+    try:
+        for deslocamento, modo in enumerate(("threads", "aio")):
+            processos[modo] = arrancar_servidor(modo, args.porta + deslocamento, caminho, args.trabalhadores)
+
+        print(f"{'modo':<8} {'pedidos/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'erros':>6}")
+        for deslocamento, modo in enumerate(("threads", "aio")):
+            latencias, erros = asyncio.run(
+                medir(args.porta + deslocamento, args.livros, args.concorrencia, args.duracao)
+            )
+            latencias.sort()
+            print(
+                f"{modo:<8} {len(latencias) / args.duracao:>10.0f} "
+                f"{percentil(latencias, 0.50) * 1000:>9.2f} {percentil(latencias, 0.99) * 1000:>9.2f} {erros:>6}"
+            )
+    finally:
+        for processo in processos.values():
+            processo.terminate()
+            processo.wait()
+
+
+if __name__ == "__main__":
+    main()
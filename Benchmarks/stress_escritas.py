@@ -0,0 +1,177 @@
+# Teste de stress de escritas concorrentes entre processos
+#
+# Simula os quatro contentores a partilhar o mesmo livros.xml: vários processos
+# inserem, atualizam e eliminam livros ao mesmo tempo (com compactações pelo
+# meio) enquanto outros processos fazem pesquisas. No fim, um processo novo lê
+# o catálogo do disco e confirma que nenhuma alteração se perdeu.
+#
+# Antes disso verifica que, num grupo de pedidos escrito com um só fsync, um
+# pedido inválido falha sozinho e que um ouvinte com erro não faz falhar as
+# escritas.
+#
+# Uso: python Benchmarks/stress_escritas.py [--processos 8] [--livros 300]
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Servidor", "Comum"))
+
+# Compactações frequentes para exercitar a substituição do snapshot durante as escritas
+os.environ.setdefault("LIVROS_COMPACTAR_INTERVALO", "0.05")
+os.environ.setdefault("LIVROS_COMPACTAR_MINIMO", "50")
+
+
+def escritor(caminho, indice, quantidade):
+    """Insere livros próprios, atualiza os pares e elimina os ímpares."""
+    from armazenamento import obter_catalogo
+
+    catalogo = obter_catalogo(caminho)
+    for j in range(quantidade):
+        if not catalogo.inserir(f"P{indice}-L{j}", f"Autor {indice}", j):
+            raise SystemExit(f"inserção rejeitada: P{indice}-L{j}")
+    for j in range(quantidade):
+        if j % 2 == 0:
+            ok = catalogo.atualizar(f"p{indice}-l{j}", None, 1000 * indice + j)
+        else:
+            ok = catalogo.eliminar(f"P{indice}-L{j}")
+        if not ok:
+            raise SystemExit(f"livro desaparecido: P{indice}-L{j}")
+
+
+def leitor(caminho, fim):
+    """Pesquisa continuamente para apanhar leituras de ficheiros a meio de uma escrita."""
+    from armazenamento import obter_catalogo
+
+    catalogo = obter_catalogo(caminho)
+    while not fim.is_set():
+        catalogo.procurar("P0-L0")
+        len(catalogo)
+
+
+def verificar_grupo_misto(caminho):
+    """Um pedido inválido e um válido no mesmo grupo: só o inválido falha."""
+    from armazenamento import CatalogoLivros, _Pedido
+
+    catalogo = CatalogoLivros(caminho)
+
+    def ouvinte_com_erro(chaves):
+        raise RuntimeError("ouvinte com erro (esperado)")
+
+    catalogo.adicionar_ouvinte(ouvinte_com_erro)
+    mau = _Pedido([("inserir", "Mau", "A", 1), ("atualizar", "Mau", None, "não é um preço")])
+    bom = _Pedido([("inserir", "Bom", "A", 1)])
+    with catalogo._lock_escrita, catalogo._bloqueio(exclusivo=True):
+        catalogo._aplicar_lote([mau, bom])
+
+    erros = []
+    if not isinstance(mau.erro, ValueError):
+        erros.append(("erro do pedido inválido", mau.erro))
+    if bom.erro is not None or bom.resultados != [True]:
+        erros.append(("pedido válido", bom.erro, bom.resultados))
+    # O estado em memória e o que está em disco (lido por um catálogo novo) têm o válido e não o inválido
+    for nome, leitor in (("memória", catalogo), ("disco", CatalogoLivros(caminho))):
+        if leitor.procurar("Mau") is not None or leitor.procurar("Bom") is None or leitor._seq != 1:
+            erros.append((nome, leitor.procurar("Mau"), leitor.procurar("Bom"), leitor._seq))
+    return erros
+
+
+def eliminar_e_sair(caminho, nome):
+    """Noutro processo: elimina o livro e termina (fechar() compacta o catálogo à saída)."""
+    from armazenamento import CatalogoLivros
+
+    CatalogoLivros(caminho).eliminar(nome)
+
+
+def verificar_compactacao_incremental(caminho):
+    """Uma alteração compactada por outro processo chega aos assinantes como alteração, sem recomeço."""
+    from armazenamento import CatalogoLivros
+
+    catalogo = CatalogoLivros(caminho)
+    catalogo.aplicar([("inserir", f"Livro {i}", "A", i) for i in range(10)])
+    recebidas = []
+    catalogo.adicionar_ouvinte_alteracoes(lambda alteracoes, seq: recebidas.append((alteracoes, seq)))
+    processo = multiprocessing.get_context("spawn").Process(target=eliminar_e_sair, args=(caminho, "Livro 7"))
+    processo.start()
+    processo.join()
+    if os.path.getsize(caminho + ".diario") and catalogo._assinatura == catalogo._assinatura_ficheiro():
+        return [("o outro processo não compactou o catálogo",)]
+    catalogo.sincronizar()
+    publicadas = [[(a.op, a.seq, a.nome) for a in alteracoes] if alteracoes is not None else None
+                  for alteracoes, _ in recebidas[1:]]
+    return [] if publicadas == [[("eliminar", 11, "Livro 7")]] else [("alterações publicadas", publicadas)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--processos", type=int, default=8)
+    parser.add_argument("--livros", type=int, default=300)
+    parser.add_argument("--leitores", type=int, default=2)
+    args = parser.parse_args()
+
+    erros = verificar_grupo_misto(os.path.join(tempfile.mkdtemp(prefix="stress-livros-"), "livros.xml"))
+    if erros:
+        print(f"FALHA: grupo com um pedido inválido: {erros}")
+        return 1
+    print("OK: um pedido inválido não faz falhar os outros do mesmo grupo")
+
+    erros = verificar_compactacao_incremental(os.path.join(tempfile.mkdtemp(prefix="stress-livros-"), "livros.xml"))
+    if erros:
+        print(f"FALHA: alteração compactada por outro processo: {erros}")
+        return 1
+    print("OK: uma compactação noutro processo não faz recomeçar os assinantes")
+
+    caminho = os.path.join(tempfile.mkdtemp(prefix="stress-livros-"), "livros.xml")
+    contexto = multiprocessing.get_context("spawn")
+    fim = contexto.Event()
+
+    leitores = [contexto.Process(target=leitor, args=(caminho, fim)) for _ in range(args.leitores)]
+    escritores = [contexto.Process(target=escritor, args=(caminho, i, args.livros)) for i in range(args.processos)]
+    inicio = time.perf_counter()
+    for p in leitores + escritores:
+        p.start()
+    for p in escritores:
+        p.join()
+    duracao = time.perf_counter() - inicio
+    fim.set()
+    for p in leitores:
+        p.join()
+
+    falhas = [p.exitcode for p in leitores + escritores if p.exitcode != 0]
+    if falhas:
+        print(f"FALHA: {len(falhas)} processo(s) terminaram com erro")
+        return 1
+
+    # Verificação num catálogo novo, lido apenas a partir do disco
+    from armazenamento import CatalogoLivros
+
+    catalogo = CatalogoLivros(caminho)
+    esperados = {
+        f"P{i}-L{j}": 1000 * i + j
+        for i in range(args.processos)
+        for j in range(0, args.livros, 2)
+    }
+    erros = []
+    for nome, preco in esperados.items():
+        livro = catalogo.procurar(nome)
+        if livro is None or livro.preco != preco:
+            erros.append((nome, livro))
+    if len(catalogo) != len(esperados):
+        erros.append(("total", len(catalogo), len(esperados)))
+    operacoes = args.processos * args.livros * 2
+    catalogo.compactar()
+    if catalogo._seq != operacoes:
+        erros.append(("seq", catalogo._seq, operacoes))
+
+    print(f"{operacoes} operações em {args.processos} processos: {duracao:.2f}s ({operacoes / duracao:.0f} op/s)")
+    if erros:
+        print(f"FALHA: {len(erros)} alteração(ões) perdida(s), por exemplo {erros[:5]}")
+        return 1
+    print("OK: nenhuma alteração perdida")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
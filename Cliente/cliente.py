@@ -1,10 +1,8 @@
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk
-import requests
-import xml.etree.ElementTree as ET
-import grpc
-import livro_pb2
-import livro_pb2_grpc
+from livros_cliente import ClienteLivros
 
 # URLs dos serviços
 SOAP_URL = "http://localhost:8000/soap"
@@ -13,6 +11,32 @@ GRPC_HOST = "localhost"
 GRPC_PORT = 50051
 GRAPHQL_URL = "http://localhost:4000/graphql"
 
+# Cliente dos quatro serviços; reutiliza as ligações (sessões HTTP e canal gRPC)
+cliente = ClienteLivros(REST_URL, SOAP_URL, f"{GRPC_HOST}:{GRPC_PORT}", GRAPHQL_URL)
+
+# Os pedidos correm num pool de threads para a interface nunca bloquear;
+# as respostas voltam à thread do Tk através desta fila
+trabalhadores = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cliente")
+respostas = queue.Queue()
+
+def executar_em_fundo(funcao, *args):
+    """Executa funcao(*args) no pool; a mensagem devolvida é mostrada na interface."""
+    def concluido(futuro):
+        try:
+            respostas.put(futuro.result())
+        except Exception as e:
+            respostas.put(f"Erro inesperado: {str(e)}")
+    trabalhadores.submit(funcao, *args).add_done_callback(concluido)
+
+def verificar_respostas():
+    """Mostra as respostas já recebidas (corre periodicamente na thread do Tk)."""
+    while True:
+        try:
+            mostrar_resposta(respostas.get_nowait())
+        except queue.Empty:
+            break
+    root.after(50, verificar_respostas)
+
 # Função para mostrar resposta no widget de texto
 def mostrar_resposta(mensagem):
     text_resposta.configure(state="normal")
@@ -43,17 +67,17 @@ def enviar_livro():
         return
 
     livro = {"nome": nome, "autor": autor, "preco": preco}
+    executar_em_fundo(pedido_rest, livro)
+    limpar_campos()
 
+def pedido_rest(livro):
     try:
-        resposta = requests.post(REST_URL, json=livro)
-        if resposta.status_code == 201:
-            mostrar_resposta(f"[REST] Livro inserido com sucesso: {livro}")
-        else:
-            erro = resposta.json().get('erro', 'Erro desconhecido')
-            mostrar_resposta(f"[REST] Erro: {erro}")
+        resultado = cliente.inserir(livro["nome"], livro["autor"], livro["preco"])
+        if resultado.sucesso:
+            return f"[REST] Livro inserido com sucesso: {livro}"
+        return f"[REST] Erro: {resultado.mensagem}"
     except Exception as e:
-        mostrar_resposta(f"[REST] Erro de comunicação: {str(e)}")
-    limpar_campos()
+        return f"[REST] Erro de comunicação: {str(e)}"
 
 # Modificar livro via SOAP
 def modificar_livro():
@@ -73,28 +97,17 @@ def modificar_livro():
             mostrar_resposta("[SOAP] Erro: O preço deve ser um número.")
             return
 
-    # Criar pedido SOAP manualmente
-    envelope = ET.Element("Envelope")
-    body = ET.SubElement(envelope, "Body")
-    req = ET.SubElement(body, "LivroUpdateRequest")
-    ET.SubElement(req, "nome").text = nome
-    if autor:
-        ET.SubElement(req, "autor").text = autor
-    if preco is not None:
-        ET.SubElement(req, "preco").text = str(preco)
-
-    xml_str = ET.tostring(envelope, encoding='utf-8')
-    headers = {"Content-Type": "application/xml"}
+    executar_em_fundo(pedido_soap, nome, autor, preco)
+    limpar_campos()
 
+def pedido_soap(nome, autor, preco):
     try:
-        resposta = requests.post(SOAP_URL, data=xml_str, headers=headers)
-        if resposta.status_code == 200 and "sucesso" in resposta.text.lower():
-            mostrar_resposta(f"[SOAP] Livro modificado: {nome}, Autor: {autor}, Preço: {preco}")
-        else:
-            mostrar_resposta(f"[SOAP] Falha ao modificar livro: {resposta.text}")
+        resultado = cliente.atualizar(nome, autor or None, preco)
+        if resultado.sucesso:
+            return f"[SOAP] Livro modificado: {nome}, Autor: {autor}, Preço: {preco}"
+        return f"[SOAP] Falha ao modificar livro: {resultado.mensagem}"
     except Exception as e:
-        mostrar_resposta(f"[SOAP] Erro de comunicação: {str(e)}")
-    limpar_campos()
+        return f"[SOAP] Erro de comunicação: {str(e)}"
 
 # Procurar livro via gRPC
 def procurar_livro():
@@ -103,19 +116,19 @@ def procurar_livro():
         mostrar_resposta("[gRPC] Erro: Introduza o nome do livro.")
         return
 
-    try:
-        with grpc.insecure_channel(f"{GRPC_HOST}:{GRPC_PORT}") as channel:
-            stub = livro_pb2_grpc.LivroServiceStub(channel)
-            request = livro_pb2.LivroRequest(nome=nome)
-            response = stub.ProcurarLivro(request)
-
-            resultado = f"[gRPC] Resultado:\nNome: {response.nome}\nAutor: {response.autor}\nPreço: {response.preco:.2f}€"
-            mostrar_resposta(resultado)
-    except grpc.RpcError as e:
-        erro = e.details() if hasattr(e, 'details') else str(e)
-        mostrar_resposta(f"[gRPC] Erro: {erro}")
+    executar_em_fundo(pedido_grpc, nome)
     limpar_campos()
 
+def pedido_grpc(nome):
+    try:
+        resultado = cliente.procurar(nome)
+        if not resultado.sucesso:
+            return f"[gRPC] Erro: {resultado.mensagem}"
+        livro = resultado.livro
+        return f"[gRPC] Resultado:\nNome: {livro.nome}\nAutor: {livro.autor}\nPreço: {livro.preco:.2f}€"
+    except Exception as e:
+        return f"[gRPC] Erro: {str(e)}"
+
 # Eliminar livro via GraphQL
 def eliminar_livro():
     nome = entry_nome.get().strip()
@@ -123,31 +136,17 @@ def eliminar_livro():
         mostrar_resposta("[GraphQL] Erro: Introduza o nome do livro.")
         return
 
-    query = {
-        "query": f"""
-        mutation {{
-            eliminarLivro(nome: \"{nome}\") {{
-                sucesso
-                mensagem
-            }}
-        }}
-        """
-    }
+    executar_em_fundo(pedido_graphql, nome)
+    limpar_campos()
 
+def pedido_graphql(nome):
     try:
-        resposta = requests.post(GRAPHQL_URL, json=query)
-        dados = resposta.json()
-
-        if "errors" in dados:
-            erro = dados['errors'][0]['message']
-            mostrar_resposta(f"[GraphQL] Erro: {erro}")
-            return
-
-        resultado = dados["data"]["eliminarLivro"]
-        mostrar_resposta(f"[GraphQL] {resultado['mensagem']}")
+        resultado = cliente.eliminar(nome)
+        if not resultado.sucesso and resultado.mensagem != "Livro não encontrado.":
+            return f"[GraphQL] Erro: {resultado.mensagem}"
+        return f"[GraphQL] {resultado.mensagem}"
     except Exception as e:
-        mostrar_resposta(f"[GraphQL] Erro de comunicação: {str(e)}")
-    limpar_campos()
+        return f"[GraphQL] Erro de comunicação: {str(e)}"
 
 #==============================================
 # Interface Gráfica (com campos partilhados)
@@ -185,4 +184,12 @@ text_resposta.grid(row=7, column=0, columnspan=2, pady=10, sticky="nsew")
 frame.columnconfigure(1, weight=1)
 frame.rowconfigure(7, weight=1)
 
+# Ao fechar a janela, cancela os pedidos pendentes e fecha as ligações
+def fechar():
+    trabalhadores.shutdown(wait=False, cancel_futures=True)
+    cliente.fechar()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", fechar)
+root.after(50, verificar_respostas)
 root.mainloop()
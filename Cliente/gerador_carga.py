@@ -0,0 +1,258 @@
+# Gerador de carga para os quatro serviços (sem interface gráfica)
+#
+# Usa o ClienteLivrosAsync: um único processo mantém muitos pedidos em curso
+# com um pool de ligações HTTP e um canal gRPC partilhados.
+#
+# Exemplos:
+#     python gerador_carga.py --duracao 30 --trabalhadores 64
+#     python gerador_carga.py --rps 500 --mistura "rest=1,soap=1,grpc=8,graphql=1" --semear 1000
+#
+# Com --rps 0 (omissão) cada trabalhador envia o pedido seguinte assim que
+# recebe a resposta (ciclo fechado). Com --rps > 0 os pedidos são agendados a
+# ritmo fixo e a latência conta a partir da hora agendada, por isso o tempo
+# passado na fila quando o servidor não acompanha também é medido.
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+
+from livros_cliente import ClienteLivrosAsync
+from livros_cliente.protocolos import GRAPHQL_URL, GRPC_ENDERECO, REST_URL, SOAP_URL
+
+PROTOCOLOS = ("rest", "soap", "grpc", "graphql")
+
+# Limites superiores (ms) dos intervalos do histograma de latência
+INTERVALOS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+
+
+def ler_mistura(texto):
+    """'rest=1,grpc=4' -> {"rest": 1.0, "grpc": 4.0}"""
+    mistura = {}
+    for parte in texto.split(","):
+        nome, _, peso = parte.partition("=")
+        nome = nome.strip().lower()
+        if nome not in PROTOCOLOS:
+            raise argparse.ArgumentTypeError(f"Protocolo desconhecido: {nome}")
+        try:
+            mistura[nome] = float(peso)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Peso inválido para {nome}: {peso}")
+    if not any(peso > 0 for peso in mistura.values()):
+        raise argparse.ArgumentTypeError("A mistura tem de ter pelo menos um peso positivo.")
+    return mistura
+
+
+def percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))]
+
+
+class Estatisticas:
+    """Contadores e latências (ms) de um protocolo."""
+
+    def __init__(self):
+        self.ok = 0
+        self.falhas = 0  # o servidor respondeu, mas a operação não teve sucesso
+        self.erros = 0  # exceções de comunicação
+        self.latencias = []
+
+    def registar(self, latencia, sucesso=None):
+        self.latencias.append(latencia)
+        if sucesso is None:
+            self.erros += 1
+        elif sucesso:
+            self.ok += 1
+        else:
+            self.falhas += 1
+
+    def resumo(self, duracao):
+        ordenadas = sorted(self.latencias)
+        histograma = {}
+        i = 0
+        for limite in INTERVALOS_MS:
+            inicio = i
+            while i < len(ordenadas) and ordenadas[i] <= limite:
+                i += 1
+            histograma["inf" if limite == float("inf") else str(limite)] = i - inicio
+        return {
+            "pedidos": len(ordenadas),
+            "ok": self.ok,
+            "falhas": self.falhas,
+            "erros": self.erros,
+            "pedidos_por_segundo": round(len(ordenadas) / duracao, 1) if duracao else 0.0,
+            "p50_ms": round(percentil(ordenadas, 50), 2),
+            "p90_ms": round(percentil(ordenadas, 90), 2),
+            "p99_ms": round(percentil(ordenadas, 99), 2),
+            "max_ms": round(ordenadas[-1], 2) if ordenadas else 0.0,
+            "histograma_ms": histograma,
+        }
+
+
+class GeradorCarga:
+    def __init__(self, cliente, mistura):
+        self.cliente = cliente
+        self.protocolos = [p for p in PROTOCOLOS if mistura.get(p, 0) > 0]
+        self.pesos = [mistura[p] for p in self.protocolos]
+        self.estatisticas = {p: Estatisticas() for p in self.protocolos}
+        # Livros inseridos por este gerador: a atualização e a pesquisa usam-nos
+        # e a eliminação retira-os, para que as operações acertem em livros reais
+        self.nomes = []
+
+    def novo_livro(self):
+        return f"Carga {uuid.uuid4().hex[:12]}", f"Autor {random.randint(1, 100)}", round(random.uniform(1, 100), 2)
+
+    async def semear(self, quantidade, concorrencia):
+        semaforo = asyncio.Semaphore(concorrencia)
+
+        async def inserir():
+            nome, autor, preco = self.novo_livro()
+            async with semaforo:
+                try:
+                    resultado = await self.cliente.inserir(nome, autor, preco)
+                except Exception:
+                    return
+                if resultado.sucesso:
+                    self.nomes.append(nome)
+
+        await asyncio.gather(*(inserir() for _ in range(quantidade)))
+
+    def _escolher_nome(self):
+        return random.choice(self.nomes) if self.nomes else f"Inexistente {uuid.uuid4().hex[:8]}"
+
+    async def _operacao(self, protocolo):
+        if protocolo == "rest":
+            nome, autor, preco = self.novo_livro()
+            resultado = await self.cliente.inserir(nome, autor, preco)
+            if resultado.sucesso:
+                self.nomes.append(nome)
+        elif protocolo == "soap":
+            resultado = await self.cliente.atualizar(self._escolher_nome(), preco=round(random.uniform(1, 100), 2))
+        elif protocolo == "grpc":
+            resultado = await self.cliente.procurar(self._escolher_nome())
+        else:
+            if self.nomes:
+                nome = self.nomes.pop(random.randrange(len(self.nomes)))
+            else:
+                nome = f"Inexistente {uuid.uuid4().hex[:8]}"
+            resultado = await self.cliente.eliminar(nome)
+        return resultado.sucesso
+
+    async def executar(self, protocolo, inicio):
+        """Executa uma operação e regista a latência medida desde `inicio`."""
+        try:
+            sucesso = await self._operacao(protocolo)
+        except Exception:
+            sucesso = None
+        self.estatisticas[protocolo].registar((time.perf_counter() - inicio) * 1000, sucesso)
+
+    def escolher(self):
+        return random.choices(self.protocolos, self.pesos)[0]
+
+    async def ciclo_fechado(self, duracao, trabalhadores):
+        fim = time.perf_counter() + duracao
+
+        async def trabalhador():
+            while time.perf_counter() < fim:
+                await self.executar(self.escolher(), time.perf_counter())
+
+        await asyncio.gather(*(trabalhador() for _ in range(trabalhadores)))
+
+    async def ritmo_fixo(self, duracao, trabalhadores, rps):
+        fila = asyncio.Queue()
+        inicio = time.perf_counter()
+        total = int(duracao * rps)
+
+        async def agendador():
+            # O pedido i fica agendado para inicio + i / rps, mesmo que os
+            # trabalhadores estejam atrasados (evita a omissão coordenada)
+            for i in range(total):
+                agendado = inicio + i / rps
+                espera = agendado - time.perf_counter()
+                if espera > 0:
+                    await asyncio.sleep(espera)
+                fila.put_nowait((self.escolher(), agendado))
+            for _ in range(trabalhadores):
+                fila.put_nowait(None)
+
+        async def trabalhador():
+            while True:
+                pedido = await fila.get()
+                if pedido is None:
+                    return
+                await self.executar(*pedido)
+
+        await asyncio.gather(agendador(), *(trabalhador() for _ in range(trabalhadores)))
+
+
+def imprimir(relatorio):
+    print(f"Duração: {relatorio['duracao_s']:.1f} s, total: {relatorio['pedidos_por_segundo']:.1f} pedidos/s")
+    for protocolo, resumo in relatorio["protocolos"].items():
+        print(f"\n[{protocolo}] {resumo['pedidos']} pedidos, {resumo['pedidos_por_segundo']:.1f}/s, "
+              f"ok={resumo['ok']} falhas={resumo['falhas']} erros={resumo['erros']}")
+        print(f"  p50={resumo['p50_ms']:.2f} ms  p90={resumo['p90_ms']:.2f} ms  "
+              f"p99={resumo['p99_ms']:.2f} ms  max={resumo['max_ms']:.2f} ms")
+        maior = max(resumo["histograma_ms"].values()) or 1
+        for limite, contagem in resumo["histograma_ms"].items():
+            if contagem:
+                barra = "#" * max(1, round(40 * contagem / maior))
+                print(f"  <= {limite:>5} ms {contagem:>8} {barra}")
+
+
+async def principal(argumentos):
+    cliente = ClienteLivrosAsync(argumentos.rest_url, argumentos.soap_url, argumentos.grpc_endereco,
+                                 argumentos.graphql_url, ligacoes=argumentos.trabalhadores)
+    async with cliente:
+        gerador = GeradorCarga(cliente, argumentos.mistura)
+        if argumentos.semear:
+            await gerador.semear(argumentos.semear, argumentos.trabalhadores)
+            print(f"Semeados {len(gerador.nomes)} livros.", file=sys.stderr)
+
+        inicio = time.perf_counter()
+        if argumentos.rps > 0:
+            await gerador.ritmo_fixo(argumentos.duracao, argumentos.trabalhadores, argumentos.rps)
+        else:
+            await gerador.ciclo_fechado(argumentos.duracao, argumentos.trabalhadores)
+        duracao = time.perf_counter() - inicio
+
+    protocolos = {p: e.resumo(duracao) for p, e in gerador.estatisticas.items()}
+    return {
+        "duracao_s": duracao,
+        "rps_alvo": argumentos.rps,
+        "trabalhadores": argumentos.trabalhadores,
+        "mistura": argumentos.mistura,
+        "pedidos_por_segundo": sum(r["pedidos"] for r in protocolos.values()) / duracao if duracao else 0.0,
+        "protocolos": protocolos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga para os serviços de livros.")
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos de carga (omissão: 10)")
+    parser.add_argument("--rps", type=float, default=0.0,
+                        help="pedidos por segundo agendados; 0 = ciclo fechado (omissão)")
+    parser.add_argument("--trabalhadores", type=int, default=32, help="pedidos em simultâneo (omissão: 32)")
+    parser.add_argument("--mistura", type=ler_mistura, default=ler_mistura("rest=1,soap=1,grpc=4,graphql=1"),
+                        help='pesos de cada protocolo (omissão: "rest=1,soap=1,grpc=4,graphql=1")')
+    parser.add_argument("--semear", type=int, default=0, help="livros a inserir por REST antes da carga")
+    parser.add_argument("--json", metavar="FICHEIRO", help="guarda o relatório em JSON")
+    parser.add_argument("--rest-url", default=REST_URL)
+    parser.add_argument("--soap-url", default=SOAP_URL)
+    parser.add_argument("--grpc-endereco", default=GRPC_ENDERECO)
+    parser.add_argument("--graphql-url", default=GRAPHQL_URL)
+    argumentos = parser.parse_args()
+    if argumentos.trabalhadores < 1:
+        parser.error("--trabalhadores tem de ser pelo menos 1")
+
+    relatorio = asyncio.run(principal(argumentos))
+    imprimir(relatorio)
+    if argumentos.json:
+        with open(argumentos.json, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
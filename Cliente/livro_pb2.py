@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0blivro.proto\"\x1c\n\x0cLivroRequest\x12\x0c\n\x04nome\x18\x01 \x01(\t\";\n\rLivroResponse\x12\x0c\n\x04nome\x18\x01 \x01(\t\x12\r\n\x05\x61utor\x18\x02 \x01(\t\x12\r\n\x05preco\x18\x03 \x01(\x01\x32>\n\x0cLivroService\x12.\n\rProcurarLivro\x12\r.LivroRequest\x1a\x0e.LivroResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0blivro.proto\"\x1c\n\x0cLivroRequest\x12\x0c\n\x04nome\x18\x01 \x01(\t\";\n\rLivroResponse\x12\x0c\n\x04nome\x18\x01 \x01(\t\x12\r\n\x05\x61utor\x18\x02 \x01(\t\x12\r\n\x05preco\x18\x03 \x01(\x01\"\x1e\n\rLivrosRequest\x12\r\n\x05nomes\x18\x01 \x03(\t\"[\n\x0eLivroResultado\x12\x16\n\x0enome_procurado\x18\x01 \x01(\t\x12\x12\n\nencontrado\x18\x02 \x01(\x08\x12\x1d\n\x05livro\x18\x03 \x01(\x0b\x32\x0e.LivroResponse\"5\n\x0eLivrosResponse\x12#\n\nresultados\x18\x01 \x03(\x0b\x32\x0f.LivroResultado\"\x88\x01\n\x13ListarLivrosRequest\x12\r\n\x05\x61utor\x18\x01 \x01(\t\x12\x16\n\tpreco_min\x18\x02 \x01(\x01H\x00\x88\x01\x01\x12\x16\n\tpreco_max\x18\x03 \x01(\x01H\x01\x88\x01\x01\x12\x16\n\x0etamanho_pagina\x18\x04 \x01(\x05\x42\x0c\n\n_preco_minB\x0c\n\n_preco_max\".\n\x0cLivrosPagina\x12\x1e\n\x06livros\x18\x01 \x03(\x0b\x32\x0e.LivroResponse\"\x1a\n\x18\x45statisticasCacheRequest\"\x89\x01\n\x19\x45statisticasCacheResponse\x12\x0f\n\x07\x61\x63\x65rtos\x18\x01 \x01(\x03\x12\x0e\n\x06\x66\x61lhas\x18\x02 \x01(\x03\x12\x10\n\x08\x64\x65spejos\x18\x03 \x01(\x03\x12\x14\n\x0cinvalidacoes\x18\x04 \x01(\x03\x12\x0f\n\x07tamanho\x18\x05 \x01(\x03\x12\x12\n\ncapacidade\x18\x06 \x01(\x03\"|\n\x0fPesquisaRequest\x12\r\n\x05texto\x18\x01 \x01(\t\x12\x16\n\tpreco_min\x18\x02 \x01(\x01H\x00\x88\x01\x01\x12\x16\n\tpreco_max\x18\x03 \x01(\x01H\x01\x88\x01\x01\x12\x0e\n\x06limite\x18\x04 \x01(\x05\x42\x0c\n\n_preco_minB\x0c\n\n_preco_max\"C\n\x10PesquisaResponse\x12\x1e\n\x06livros\x18\x01 \x03(\x0b\x32\x0e.LivroResponse\x12\x0f\n\x07ha_mais\x18\x02 \x01(\x08\"@\n\x18\x41ssinarAlteracoesRequest\x12\x16\n\tdesde_seq\x18\x01 \x01(\x03H\x00\x88\x01\x01\x42\x0c\n\n_desde_seq\"\x96\x01\n\tAlteracao\x12\x0b\n\x03seq\x18\x01 \x01(\x03\x12\x1d\n\x04tipo\x18\x02 \x01(\x0e\x32\x0f.Alteracao.Tipo\x12\x1d\n\x05livro\x18\x03 \x01(\x0b\x32\x0e.LivroResponse\">\n\x04Tipo\x12\n\n\x06GRAVAR\x10\x00\x12\x0c\n\x08\x45LIMINAR\x10\x01\x12\x0c\n\x08REINICIO\x10\x02\x12\x0e\n\nATUALIZADO\x10\x03\x32\xa6\x03\n\x0cLivroService\x12.\n\rProcurarLivro\x12\r.LivroRequest\x1a\x0e.LivroResponse\x12\x31\n\x0eProcurarLivros\x12\x0e.LivrosRequest\x1a\x0f.LivrosResponse\x12\x35\n\x0cListarLivros\x12\x14.ListarLivrosRequest\x1a\r.LivrosPagina0\x01\x12:\n\x14ProcurarLivrosStream\x12\r.LivroRequest\x1a\x0f.LivroResultado(\x01\x30\x01\x12J\n\x11\x45statisticasCache\x12\x19.EstatisticasCacheRequest\x1a\x1a.EstatisticasCacheResponse\x12\x36\n\x0fPesquisarLivros\x12\x10.PesquisaRequest\x1a\x11.PesquisaResponse\x12<\n\x11\x41ssinarAlteracoes\x12\x19.AssinarAlteracoesRequest\x1a\n.Alteracao0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,6 +35,30 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_LIVROREQUEST']._serialized_end=43
   _globals['_LIVRORESPONSE']._serialized_start=45
   _globals['_LIVRORESPONSE']._serialized_end=104
-  _globals['_LIVROSERVICE']._serialized_start=106
-  _globals['_LIVROSERVICE']._serialized_end=168
+  _globals['_LIVROSREQUEST']._serialized_start=106
+  _globals['_LIVROSREQUEST']._serialized_end=136
+  _globals['_LIVRORESULTADO']._serialized_start=138
+  _globals['_LIVRORESULTADO']._serialized_end=229
+  _globals['_LIVROSRESPONSE']._serialized_start=231
+  _globals['_LIVROSRESPONSE']._serialized_end=284
+  _globals['_LISTARLIVROSREQUEST']._serialized_start=287
+  _globals['_LISTARLIVROSREQUEST']._serialized_end=423
+  _globals['_LIVROSPAGINA']._serialized_start=425
+  _globals['_LIVROSPAGINA']._serialized_end=471
+  _globals['_ESTATISTICASCACHEREQUEST']._serialized_start=473
+  _globals['_ESTATISTICASCACHEREQUEST']._serialized_end=499
+  _globals['_ESTATISTICASCACHERESPONSE']._serialized_start=502
+  _globals['_ESTATISTICASCACHERESPONSE']._serialized_end=639
+  _globals['_PESQUISAREQUEST']._serialized_start=641
+  _globals['_PESQUISAREQUEST']._serialized_end=765
+  _globals['_PESQUISARESPONSE']._serialized_start=767
+  _globals['_PESQUISARESPONSE']._serialized_end=834
+  _globals['_ASSINARALTERACOESREQUEST']._serialized_start=836
+  _globals['_ASSINARALTERACOESREQUEST']._serialized_end=900
+  _globals['_ALTERACAO']._serialized_start=903
+  _globals['_ALTERACAO']._serialized_end=1053
+  _globals['_ALTERACAO_TIPO']._serialized_start=991
+  _globals['_ALTERACAO_TIPO']._serialized_end=1053
+  _globals['_LIVROSERVICE']._serialized_start=1056
+  _globals['_LIVROSERVICE']._serialized_end=1478
 # @@protoc_insertion_point(module_scope)
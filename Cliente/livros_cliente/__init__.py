@@ -0,0 +1,23 @@
+# Biblioteca cliente dos serviços de livros (REST, SOAP, gRPC e GraphQL)
+#
+# Usada pela interface Tk (cliente.py), pelo gerador de carga (gerador_carga.py)
+# e pelos benchmarks. Cada serviço tem uma operação:
+#   inserir (REST), atualizar (SOAP), procurar (gRPC) e eliminar (GraphQL)
+# disponível em ClienteLivros (síncrono) e ClienteLivrosAsync (asyncio).
+# ReplicaLivros mantém uma cópia local do catálogo com o feed de alterações.
+import os
+import sys
+
+# Os módulos gerados do livro.proto (livro_pb2, livro_pb2_grpc) estão na pasta Cliente
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from .protocolos import Alteracao, Livro, Resultado
+from .replica import ReplicaLivros
+from .sincrono import ClienteLivros
+
+try:
+    from .assincrono import ClienteLivrosAsync
+except ImportError:  # o cliente assíncrono precisa do aiohttp
+    ClienteLivrosAsync = None
+
+__all__ = ["Alteracao", "ClienteLivros", "ClienteLivrosAsync", "Livro", "ReplicaLivros", "Resultado"]
@@ -0,0 +1,82 @@
+# Cliente assíncrono (asyncio) dos quatro serviços
+#
+# Os pedidos HTTP usam uma aiohttp.ClientSession com pool de ligações e o gRPC
+# um canal grpc.aio de longa duração. Deve ser usado dentro de um event loop:
+#
+#     async with ClienteLivrosAsync() as cliente:
+#         resultado = await cliente.procurar("Livro")
+import asyncio
+import json
+
+import aiohttp
+import grpc
+import livro_pb2_grpc
+
+from . import protocolos
+from .transporte import CLIENTE_LIGACOES, CLIENTE_TENTATIVAS, CLIENTE_TIMEOUT, opcoes_canal_grpc
+
+
+class ClienteLivrosAsync:
+    """Versão assíncrona de ClienteLivros, com as mesmas operações e resultados."""
+
+    def __init__(self, rest_url=protocolos.REST_URL, soap_url=protocolos.SOAP_URL,
+                 grpc_endereco=protocolos.GRPC_ENDERECO, graphql_url=protocolos.GRAPHQL_URL,
+                 timeout=CLIENTE_TIMEOUT, tentativas=CLIENTE_TENTATIVAS, ligacoes=CLIENTE_LIGACOES):
+        self.rest_url = rest_url
+        self.soap_url = soap_url
+        self.graphql_url = graphql_url
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self._sessao = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=ligacoes),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+        self._canal = grpc.aio.insecure_channel(grpc_endereco, options=opcoes_canal_grpc(tentativas))
+        self._stub = livro_pb2_grpc.LivroServiceStub(self._canal)
+
+    async def _post(self, url, **kwargs):
+        """POST que devolve (estado, corpo em bytes).
+
+        Como no cliente síncrono, só se repete quando o pedido não chegou a
+        ser processado: falhas ao ligar e respostas 503.
+        """
+        for tentativa in range(self.tentativas + 1):
+            ultima = tentativa == self.tentativas
+            try:
+                async with self._sessao.post(url, **kwargs) as resposta:
+                    if resposta.status != 503 or ultima:
+                        return resposta.status, await resposta.read()
+            except aiohttp.ClientConnectorError:
+                if ultima:
+                    raise
+            await asyncio.sleep(0.2 * 2 ** tentativa)
+
+    async def inserir(self, nome, autor, preco):
+        estado, corpo = await self._post(self.rest_url, json=protocolos.pedido_rest(nome, autor, preco))
+        return protocolos.resultado_rest(estado, json.loads(corpo))
+
+    async def atualizar(self, nome, autor=None, preco=None):
+        estado, corpo = await self._post(self.soap_url, data=protocolos.envelope_soap(nome, autor, preco),
+                                         headers=protocolos.CABECALHOS_SOAP)
+        return protocolos.resultado_soap(estado, corpo)
+
+    async def procurar(self, nome):
+        try:
+            resposta = await self._stub.ProcurarLivro(protocolos.pedido_grpc(nome), timeout=self.timeout)
+        except grpc.aio.AioRpcError as e:
+            return protocolos.resultado_erro_grpc(e)
+        return protocolos.resultado_grpc(resposta)
+
+    async def eliminar(self, nome):
+        estado, corpo = await self._post(self.graphql_url, json=protocolos.pedido_graphql(nome))
+        return protocolos.resultado_graphql(json.loads(corpo))
+
+    async def fechar(self):
+        await self._sessao.close()
+        await self._canal.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excecao):
+        await self.fechar()
@@ -0,0 +1,119 @@
+# Formato dos pedidos e das respostas de cada serviço
+#
+# Funções puras, sem rede, partilhadas pelos clientes síncrono e assíncrono:
+# constroem o corpo de cada pedido e interpretam a resposta como um Resultado.
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import grpc
+import livro_pb2
+
+# URLs dos serviços (por omissão os do docker-compose na máquina local)
+REST_URL = os.environ.get("LIVROS_REST_URL", "http://localhost:5001/REST")
+SOAP_URL = os.environ.get("LIVROS_SOAP_URL", "http://localhost:8000/soap")
+GRPC_ENDERECO = os.environ.get("LIVROS_GRPC_ENDERECO", "localhost:50051")
+GRAPHQL_URL = os.environ.get("LIVROS_GRAPHQL_URL", "http://localhost:4000/graphql")
+
+# Resultado de uma operação: sucesso, mensagem do servidor e o livro (só na pesquisa)
+Resultado = namedtuple("Resultado", ["sucesso", "mensagem", "livro"], defaults=[None])
+
+# Livro devolvido pela pesquisa gRPC
+Livro = namedtuple("Livro", ["nome", "autor", "preco"])
+
+
+# REST: inserir livro
+def pedido_rest(nome, autor, preco):
+    return {"nome": nome, "autor": autor, "preco": preco}
+
+
+def resultado_rest(estado, dados):
+    if estado == 201:
+        return Resultado(True, dados.get("mensagem", "Livro inserido com sucesso!"))
+    return Resultado(False, dados.get("erro", "Erro desconhecido"))
+
+
+# SOAP: atualizar livro
+CABECALHOS_SOAP = {"Content-Type": "application/xml"}
+
+
+def envelope_soap(nome, autor=None, preco=None):
+    envelope = ET.Element("Envelope")
+    body = ET.SubElement(envelope, "Body")
+    req = ET.SubElement(body, "LivroUpdateRequest")
+    ET.SubElement(req, "nome").text = nome
+    if autor:
+        ET.SubElement(req, "autor").text = autor
+    if preco is not None:
+        ET.SubElement(req, "preco").text = str(preco)
+    return ET.tostring(envelope, encoding="utf-8")
+
+
+def resultado_soap(estado, corpo):
+    try:
+        raiz = ET.fromstring(corpo)
+    except ET.ParseError:
+        return Resultado(False, corpo.decode("utf-8", "replace") if isinstance(corpo, bytes) else corpo)
+    falha = next(raiz.iter("faultstring"), None)
+    if estado == 200 and falha is None:
+        mensagem = next(raiz.iter("mensagem"), None)
+        return Resultado(True, mensagem.text if mensagem is not None else "")
+    return Resultado(False, falha.text if falha is not None else f"HTTP {estado}")
+
+
+# gRPC: procurar livro
+def pedido_grpc(nome):
+    return livro_pb2.LivroRequest(nome=nome)
+
+
+def resultado_grpc(resposta):
+    livro = Livro(resposta.nome, resposta.autor, resposta.preco)
+    return Resultado(True, "Livro encontrado.", livro)
+
+
+def resultado_erro_grpc(erro):
+    """NOT_FOUND é uma resposta normal; os restantes erros gRPC são lançados de novo."""
+    if erro.code() == grpc.StatusCode.NOT_FOUND:
+        return Resultado(False, erro.details())
+    raise erro
+
+
+# gRPC: feed de alterações (AssinarAlteracoes)
+# tipo: "gravar", "eliminar", "reinicio" ou "atualizado"; livro só em "gravar" e "eliminar"
+Alteracao = namedtuple("Alteracao", ["seq", "tipo", "livro"])
+
+TIPOS_ALTERACAO = {
+    livro_pb2.Alteracao.GRAVAR: "gravar",
+    livro_pb2.Alteracao.ELIMINAR: "eliminar",
+    livro_pb2.Alteracao.REINICIO: "reinicio",
+    livro_pb2.Alteracao.ATUALIZADO: "atualizado",
+}
+
+
+def pedido_assinatura(desde_seq=None):
+    if desde_seq is None:
+        return livro_pb2.AssinarAlteracoesRequest()
+    return livro_pb2.AssinarAlteracoesRequest(desde_seq=desde_seq)
+
+
+def alteracao_grpc(mensagem):
+    tipo = TIPOS_ALTERACAO[mensagem.tipo]
+    livro = None
+    if tipo in ("gravar", "eliminar"):
+        livro = Livro(mensagem.livro.nome, mensagem.livro.autor, mensagem.livro.preco)
+    return Alteracao(mensagem.seq, tipo, livro)
+
+
+# GraphQL: eliminar livro (o nome vai como variável, não dentro do texto da consulta)
+CONSULTA_ELIMINAR = "mutation($nome: String!) { eliminarLivro(nome: $nome) { sucesso mensagem } }"
+
+
+def pedido_graphql(nome):
+    return {"query": CONSULTA_ELIMINAR, "variables": {"nome": nome}}
+
+
+def resultado_graphql(dados):
+    if dados.get("errors"):
+        return Resultado(False, dados["errors"][0]["message"])
+    resultado = dados["data"]["eliminarLivro"]
+    return Resultado(bool(resultado["sucesso"]), resultado["mensagem"])
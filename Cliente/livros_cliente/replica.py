@@ -0,0 +1,95 @@
+# Réplica local do catálogo mantida pelo feed de alterações (gRPC AssinarAlteracoes)
+#
+# A réplica recebe o catálogo inteiro uma vez e depois só as alterações, por
+# isso as leituras são feitas em memória sem pedidos ao servidor. Se a ligação
+# cair, volta a assinar a partir do último seq aplicado; o servidor só volta a
+# enviar o catálogo inteiro se essas alterações já não estiverem disponíveis.
+import threading
+
+import grpc
+
+from . import protocolos
+
+# Segundos entre tentativas de voltar a ligar ao servidor
+PAUSA_RELIGAR = 1.0
+
+
+def _chave(nome):
+    # A mesma normalização dos nomes que o servidor usa
+    return nome.strip().lower()
+
+
+class ReplicaLivros:
+    """Cópia em memória do catálogo, atualizada numa thread em segundo plano."""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.seq = None  # seq da última alteração aplicada (None até ao primeiro catálogo)
+        self.pronta = threading.Event()  # definido quando a réplica tem o catálogo completo
+        self._livros = {}  # nome normalizado -> Livro
+        self._novos = None  # catálogo a ser recebido depois de um "reinicio"
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._stream = None  # chamada gRPC em curso, cancelada por parar()
+        self._thread = None
+
+    def aplicar(self, alteracao):
+        """Aplica uma alteração recebida do feed."""
+        with self._lock:
+            if alteracao.tipo == "reinicio":
+                self._novos = {}
+            elif alteracao.tipo == "atualizado":
+                if self._novos is not None:
+                    # O catálogo novo só substitui o antigo quando está completo
+                    self._livros, self._novos = self._novos, None
+                self.seq = alteracao.seq
+                self.pronta.set()
+            else:
+                livros = self._novos if self._novos is not None else self._livros
+                if alteracao.tipo == "gravar":
+                    livros[_chave(alteracao.livro.nome)] = alteracao.livro
+                else:
+                    livros.pop(_chave(alteracao.livro.nome), None)
+                if self._novos is None:
+                    self.seq = alteracao.seq
+
+    def executar(self):
+        """Assina o feed e aplica as alterações até parar() ser chamado."""
+        while not self._parar.is_set():
+            stub = self.cliente.transporte.stub_grpc()
+            self._stream = stub.AssinarAlteracoes(protocolos.pedido_assinatura(self.seq))
+            if self._parar.is_set():  # parar() foi chamado antes de a chamada existir
+                self._stream.cancel()
+            try:
+                for mensagem in self._stream:
+                    self.aplicar(protocolos.alteracao_grpc(mensagem))
+            except grpc.RpcError:
+                pass
+            # Um catálogo recebido a meio não serve: o próximo começa do zero
+            with self._lock:
+                self._novos = None
+            self._parar.wait(PAUSA_RELIGAR)
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self.executar, name="replica-livros", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._parar.set()
+        if self._stream is not None:
+            self._stream.cancel()
+        if self._thread is not None:
+            self._thread.join()
+
+    def procurar(self, nome):
+        with self._lock:
+            return self._livros.get(_chave(nome))
+
+    def listar(self):
+        with self._lock:
+            return list(self._livros.values())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._livros)
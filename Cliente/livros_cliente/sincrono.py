@@ -0,0 +1,63 @@
+# Cliente síncrono dos quatro serviços (seguro para várias threads)
+import grpc
+
+from . import protocolos
+from .transporte import Transporte
+
+
+class ClienteLivros:
+    """Inserir (REST), atualizar (SOAP), procurar (gRPC) e eliminar (GraphQL) livros.
+
+    Cada operação devolve um Resultado; os erros de comunicação são lançados
+    como exceções do requests ou grpc.RpcError.
+    """
+
+    def __init__(self, rest_url=protocolos.REST_URL, soap_url=protocolos.SOAP_URL,
+                 grpc_endereco=protocolos.GRPC_ENDERECO, graphql_url=protocolos.GRAPHQL_URL, **opcoes):
+        self.rest_url = rest_url
+        self.soap_url = soap_url
+        self.graphql_url = graphql_url
+        # opcoes: timeout, tentativas e ligacoes do Transporte
+        self.transporte = Transporte(grpc_endereco, **opcoes)
+
+    def inserir(self, nome, autor, preco):
+        resposta = self.transporte.post("rest", self.rest_url, json=protocolos.pedido_rest(nome, autor, preco))
+        return protocolos.resultado_rest(resposta.status_code, resposta.json())
+
+    def atualizar(self, nome, autor=None, preco=None):
+        resposta = self.transporte.post("soap", self.soap_url, data=protocolos.envelope_soap(nome, autor, preco),
+                                        headers=protocolos.CABECALHOS_SOAP)
+        return protocolos.resultado_soap(resposta.status_code, resposta.content)
+
+    def procurar(self, nome):
+        try:
+            resposta = self.transporte.stub_grpc().ProcurarLivro(protocolos.pedido_grpc(nome),
+                                                                 timeout=self.transporte.timeout)
+        except grpc.RpcError as e:
+            return protocolos.resultado_erro_grpc(e)
+        return protocolos.resultado_grpc(resposta)
+
+    def assinar_alteracoes(self, desde_seq=None):
+        """Gera as alterações ao catálogo (gRPC AssinarAlteracoes), sem fim.
+
+        Ver ReplicaLivros para manter uma cópia local do catálogo com elas.
+        """
+        stream = self.transporte.stub_grpc().AssinarAlteracoes(protocolos.pedido_assinatura(desde_seq))
+        try:
+            for mensagem in stream:
+                yield protocolos.alteracao_grpc(mensagem)
+        finally:
+            stream.cancel()
+
+    def eliminar(self, nome):
+        resposta = self.transporte.post("graphql", self.graphql_url, json=protocolos.pedido_graphql(nome))
+        return protocolos.resultado_graphql(resposta.json())
+
+    def fechar(self):
+        self.transporte.fechar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
@@ -0,0 +1,114 @@
+# Camada de transporte do cliente
+#
+# Mantém ligações reutilizáveis para os quatro serviços: uma requests.Session
+# com pool de ligações por serviço HTTP (REST, SOAP e GraphQL) e um único canal
+# gRPC de longa duração com keepalive. Os timeouts e as novas tentativas são
+# configuráveis por variáveis de ambiente.
+import json
+import os
+import threading
+
+import grpc
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import livro_pb2_grpc
+
+# Configuração (variáveis de ambiente)
+CLIENTE_TIMEOUT = float(os.environ.get("CLIENTE_TIMEOUT", "5"))  # segundos por pedido
+CLIENTE_TENTATIVAS = int(os.environ.get("CLIENTE_TENTATIVAS", "3"))  # novas tentativas em falhas de ligação
+CLIENTE_LIGACOES = int(os.environ.get("CLIENTE_LIGACOES", "10"))  # ligações por serviço HTTP
+CLIENTE_KEEPALIVE_MS = int(os.environ.get("CLIENTE_KEEPALIVE_MS", "60000"))  # pings do canal gRPC
+
+
+def criar_sessao(tentativas=CLIENTE_TENTATIVAS, ligacoes=CLIENTE_LIGACOES):
+    """Sessão HTTP com pool de ligações keep-alive e novas tentativas.
+
+    Os pedidos POST não são idempotentes, por isso só se repetem quando o
+    pedido não chegou a ser processado: falhas ao ligar e respostas 503.
+    """
+    repeticoes = Retry(
+        total=tentativas,
+        connect=tentativas,
+        read=0,
+        status=tentativas,
+        status_forcelist=(503,),
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=0.2,
+        raise_on_status=False,
+    )
+    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=ligacoes, max_retries=repeticoes)
+    sessao = requests.Session()
+    sessao.mount("http://", adaptador)
+    sessao.mount("https://", adaptador)
+    return sessao
+
+
+def opcoes_canal_grpc(tentativas=CLIENTE_TENTATIVAS, keepalive_ms=CLIENTE_KEEPALIVE_MS):
+    """Opções do canal gRPC: keepalive e novas tentativas em UNAVAILABLE (as pesquisas são idempotentes)."""
+    configuracao = {
+        "methodConfig": [{
+            "name": [{"service": "LivroService"}],
+            "retryPolicy": {
+                "maxAttempts": max(2, tentativas + 1),
+                "initialBackoff": "0.2s",
+                "maxBackoff": "2s",
+                "backoffMultiplier": 2,
+                "retryableStatusCodes": ["UNAVAILABLE"],
+            },
+        }]
+    }
+    return [
+        ("grpc.keepalive_time_ms", keepalive_ms),
+        ("grpc.keepalive_timeout_ms", 10000),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        ("grpc.enable_retries", 1),
+        ("grpc.service_config", json.dumps(configuracao)),
+    ]
+
+
+class Transporte:
+    """Ligações partilhadas pelos pedidos do cliente (seguras para várias threads)."""
+
+    def __init__(self, endereco_grpc, timeout=CLIENTE_TIMEOUT, tentativas=CLIENTE_TENTATIVAS,
+                 ligacoes=CLIENTE_LIGACOES):
+        self.endereco_grpc = endereco_grpc
+        self.timeout = timeout
+        self.tentativas = tentativas
+        self.ligacoes = ligacoes
+        self._sessoes = {}
+        self._canal = None
+        self._stub = None
+        self._lock = threading.Lock()
+
+    def sessao(self, servico):
+        """Sessão HTTP do serviço ("rest", "soap" ou "graphql"), criada no primeiro uso."""
+        with self._lock:
+            sessao = self._sessoes.get(servico)
+            if sessao is None:
+                sessao = self._sessoes[servico] = criar_sessao(self.tentativas, self.ligacoes)
+            return sessao
+
+    def post(self, servico, url, **kwargs):
+        """POST pela sessão do serviço, com o timeout configurado."""
+        kwargs.setdefault("timeout", self.timeout)
+        return self.sessao(servico).post(url, **kwargs)
+
+    def stub_grpc(self):
+        """Stub do LivroService sobre o canal gRPC partilhado (criado no primeiro uso)."""
+        with self._lock:
+            if self._stub is None:
+                self._canal = grpc.insecure_channel(self.endereco_grpc, options=opcoes_canal_grpc(self.tentativas))
+                self._stub = livro_pb2_grpc.LivroServiceStub(self._canal)
+            return self._stub
+
+    def fechar(self):
+        with self._lock:
+            for sessao in self._sessoes.values():
+                sessao.close()
+            self._sessoes.clear()
+            if self._canal is not None:
+                self._canal.close()
+            self._canal = self._stub = None
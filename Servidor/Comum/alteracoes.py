@@ -0,0 +1,219 @@
+# Feed de alterações do catálogo (change data capture)
+#
+# Cada alteração ao catálogo tem um número de sequência (seq) que é o mesmo em
+# todos os processos: o do registo no diário (XML) ou o da linha da tabela
+# `alteracoes` (SQLite). Cada processo guarda as últimas alterações num buffer
+# circular, preenchido pelo próprio catálogo: as escritas do processo e as dos
+# outros servidores lidas ao sincronizar.
+#
+# Os assinantes (o RPC AssinarAlteracoes e o SSE do REST) indicam o último seq
+# que receberam e recebem as alterações seguintes, à medida que acontecem. Se
+# essas alterações já não estão no buffer (ou o assinante não indicou seq),
+# recebem primeiro o catálogo inteiro:
+#
+#   reinicio (seq S)  ->  gravar x N (seq S)  ->  atualizado (seq S)  ->  alterações com seq > S
+#
+# Com isto um cliente mantém uma réplica local do catálogo sem o reler. Uma
+# thread verifica periodicamente (com stat ou uma consulta leve, sem ler o
+# catálogo) se outro processo o alterou, para que essas alterações cheguem aos
+# assinantes sem esperar pelo pedido seguinte.
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from armazenamento import Alteracao, obter_catalogo
+
+# Alterações guardadas em memória para os assinantes que se atrasam ou voltam a ligar
+FEED_CAPACIDADE = int(os.environ.get("LIVROS_FEED_CAPACIDADE", "10000"))
+# Segundos entre verificações das alterações de outros processos (0 = só nos pedidos)
+FEED_INTERVALO = float(os.environ.get("LIVROS_FEED_INTERVALO", "0.1"))
+# Segundos sem alterações até o assinante receber um sinal de vida (None)
+FEED_ESPERA = float(os.environ.get("LIVROS_FEED_ESPERA", "15"))
+
+
+class FeedAlteracoes:
+    """Buffer circular com as últimas alterações de um catálogo, por ordem de seq."""
+
+    def __init__(self, catalogo, capacidade=FEED_CAPACIDADE):
+        self.catalogo = catalogo
+        self._alteracoes = deque(maxlen=max(capacidade, 1))
+        self._inicio = None  # seq anterior à primeira alteração disponível
+        self.ultimo = None  # seq da última alteração recebida
+        self._iniciar()
+        catalogo.adicionar_ouvinte_alteracoes(self._receber)
+
+    def _iniciar(self):
+        self._cond = threading.Condition()
+        self._acordar = []  # (loop, asyncio.Event) dos assinantes assíncronos à espera
+        if FEED_INTERVALO > 0:
+            threading.Thread(target=self._vigiar, name="feed-alteracoes", daemon=True).start()
+
+    def _apos_fork(self):
+        self._iniciar()
+
+    def _receber(self, alteracoes, seq):
+        """Ouvinte do catálogo (corre com o lock do catálogo)."""
+        with self._cond:
+            if alteracoes is None or self.ultimo is None:
+                # Ponto de partida, ou alterações perdidas: só estão disponíveis as seguintes
+                self._alteracoes.clear()
+                self._inicio = seq
+            else:
+                for alteracao in alteracoes:
+                    if len(self._alteracoes) == self._alteracoes.maxlen:
+                        self._inicio = self._alteracoes[0].seq
+                    self._alteracoes.append(alteracao)
+            self.ultimo = seq
+            self._cond.notify_all()
+            for loop, evento in self._acordar:
+                try:
+                    loop.call_soon_threadsafe(evento.set)
+                except RuntimeError:  # o event loop já terminou
+                    pass
+            self._acordar.clear()
+
+    def _vigiar(self):
+        while True:
+            time.sleep(FEED_INTERVALO)
+            try:
+                if self.catalogo.alterado_em_disco():
+                    self.catalogo.sincronizar()
+            except Exception:
+                # Um erro de leitura passageiro: tenta de novo na próxima verificação
+                pass
+
+    def ler(self, desde):
+        """Devolve as alterações com seq > desde, ou None se algumas já não estão disponíveis."""
+        with self._cond:
+            if desde < self._inicio:
+                return None
+            novas = []
+            for alteracao in reversed(self._alteracoes):
+                if alteracao.seq <= desde:
+                    break
+                novas.append(alteracao)
+        novas.reverse()
+        return novas
+
+    def _ha_novas(self, desde):
+        return self.ultimo > desde or desde < self._inicio
+
+    def esperar(self, desde, timeout):
+        """Espera, no máximo timeout segundos, por alterações com seq > desde."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._ha_novas(desde), timeout)
+
+    async def esperar_async(self, desde, timeout):
+        """Como esperar, mas sem bloquear o event loop."""
+        entrada = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            if self._ha_novas(desde):
+                return
+            self._acordar.append(entrada)
+        try:
+            await asyncio.wait_for(entrada[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                if entrada in self._acordar:
+                    self._acordar.remove(entrada)
+
+
+def _marcador(op, seq):
+    return Alteracao(seq, op, None, None, None)
+
+
+def assinar(desde_seq=None, feed=None, espera=FEED_ESPERA):
+    """Gera as alterações para um assinante, a começar depois de desde_seq.
+
+    Sem desde_seq, ou se as alterações seguintes já não estão disponíveis,
+    começa pelo catálogo inteiro (reinicio, gravar..., atualizado). Depois
+    de entregar o que estava em atraso gera um "atualizado" e a seguir as
+    alterações em tempo real. Gera None a cada `espera` segundos sem
+    alterações, para o chamador verificar se o assinante ainda está ligado.
+    """
+    feed = feed or obter_feed()
+    feed.catalogo.sincronizar()
+    seq = desde_seq
+    # Um seq posterior ao do catálogo vem de outro catálogo (por exemplo, um ficheiro recriado)
+    if seq is not None and seq > feed.ultimo:
+        seq = None
+    em_atraso = True
+    while True:
+        novas = feed.ler(seq) if seq is not None else None
+        if novas is None:
+            seq, livros = feed.catalogo.instantaneo()
+            yield _marcador("reinicio", seq)
+            for livro in livros:
+                yield Alteracao(seq, "gravar", *livro)
+            yield _marcador("atualizado", seq)
+            em_atraso = False
+            continue
+        for alteracao in novas:
+            yield alteracao
+            seq = alteracao.seq
+        if em_atraso:
+            yield _marcador("atualizado", seq)
+            em_atraso = False
+        if not novas:
+            feed.esperar(seq, espera)
+            if not feed._ha_novas(seq):
+                yield None
+
+
+async def assinar_async(desde_seq=None, feed=None, espera=FEED_ESPERA):
+    """Versão de assinar para asyncio: as leituras do catálogo correm no executor por omissão."""
+    loop = asyncio.get_running_loop()
+    feed = feed or await loop.run_in_executor(None, obter_feed)
+    await loop.run_in_executor(None, feed.catalogo.sincronizar)
+    seq = desde_seq
+    if seq is not None and seq > feed.ultimo:
+        seq = None
+    em_atraso = True
+    while True:
+        novas = feed.ler(seq) if seq is not None else None
+        if novas is None:
+            seq, livros = await loop.run_in_executor(None, feed.catalogo.instantaneo)
+            yield _marcador("reinicio", seq)
+            for livro in livros:
+                yield Alteracao(seq, "gravar", *livro)
+            yield _marcador("atualizado", seq)
+            em_atraso = False
+            continue
+        for alteracao in novas:
+            yield alteracao
+            seq = alteracao.seq
+        if em_atraso:
+            yield _marcador("atualizado", seq)
+            em_atraso = False
+        if not novas:
+            await feed.esperar_async(seq, espera)
+            if not feed._ha_novas(seq):
+                yield None
+
+
+# Um feed por ficheiro do catálogo, criado na primeira assinatura
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def obter_feed(caminho=None):
+    """Devolve o feed (único no processo) do catálogo associado ao ficheiro indicado."""
+    with _feeds_lock:
+        feed = _feeds.get(caminho)
+        if feed is None:
+            feed = _feeds[caminho] = FeedAlteracoes(obter_catalogo(caminho))
+        return feed
+
+
+def _apos_fork():
+    global _feeds_lock
+    _feeds_lock = threading.Lock()
+    for feed in _feeds.values():
+        feed._apos_fork()
+
+
+os.register_at_fork(after_in_child=_apos_fork)
@@ -0,0 +1,869 @@
+# Armazenamento partilhado do catálogo de livros
+#
+# Todos os servidores (REST, SOAP, gRPC e GraphQL) usam este módulo para aceder
+# ao catálogo, através de obter_catalogo(). Há dois armazenamentos com a mesma
+# interface (ArmazenamentoLivros), escolhidos com LIVROS_ARMAZENAMENTO: "xml"
+# (CatalogoLivros, descrito abaixo) e "sqlite" (CatalogoSQLite, em
+# armazenamento_sqlite.py).
+#
+# No armazenamento XML o catálogo é mantido em memória, indexado pelo nome
+# normalizado (TabelaLivros, em tabela_livros.py), e só é relido do disco
+# quando o ficheiro muda (mtime/tamanho). Cada snapshot XML tem ao lado um
+# snapshot binário (livros.xml.bin) com o mesmo conteúdo, que os processos
+# abrem com mmap em vez de lerem o XML.
+#
+# As alterações não reescrevem o XML: são acrescentadas como pequenos registos
+# JSON a um diário (livros.xml.diario) e sincronizadas em grupo com fsync. Um
+# compactador em segundo plano reescreve periodicamente o XML como snapshot e
+# esvazia o diário. O estado é sempre snapshot + registos do diário com número
+# de sequência superior ao do snapshot (atributo seq da raiz <livros>). Esse
+# número é o mesmo em todos os processos e acompanha cada alteração publicada
+# aos ouvintes de alterações (o feed de alteracoes.py).
+#
+# Os contentores partilham o mesmo volume, por isso o acesso entre processos é
+# coordenado com bloqueios consultivos fcntl sobre livros.xml.lock: partilhado
+# para quem lê do disco, exclusivo para quem escreve no diário ou compacta.
+import atexit
+import fcntl
+import json
+import math
+import os
+import sys
+import threading
+import traceback
+import zlib
+from bisect import bisect_right
+from contextlib import contextmanager
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from xml.sax.saxutils import escape
+
+from metricas import etapa
+from tabela_livros import Livro, SnapshotBinario, TabelaLivros, escrever_snapshot_binario, normalizar_nome
+
+# Alteração ao catálogo, com o número de sequência comum a todos os processos.
+# op é "gravar" (livro inserido ou atualizado, com o estado novo) ou "eliminar"
+# (autor e preco a None).
+Alteracao = namedtuple("Alteracao", ["seq", "op", "nome", "autor", "preco"])
+
+# Configuração do diário e da compactação
+COMPACTAR_INTERVALO = float(os.environ.get("LIVROS_COMPACTAR_INTERVALO", "30"))
+COMPACTAR_MINIMO = int(os.environ.get("LIVROS_COMPACTAR_MINIMO", "1000"))
+DIARIO_FSYNC = os.environ.get("LIVROS_DIARIO_FSYNC", "1") != "0"
+# Registos do diário mantidos no diário novo de cada compactação, para os processos que
+# ainda não os leram publicarem essas alterações em vez de recomeçarem os assinantes
+DIARIO_RETER = int(os.environ.get("LIVROS_DIARIO_RETER", os.environ.get("LIVROS_FEED_CAPACIDADE", "10000")))
+
+# Snapshot binário ao lado do XML, aberto com mmap (o formato é little-endian)
+SNAPSHOT_BINARIO = os.environ.get("LIVROS_SNAPSHOT_BINARIO", "1") != "0" and sys.byteorder == "little"
+
+# Armazenamento usado pelos servidores e ficheiro de cada tipo
+LIVROS_ARMAZENAMENTO = os.environ.get("LIVROS_ARMAZENAMENTO", "xml")  # "xml" ou "sqlite"
+LIVROS_XML = os.environ.get("LIVROS_XML", "/data/livros.xml")
+LIVROS_SQLITE = os.environ.get("LIVROS_SQLITE", "/data/livros.db")
+
+# Extensões dos ficheiros abertos com o armazenamento SQLite
+EXTENSOES_SQLITE = (".db", ".sqlite", ".sqlite3")
+
+
+def _seq_linha(linha):
+    """seq do registo numa linha do diário (infinito se a linha estiver truncada)."""
+    try:
+        return json.loads(linha)["seq"]
+    except (ValueError, KeyError, TypeError):
+        return math.inf
+
+
+class _Pedido:
+    """Conjunto de operações submetido por um pedido e à espera de ser aplicado."""
+
+    __slots__ = ("operacoes", "resultados", "erro", "concluido")
+
+    def __init__(self, operacoes):
+        self.operacoes = operacoes
+        self.resultados = None
+        self.erro = None
+        self.concluido = False
+
+
+class ArmazenamentoLivros:
+    """Interface comum aos armazenamentos do catálogo.
+
+    As subclasses implementam procurar_varios, listar, instantaneo, aplicar,
+    sincronizar, alterado_em_disco, compactar e fechar, e inicializam _lock,
+    _ouvintes e _ouvintes_alteracoes. As restantes operações são definidas
+    aqui a partir dessas.
+    """
+
+    def procurar_varios(self, nomes, sincronizar=True):
+        """Procura vários nomes sobre o mesmo estado do catálogo (uma só sincronização)."""
+        raise NotImplementedError
+
+    def listar(self, filtro=None, sincronizar=True):
+        """Devolve os livros (pela ordem do catálogo) que satisfazem filtro(livro)."""
+        raise NotImplementedError
+
+    def instantaneo(self):
+        """Devolve (seq, livros): o catálogo inteiro e o seq da última alteração nele incluída."""
+        raise NotImplementedError
+
+    def aplicar(self, operacoes):
+        """Aplica várias operações numa só escrita.
+
+        Cada operação é um tuplo ("inserir", nome, autor, preco),
+        ("atualizar", nome, autor, preco) ou ("eliminar", nome).
+        Devolve a lista de resultados (True/False) pela mesma ordem.
+        """
+        raise NotImplementedError
+
+    def sincronizar(self):
+        """Atualiza o catálogo (e avisa os ouvintes) com o que os outros processos alteraram."""
+        raise NotImplementedError
+
+    def alterado_em_disco(self):
+        """Indica, sem bloquear, se há alterações de outros processos por sincronizar."""
+        raise NotImplementedError
+
+    def compactar(self):
+        raise NotImplementedError
+
+    def fechar(self):
+        raise NotImplementedError
+
+    def ficheiros(self):
+        """Caminhos dos ficheiros em disco do catálogo (para as métricas de tamanho)."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _chamar_ouvinte(ouvinte, *argumentos):
+        """Chama um ouvinte; uma exceção dele é mostrada mas não chega a quem alterou o catálogo."""
+        try:
+            ouvinte(*argumentos)
+        except Exception:
+            traceback.print_exc()
+
+    def _notificar(self, chaves):
+        """Avisa os ouvintes dos nomes (normalizados) que mudaram. Chamado com _lock."""
+        if chaves or chaves is None:
+            for ouvinte in self._ouvintes:
+                self._chamar_ouvinte(ouvinte, chaves)
+
+    def adicionar_ouvinte(self, funcao):
+        """Regista funcao(chaves), chamada com o conjunto de nomes normalizados alterados.
+
+        É chamada sempre que o catálogo muda, seja por escritas deste processo
+        ou por alterações de outros processos lidas ao sincronizar. Com
+        chaves=None qualquer livro pode ter mudado. Corre com o lock do
+        catálogo, por isso deve ser rápida e não usar o catálogo.
+        """
+        with self._lock:
+            self._ouvintes.append(funcao)
+
+    def _publicar(self, alteracoes, seq):
+        """Entrega as alterações (ou None, se se perderam) aos ouvintes de alterações. Chamado com _lock."""
+        for ouvinte in self._ouvintes_alteracoes:
+            self._chamar_ouvinte(ouvinte, alteracoes, seq)
+
+    def adicionar_ouvinte_alteracoes(self, funcao):
+        """Regista funcao(alteracoes, seq), chamada com as alterações por ordem de seq.
+
+        alteracoes é uma lista de Alteracao e seq o número de sequência da
+        última. Com alteracoes=None as alterações até seq não estão disponíveis
+        (por exemplo, outro processo compactou o diário antes de este as ler).
+        A função é logo chamada com ([], seq atual), o ponto de partida. Tal
+        como os ouvintes de adicionar_ouvinte, corre com o lock do catálogo.
+        """
+        with self._lock:
+            self._ouvintes_alteracoes.append(funcao)
+            funcao([], self._seq)
+
+    def procurar(self, nome, sincronizar=True):
+        """Devolve o Livro com esse nome ou None."""
+        return self.procurar_varios([nome], sincronizar)[0]
+
+    def versao(self, sincronizar=True):
+        """Versão do catálogo ("identidade-seq"), igual em todos os processos que leem o mesmo ficheiro.
+
+        Muda sempre que o catálogo muda, por isso serve por exemplo para ETags.
+        Só o seq não chegava: um ficheiro substituído pode recomeçar a contagem.
+        """
+        if sincronizar:
+            self.sincronizar()
+        with self._lock:
+            return f"{zlib.crc32(repr(self._identidade()).encode()):08x}-{self._seq}"
+
+    def _identidade(self):
+        """Identifica o ficheiro de onde veio o estado em memória (muda se for substituído)."""
+        raise NotImplementedError
+
+    def inserir(self, nome, autor, preco):
+        """Insere um livro novo. Devolve False se já existir um livro com esse nome."""
+        return self.aplicar([("inserir", nome, autor, preco)])[0]
+
+    def atualizar(self, nome, autor=None, preco=None):
+        """Atualiza o autor e/ou preço. Devolve True se o livro for encontrado."""
+        return self.aplicar([("atualizar", nome, autor, preco)])[0]
+
+    def eliminar(self, nome):
+        """Remove o livro com esse nome. Devolve True se existia."""
+        return self.aplicar([("eliminar", nome)])[0]
+
+    def __len__(self):
+        return len(self.listar())
+
+
+class CatalogoLivros(ArmazenamentoLivros):
+    """Catálogo em memória sincronizado com um snapshot XML e o respetivo diário.
+
+    Com somente_leitura=True os ficheiros só são lidos (por exemplo para
+    copiar o catálogo): não é criado o XML, não há compactações, nem ao
+    fechar, não é gerado o snapshot binário e aplicar() é recusado.
+    """
+
+    def __init__(self, caminho, somente_leitura=False):
+        self.caminho = caminho
+        self.somente_leitura = somente_leitura
+        self.caminho_diario = caminho + ".diario"
+        self.caminho_bloqueio = caminho + ".lock"
+        self.caminho_binario = caminho + ".bin"
+        self._livros = TabelaLivros()  # nome normalizado -> Livro (mantém a ordem do ficheiro)
+        self._seq = 0  # último número de sequência aplicado
+        self._seq_snapshot = 0  # seq do snapshot lido (os registos até ele já lá estão)
+        self._assinatura = None
+        self._inode_diario = None
+        self._posicao_diario = 0
+        self._registos_diario = 0
+        self._lock = threading.RLock()  # protege o estado em memória
+        self._ouvintes = []  # funções chamadas com os nomes alterados
+        self._ouvintes_alteracoes = []  # funções chamadas com as Alteracao aplicadas
+
+        # Escritas: um líder aplica e sincroniza de uma vez todos os pedidos em fila
+        self._fila = []
+        self._fila_lock = threading.Lock()
+        self._lock_escrita = threading.Lock()
+        self._fd_diario = None
+        self._inode_fd_diario = None
+
+        # Bloqueios entre processos. O flock pertence ao descritor aberto, por isso
+        # leitores e escritores deste processo usam descritores diferentes.
+        self._lock_leitura = threading.Lock()
+        self._fd_bloqueio_leitura = None
+        self._fd_bloqueio_escrita = None
+        self._dono_exclusivo = None
+
+        if not somente_leitura:
+            with self._lock_escrita, self._bloqueio(exclusivo=True):
+                self._inicializar_xml()
+
+        self._iniciar_compactador()
+        atexit.register(self.fechar)
+
+    def _iniciar_compactador(self):
+        self._parar = threading.Event()
+        if COMPACTAR_INTERVALO > 0 and not self.somente_leitura:
+            threading.Thread(target=self._compactador, name="compactador-livros", daemon=True).start()
+
+    def _apos_fork(self):
+        """Prepara o catálogo herdado num processo filho criado com fork.
+
+        O estado em memória é mantido (partilhado com o pai em copy-on-write),
+        mas os locks, os descritores e a thread do compactador são do pai e
+        podem ter ficado num estado inconsistente, por isso são recriados.
+        """
+        self._lock = threading.RLock()
+        self._fila = []
+        self._fila_lock = threading.Lock()
+        self._lock_escrita = threading.Lock()
+        self._lock_leitura = threading.Lock()
+        self._dono_exclusivo = None
+        # Fechar a cópia do descritor não liberta bloqueios que o pai detenha
+        for fd in (self._fd_diario, self._fd_bloqueio_leitura, self._fd_bloqueio_escrita):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._fd_diario = self._inode_fd_diario = None
+        self._fd_bloqueio_leitura = self._fd_bloqueio_escrita = None
+        self._iniciar_compactador()
+
+    # Bloqueios entre processos
+    def _abrir_bloqueio(self):
+        xml_dir = os.path.dirname(self.caminho)
+        if xml_dir:
+            os.makedirs(xml_dir, exist_ok=True)
+        return os.open(self.caminho_bloqueio, os.O_RDWR | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def _bloqueio(self, exclusivo=False):
+        """Bloqueio consultivo sobre o ficheiro .lock (partilhado ou exclusivo).
+
+        O modo exclusivo só pode ser pedido por quem já tem _lock_escrita. A thread
+        que o detém pode voltar a pedir o bloqueio (por exemplo ao sincronizar)
+        sem o perder.
+        """
+        if self._dono_exclusivo == threading.get_ident():
+            yield
+            return
+        if exclusivo:
+            if self._fd_bloqueio_escrita is None:
+                self._fd_bloqueio_escrita = self._abrir_bloqueio()
+            fcntl.flock(self._fd_bloqueio_escrita, fcntl.LOCK_EX)
+            self._dono_exclusivo = threading.get_ident()
+            try:
+                yield
+            finally:
+                self._dono_exclusivo = None
+                fcntl.flock(self._fd_bloqueio_escrita, fcntl.LOCK_UN)
+        else:
+            with self._lock_leitura:
+                if self._fd_bloqueio_leitura is None:
+                    self._fd_bloqueio_leitura = self._abrir_bloqueio()
+                fcntl.flock(self._fd_bloqueio_leitura, fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(self._fd_bloqueio_leitura, fcntl.LOCK_UN)
+
+    # Funções auxiliares para manipulação do XML
+    def _inicializar_xml(self):
+        """Cria o ficheiro XML com a raiz <livros> se não existir."""
+        if not os.path.exists(self.caminho):
+            self._escrever_snapshot([], 0)
+
+    def _escrever_snapshot(self, livros, seq):
+        """Escreve o XML num ficheiro temporário e substitui o original de forma atómica.
+
+        O XML é escrito livro a livro, sem construir a árvore em memória.
+        """
+        temporario = f"{self.caminho}.{os.getpid()}.tmp"
+        with etapa("escrever_snapshot"), open(temporario, "w", encoding="utf-8", newline="\n") as f:
+            f.write(f"<?xml version='1.0' encoding='utf-8'?>\n<livros seq=\"{seq}\">")
+            for livro in livros:
+                f.write(f"<livro><nome>{escape(livro.nome)}</nome><autor>{escape(livro.autor)}</autor>"
+                        f"<preco>{livro.preco}</preco></livro>")
+            f.write("</livros>")
+            f.flush()
+            with etapa("fsync"):
+                os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+
+    def _identidade(self):
+        # O snapshot lido ou escrito por último: muda também quando este processo ou
+        # outro compacta o catálogo (e a versão com ele, mesmo sem alterações)
+        return self._assinatura
+
+    def _assinatura_ficheiro(self):
+        """Identifica a versão do ficheiro em disco sem o ler."""
+        try:
+            st = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _ler_snapshot(self):
+        """Lê o snapshot XML para uma TabelaLivros nova. Devolve (seq, livros).
+
+        O XML é lido de forma incremental e cada <livro> é descartado depois de
+        copiado para a tabela, por isso a árvore inteira nunca está em memória.
+        """
+        livros = TabelaLivros()
+        raiz = None
+        for evento, elem in ET.iterparse(self.caminho, events=("start", "end")):
+            if raiz is None:
+                raiz = elem
+                seq = int(raiz.get("seq", "0"))
+            elif evento == "end" and elem.tag == "livro":
+                nome = elem.findtext("nome", "").strip()
+                # Em ficheiros antigos com nomes repetidos prevalece o primeiro,
+                # que era o que as pesquisas lineares devolviam.
+                livros.acrescentar(normalizar_nome(nome), Livro(
+                    nome, elem.findtext("autor", "").strip(), float(elem.findtext("preco", "0").strip() or 0)))
+                raiz.clear()
+        return seq, livros
+
+    def _escrever_snapshot_binario(self, livros, seq, origem):
+        """Escreve o snapshot binário correspondente ao XML com a assinatura origem."""
+        with etapa("escrever_snapshot_binario"):
+            escrever_snapshot_binario(self.caminho_binario, livros, seq, origem)
+
+    def _abrir_snapshot_binario(self, assinatura):
+        """Abre o snapshot binário se tiver sido gerado do XML com essa assinatura.
+
+        Devolve (seq, livros), com os livros a ler diretamente do mapeamento, ou None.
+        """
+        try:
+            base = SnapshotBinario(self.caminho_binario)
+        except (OSError, ValueError):
+            return None
+        if base.origem != assinatura:
+            return None
+        return base.seq, TabelaLivros(base=base)
+
+    def _ler_snapshots(self, assinatura):
+        """Lê o snapshot binário ou, se não corresponder ao XML, o XML. Devolve (seq, livros).
+
+        Depois de ler o XML (alterado por fora ou sem snapshot binário) gera o
+        snapshot binário, para os outros processos e os próximos arranques, e
+        passa também a usá-lo, para que a memória seja a partilhada.
+        """
+        if not SNAPSHOT_BINARIO:
+            return self._ler_snapshot()
+        lido = self._abrir_snapshot_binario(assinatura)
+        if lido is None:
+            seq, livros = self._ler_snapshot()
+            if self.somente_leitura:
+                return seq, livros
+            try:
+                # Com o bloqueio partilhado o XML não muda; processos que o gerem ao
+                # mesmo tempo escrevem o mesmo conteúdo e a substituição é atómica
+                self._escrever_snapshot_binario(livros.values(), seq, assinatura)
+            except OSError:
+                return seq, livros
+            lido = self._abrir_snapshot_binario(assinatura) or (seq, livros)
+        return lido
+
+    def _carregar(self):
+        """Lê o snapshot (binário ou XML) completo e reconstrói o índice por nome."""
+        assinatura = self._assinatura_ficheiro()
+        with etapa("ler_snapshot"):
+            seq, livros = self._ler_snapshots(assinatura) if assinatura else (0, TabelaLivros())
+        if self._ouvintes:
+            # Uma compactação não muda nada: só são notificados os nomes diferentes.
+            # A comparação é feita fora de _lock: quem está a sincronizar tem o bloqueio
+            # partilhado, por isso nenhuma escrita deste processo altera o catálogo atual.
+            anteriores = self._livros
+            alteradas = {c for c, l in livros.items() if anteriores.get(c) != l}
+            alteradas.update(c for c, _ in anteriores.items() if c not in livros)
+        # A leitura do snapshot é feita fora de _lock: as pesquisas só esperam pela troca
+        # O snapshot pode já incluir alterações que este processo não leu do diário
+        # antigo: a compactação deixa-as no início do diário novo
+        em_falta = self._registos_em_falta(seq) if self._ouvintes_alteracoes and seq != self._seq else []
+        with self._lock:
+            if self._ouvintes:
+                self._notificar(alteradas)
+            if seq != self._seq:
+                # Sem os registos em falta, os assinantes têm de recomeçar (None)
+                self._publicar([_alteracao(r) for r in em_falta] if em_falta else None, seq)
+            self._livros = livros
+            self._seq = seq
+            self._seq_snapshot = seq
+            self._assinatura = assinatura
+            self._inode_diario = None
+            self._posicao_diario = 0
+            self._registos_diario = 0
+
+    def _registos_em_falta(self, seq):
+        """Registos do diário entre o seq atual e o `seq` de um snapshot novo.
+
+        Devolve [] se o diário (retido pela compactação) não os tiver todos.
+        """
+        if seq < self._seq:
+            return []
+        try:
+            with open(self.caminho_diario, "rb") as f:
+                registos = self._registos(f.read(), self._seq)[0]
+        except FileNotFoundError:
+            return []
+        em_falta = [r for r in registos if self._seq < r["seq"] <= seq]
+        if [r["seq"] for r in em_falta] != list(range(self._seq + 1, seq + 1)):
+            return []
+        return em_falta
+
+    @staticmethod
+    def _registos(dados, depois=None):
+        """Registos das linhas completas de `dados`. Devolve (registos, bytes lidos).
+
+        Com `depois`, só os registos com seq maior: os registos estão por ordem de
+        seq, e os anteriores (retidos por uma compactação) não são descodificados.
+        """
+        # Uma última linha sem '\n' ainda está a ser escrita: fica para a próxima leitura
+        fim = dados.rfind(b"\n") + 1
+        linhas = [linha for linha in dados[:fim].splitlines() if linha.strip()]
+        if depois is not None:
+            linhas = linhas[bisect_right(linhas, depois, key=_seq_linha):]
+        registos = []
+        for linha in linhas:
+            try:
+                registos.append(json.loads(linha))
+            except ValueError:
+                # Registo truncado por uma falha a meio da escrita
+                continue
+        return registos, fim
+
+    def _ler_diario(self):
+        """Aplica os registos novos do diário. Devolve False se for preciso recarregar tudo."""
+        try:
+            st = os.stat(self.caminho_diario)
+        except FileNotFoundError:
+            return True
+        if self._inode_diario is None:
+            self._inode_diario = st.st_ino
+        elif st.st_ino != self._inode_diario or st.st_size < self._posicao_diario:
+            # O diário foi substituído por uma compactação
+            return False
+        if st.st_size == self._posicao_diario:
+            return True
+
+        with etapa("ler_diario"):
+            with open(self.caminho_diario, "rb") as f:
+                f.seek(self._posicao_diario)
+                # Num diário novo, os registos retidos pela compactação já estão no snapshot
+                registos, fim = self._registos(f.read(), self._seq_snapshot if self._posicao_diario == 0 else None)
+        with self._lock:
+            novos = [r for r in registos if r["seq"] > self._seq]
+            for registo in novos:
+                self._aplicar_registo(registo)
+            self._notificar({normalizar_nome(r["nome"]) for r in novos})
+            if novos:
+                self._publicar([_alteracao(r) for r in novos], self._seq)
+            # Os registos retidos por uma compactação não contam para a próxima
+            self._registos_diario += sum(1 for r in registos if r["seq"] > self._seq_snapshot)
+            self._posicao_diario += fim
+        return True
+
+    def _aplicar_registo(self, registo):
+        """Aplica um registo do diário ao estado em memória."""
+        chave = normalizar_nome(registo["nome"])
+        if registo["op"] == "gravar":
+            self._livros[chave] = Livro(registo["nome"], registo["autor"], registo["preco"])
+        elif registo["op"] == "eliminar":
+            self._livros.pop(chave, None)
+        self._seq = registo["seq"]
+
+    def alterado_em_disco(self):
+        """Verifica com stat (sem bloqueios) se o snapshot ou o diário mudaram."""
+        if self._assinatura is None or self._assinatura_ficheiro() != self._assinatura:
+            return True
+        try:
+            st = os.stat(self.caminho_diario)
+        except FileNotFoundError:
+            return False
+        return st.st_ino != self._inode_diario or st.st_size != self._posicao_diario
+
+    def sincronizar(self):
+        """Atualiza o catálogo com o que mudou em disco desde a última leitura."""
+        if not self.alterado_em_disco():
+            return
+        # O bloqueio partilhado garante que nenhum processo está a meio de uma
+        # escrita ou compactação enquanto o snapshot e o diário são lidos. Só uma
+        # thread sincroniza de cada vez; _lock é usado apenas para alterar o estado.
+        with self._bloqueio():
+            if self._assinatura is None or self._assinatura_ficheiro() != self._assinatura:
+                self._carregar()
+            if not self._ler_diario():
+                self._carregar()
+                self._ler_diario()
+
+    # Escrita no diário
+    def _abrir_diario(self):
+        """Devolve o descritor de escrita do diário, reabrindo-o se foi substituído."""
+        try:
+            inode = os.stat(self.caminho_diario).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self._fd_diario is None or inode != self._inode_fd_diario:
+            if self._fd_diario is not None:
+                os.close(self._fd_diario)
+            self._fd_diario = os.open(self.caminho_diario, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            self._inode_fd_diario = os.fstat(self._fd_diario).st_ino
+        return self._fd_diario
+
+    def _anexar(self, registos):
+        """Acrescenta registos ao diário numa única escrita e sincroniza-os com o disco.
+
+        Chamado com o bloqueio exclusivo. Devolve (inode, posição inicial, posição final).
+        """
+        with etapa("escrever_diario"):
+            fd = self._abrir_diario()
+            dados = b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in registos)
+            # Se uma escrita anterior ficou a meio, começa numa linha nova
+            tamanho = os.fstat(fd).st_size
+            if tamanho and os.pread(fd, 1, tamanho - 1) != b"\n":
+                dados = b"\n" + dados
+            os.write(fd, dados)
+        if DIARIO_FSYNC:
+            with etapa("fsync"):
+                os.fsync(fd)
+        return self._inode_fd_diario, tamanho, tamanho + len(dados)
+
+    def _executar(self, operacoes):
+        """Submete operações e espera que sejam aplicadas e escritas no diário.
+
+        Os pedidos que chegam enquanto outro está a ser escrito ficam em fila;
+        o próximo líder aplica-os todos com uma só aquisição do bloqueio
+        exclusivo e um único fsync para o grupo.
+        """
+        pedido = _Pedido(operacoes)
+        with self._fila_lock:
+            self._fila.append(pedido)
+        with self._lock_escrita:
+            if not pedido.concluido:
+                with self._fila_lock:
+                    lote, self._fila = self._fila, []
+                with self._bloqueio(exclusivo=True):
+                    self._aplicar_lote(lote)
+        if pedido.erro is not None:
+            raise pedido.erro
+        return pedido.resultados
+
+    def _aplicar_lote(self, lote):
+        """Aplica os pedidos do lote em memória e escreve os seus registos no diário.
+
+        Um pedido inválido só falha sozinho: os seus registos são desfeitos e
+        os restantes pedidos do grupo são gravados. Uma falha a sincronizar ou
+        a escrever o diário faz falhar todos os pedidos do grupo.
+        """
+        registos = []
+        try:
+            # Com o bloqueio exclusivo, o estado lido aqui é o mais recente de todos os processos
+            self.sincronizar()
+            with self._lock:
+                for pedido in lote:
+                    self._aplicar_pedido(pedido, registos)
+                self._notificar({normalizar_nome(r["nome"]) for r in registos})
+            if registos:
+                inode, inicio, fim = self._anexar(registos)
+                with self._lock:
+                    # Os registos já estão aplicados: avança a leitura do diário para depois deles
+                    if self._inode_diario in (None, inode) and self._posicao_diario == inicio:
+                        self._inode_diario = inode
+                        self._posicao_diario = fim
+                        self._registos_diario += len(registos)
+                    # Só depois de estarem no diário; ainda com o bloqueio exclusivo, por isso
+                    # nenhuma alteração de outro processo pode ser publicada antes destas
+                    self._publicar([_alteracao(r) for r in registos], registos[-1]["seq"])
+        except Exception as e:
+            # O estado em memória pode não corresponder ao disco: força uma releitura
+            with self._lock:
+                self._assinatura = None
+            for pedido in lote:
+                if pedido.erro is None:
+                    pedido.erro = e
+        finally:
+            for pedido in lote:
+                pedido.concluido = True
+
+    def _aplicar_pedido(self, pedido, registos):
+        """Aplica as operações de um pedido, ou nenhuma se alguma falhar. Chamado com _lock."""
+        anteriores = []  # (chave, Livro antes da operação), para desfazer
+        seq, inicio = self._seq, len(registos)
+        try:
+            pedido.resultados = [self._operacao(op, registos, anteriores) for op in pedido.operacoes]
+        except Exception as e:
+            for chave, livro in reversed(anteriores):
+                if livro is None:
+                    self._livros.pop(chave, None)
+                else:
+                    self._livros[chave] = livro
+            del registos[inicio:]
+            self._seq = seq
+            pedido.resultados = None
+            pedido.erro = e
+
+    def _operacao(self, operacao, registos, anteriores):
+        """Valida uma operação, aplica-a em memória e junta o registo resultante.
+
+        Junta a anteriores o estado do livro antes da alteração.
+        """
+        tipo, nome = operacao[0], operacao[1]
+        atual = self._livros.get(normalizar_nome(nome))
+        if tipo == "inserir":
+            if atual is not None:
+                return False
+            _, nome, autor, preco = operacao
+            registo = {"op": "gravar", "nome": nome, "autor": autor, "preco": float(preco)}
+        elif tipo == "atualizar":
+            if atual is None:
+                return False
+            _, _, autor, preco = operacao
+            registo = {
+                "op": "gravar",
+                "nome": atual.nome,
+                "autor": autor or atual.autor,
+                "preco": float(preco) if preco is not None else atual.preco,
+            }
+        elif tipo == "eliminar":
+            if atual is None:
+                return False
+            registo = {"op": "eliminar", "nome": atual.nome}
+        else:
+            raise ValueError(f"Operação desconhecida: {tipo}")
+        registo["seq"] = self._seq + 1
+        anteriores.append((normalizar_nome(registo["nome"]), atual))
+        self._aplicar_registo(registo)
+        registos.append(registo)
+        return True
+
+    # Compactação
+    def compactar(self):
+        """Reescreve o XML e o snapshot binário com o estado atual e começa um diário novo.
+
+        O diário novo fica só com os últimos DIARIO_RETER registos (já incluídos no snapshot).
+        """
+        with self._lock_escrita, self._bloqueio(exclusivo=True):
+            self.sincronizar()
+            with self._lock:
+                if self._registos_diario == 0:
+                    return
+                livros = self._livros.copia()
+                seq = self._seq
+            self._escrever_snapshot(livros.values(), seq)
+            if SNAPSHOT_BINARIO:
+                # A substituição do XML mantém o inode, o mtime e o tamanho do temporário
+                self._escrever_snapshot_binario(livros.values(), seq, self._assinatura_ficheiro())
+
+            # Os registos do diário antigo já estão todos no snapshot; os últimos ficam
+            # para os processos que ainda não os leram (ver _registos_em_falta)
+            novo = f"{self.caminho_diario}.{os.getpid()}.tmp"
+            with open(novo, "wb") as f:
+                f.write(self._cauda_diario())
+                if DIARIO_FSYNC:
+                    with etapa("fsync"):
+                        os.fsync(f.fileno())
+            os.replace(novo, self.caminho_diario)
+            with self._lock:
+                self._assinatura = None
+            self.sincronizar()
+
+    def _cauda_diario(self):
+        """Últimas DIARIO_RETER linhas completas do diário atual (bytes)."""
+        if DIARIO_RETER <= 0:
+            return b""
+        try:
+            with open(self.caminho_diario, "rb") as f:
+                dados = f.read()
+        except FileNotFoundError:
+            return b""
+        linhas = [linha for linha in dados[:dados.rfind(b"\n") + 1].splitlines(keepends=True) if linha.strip()]
+        return b"".join(linhas[-DIARIO_RETER:])
+
+    def _compactador(self):
+        """Ciclo do compactador em segundo plano."""
+        while not self._parar.wait(COMPACTAR_INTERVALO):
+            try:
+                if self._registos_diario >= COMPACTAR_MINIMO:
+                    self.compactar()
+            except Exception:
+                # Uma falha na compactação não perde dados: tenta de novo no próximo ciclo
+                pass
+
+    def fechar(self):
+        """Pára o compactador e deixa o XML atualizado (usado à saída do processo)."""
+        self._parar.set()
+        if self.somente_leitura:
+            return
+        try:
+            self.compactar()
+        except Exception:
+            pass
+
+    # Operações sobre o catálogo
+    def procurar(self, nome, sincronizar=True):
+        """Devolve o Livro com esse nome ou None.
+
+        Com sincronizar=False consulta apenas a memória, sem stat nem leituras do disco.
+        """
+        if sincronizar:
+            self.sincronizar()
+        with etapa("procurar"), self._lock:
+            return self._livros.get(normalizar_nome(nome))
+
+    def procurar_varios(self, nomes, sincronizar=True):
+        if sincronizar:
+            self.sincronizar()
+        with etapa("procurar"), self._lock:
+            return [self._livros.get(normalizar_nome(nome)) for nome in nomes]
+
+    def listar(self, filtro=None, sincronizar=True):
+        if sincronizar:
+            self.sincronizar()
+        with etapa("listar"):
+            # Os Livro são criados a partir de uma cópia das colunas, sem bloquear as escritas
+            with self._lock:
+                livros = self._livros.copia()
+            if filtro is None:
+                return list(livros.values())
+            return [livro for livro in livros.values() if filtro(livro)]
+
+    def instantaneo(self):
+        self.sincronizar()
+        with self._lock:
+            seq, livros = self._seq, self._livros.copia()
+        return seq, list(livros.values())
+
+    def aplicar(self, operacoes):
+        """Aplica as operações em memória e escreve-as no diário num só registo de grupo."""
+        if self.somente_leitura:
+            raise PermissionError(f"Catálogo aberto só para leitura: {self.caminho}")
+        return self._executar(list(operacoes))
+
+    def ficheiros(self):
+        return [self.caminho, self.caminho_diario, self.caminho_binario]
+
+    def __len__(self):
+        self.sincronizar()
+        with self._lock:
+            return len(self._livros)
+
+
+def _alteracao(registo):
+    """Converte um registo do diário numa Alteracao."""
+    return Alteracao(registo["seq"], registo["op"], registo["nome"], registo.get("autor"), registo.get("preco"))
+
+
+def tipo_armazenamento(caminho):
+    """"sqlite" para ficheiros .db, .sqlite ou .sqlite3 e "xml" para os restantes."""
+    return "sqlite" if caminho.lower().endswith(EXTENSOES_SQLITE) else "xml"
+
+
+def caminho_catalogo():
+    """Ficheiro do catálogo configurado com LIVROS_ARMAZENAMENTO, LIVROS_XML e LIVROS_SQLITE."""
+    if LIVROS_ARMAZENAMENTO == "sqlite":
+        return LIVROS_SQLITE
+    if LIVROS_ARMAZENAMENTO != "xml":
+        raise ValueError(f"LIVROS_ARMAZENAMENTO desconhecido: {LIVROS_ARMAZENAMENTO}")
+    return LIVROS_XML
+
+
+def abrir_catalogo(caminho, importar_de=None, somente_leitura=False):
+    """Cria o armazenamento adequado ao ficheiro (um objeto novo, não partilhado).
+
+    Uma base de dados SQLite criada de novo é preenchida com o catálogo XML
+    `importar_de`, se existir. somente_leitura abre o XML sem o reescrever
+    (ver CatalogoLivros); o SQLite não reescreve a base de dados ao fechar.
+    """
+    if tipo_armazenamento(caminho) == "sqlite":
+        from armazenamento_sqlite import CatalogoSQLite
+
+        return CatalogoSQLite(caminho, importar_de)
+    return CatalogoLivros(caminho, somente_leitura)
+
+
+# Um catálogo por ficheiro, partilhado por todos os pedidos do processo
+_catalogos = {}
+_catalogos_lock = threading.Lock()
+
+
+def obter_catalogo(caminho=None):
+    """Devolve o catálogo (único no processo) associado ao ficheiro indicado.
+
+    Sem caminho usa o armazenamento configurado; ao passar para SQLite, a
+    base de dados nova importa o livros.xml existente.
+    """
+    with _catalogos_lock:
+        chave = caminho or caminho_catalogo()
+        catalogo = _catalogos.get(chave)
+        if catalogo is None:
+            catalogo = _catalogos[chave] = abrir_catalogo(chave, importar_de=None if caminho else LIVROS_XML)
+        return catalogo
+
+
+def _apos_fork():
+    global _catalogos_lock
+    _catalogos_lock = threading.Lock()
+    for catalogo in _catalogos.values():
+        catalogo._apos_fork()
+
+
+os.register_at_fork(after_in_child=_apos_fork)
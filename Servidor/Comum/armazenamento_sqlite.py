@@ -0,0 +1,323 @@
+# Armazenamento do catálogo numa base de dados SQLite
+#
+# Alternativa ao livros.xml + diário para catálogos grandes. Os livros ficam
+# numa tabela com índice único pelo nome normalizado, por isso as pesquisas e
+# as atualizações são O(log n) e o catálogo não tem de estar todo em memória.
+# A base de dados usa o modo WAL: os leitores (de todos os processos) não
+# esperam pelos escritores e cada chamada a aplicar() é uma única transação.
+#
+# Cada alteração acrescenta também uma linha à tabela `alteracoes`, com um
+# número de sequência crescente e o estado novo do livro. É por ela que cada
+# processo descobre, ao sincronizar, os nomes alterados pelos outros
+# servidores e avisa os ouvintes (caches, índices e o feed de alterações),
+# tal como o CatalogoLivros faz com o diário.
+#
+# As ligações ao SQLite não podem ser partilhadas entre threads a meio de uma
+# transação, por isso cada thread usa a sua. As instruções são sempre as
+# mesmas, com parâmetros, e ficam preparadas na cache de cada ligação.
+import atexit
+import os
+import sqlite3
+import threading
+
+from armazenamento import DIARIO_FSYNC, Alteracao, ArmazenamentoLivros, CatalogoLivros, Livro, normalizar_nome
+from metricas import etapa
+
+# Alterações mantidas na tabela `alteracoes` para os outros processos lerem
+SQLITE_ALTERACOES = int(os.environ.get("LIVROS_SQLITE_ALTERACOES", "100000"))
+# Segundos que uma escrita espera pelo bloqueio da base de dados
+SQLITE_TIMEOUT = float(os.environ.get("LIVROS_SQLITE_TIMEOUT", "30"))
+
+# Instruções preparadas por ligação (cached_statements)
+INSTRUCOES_PREPARADAS = 64
+# Parâmetros por consulta em procurar_varios (o SQLite antigo limita a 999)
+NOMES_POR_CONSULTA = 500
+
+ESQUEMA = (
+    """CREATE TABLE IF NOT EXISTS livros (
+        id INTEGER PRIMARY KEY,
+        chave TEXT NOT NULL,
+        nome TEXT NOT NULL,
+        autor TEXT NOT NULL,
+        preco REAL NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS livros_chave ON livros (chave)",
+    # AUTOINCREMENT: os números de sequência nunca são reutilizados, mesmo depois de apagar linhas
+    # nome, autor e preco: o livro depois da alteração (em "eliminar", só o nome)
+    """CREATE TABLE IF NOT EXISTS alteracoes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        op TEXT NOT NULL,
+        chave TEXT NOT NULL,
+        nome TEXT,
+        autor TEXT,
+        preco REAL
+    )""",
+)
+# Colunas de `alteracoes` que faltam nas bases de dados criadas antes de existirem
+COLUNAS_ALTERACOES = {"nome": "TEXT", "autor": "TEXT", "preco": "REAL"}
+
+PROCURAR = "SELECT nome, autor, preco FROM livros WHERE chave = ?"
+LISTAR = "SELECT nome, autor, preco FROM livros ORDER BY id"
+CONTAR = "SELECT COUNT(*) FROM livros"
+INSERIR = "INSERT OR IGNORE INTO livros (chave, nome, autor, preco) VALUES (?, ?, ?, ?)"
+ATUALIZAR = "UPDATE livros SET autor = ?, preco = ? WHERE chave = ?"
+ELIMINAR = "DELETE FROM livros WHERE chave = ?"
+REGISTAR = "INSERT INTO alteracoes (op, chave, nome, autor, preco) VALUES (?, ?, ?, ?, ?)"
+ULTIMA_ALTERACAO = "SELECT COALESCE(MAX(seq), 0) FROM alteracoes"
+ALTERACOES_DESDE = "SELECT seq, op, chave, nome, autor, preco FROM alteracoes WHERE seq > ? ORDER BY seq"
+APAGAR_ALTERACOES = "DELETE FROM alteracoes WHERE seq <= ?"
+
+
+class CatalogoSQLite(ArmazenamentoLivros):
+    """Catálogo guardado numa base de dados SQLite em modo WAL."""
+
+    def __init__(self, caminho, importar_de=None):
+        self.caminho = caminho
+        self._lock = threading.RLock()  # protege _seq e os ouvintes
+        self._ouvintes = []
+        self._ouvintes_alteracoes = []
+        self._iniciar_locks()
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        ligacao = self._ligacao()
+        # O modo WAL fica gravado no ficheiro; não pode ser mudado dentro de uma transação
+        ligacao.execute("PRAGMA journal_mode = WAL")
+        self._criar_esquema(ligacao, importar_de)
+        # Último número de sequência de `alteracoes` já notificado aos ouvintes
+        self._seq = ligacao.execute(ULTIMA_ALTERACAO).fetchone()[0]
+        # O ficheiro aberto: uma base de dados posta no seu lugar tem outro inode
+        estado = os.stat(caminho)
+        self._ficheiro = (estado.st_dev, estado.st_ino)
+        atexit.register(self.fechar)
+
+    def _iniciar_locks(self):
+        self._lock_escrita = threading.Lock()  # uma transação de escrita de cada vez neste processo
+        self._lock_sincronizar = threading.Lock()
+        self._locais = threading.local()
+        self._ligacoes = []
+        self._ligacoes_lock = threading.Lock()
+
+    def _apos_fork(self):
+        """Num processo filho as ligações do pai não podem ser usadas: cada thread abre outra."""
+        # Também não podem ser fechadas no filho; ficam referenciadas para nunca serem libertadas
+        self._herdadas = getattr(self, "_herdadas", []) + self._ligacoes
+        self._lock = threading.RLock()
+        self._iniciar_locks()
+
+    def _ligacao(self):
+        """Ligação da thread atual, aberta na primeira utilização."""
+        ligacao = getattr(self._locais, "ligacao", None)
+        if ligacao is None:
+            # isolation_level=None: as transações são abertas explicitamente com BEGIN
+            ligacao = sqlite3.connect(self.caminho, timeout=SQLITE_TIMEOUT, isolation_level=None,
+                                      check_same_thread=False, cached_statements=INSTRUCOES_PREPARADAS)
+            # Em WAL, NORMAL só sincroniza nos checkpoints (como LIVROS_DIARIO_FSYNC=0)
+            ligacao.execute("PRAGMA synchronous = " + ("FULL" if DIARIO_FSYNC else "NORMAL"))
+            self._locais.ligacao = ligacao
+            with self._ligacoes_lock:
+                self._ligacoes.append(ligacao)
+        return ligacao
+
+    def _criar_esquema(self, ligacao, importar_de):
+        """Cria as tabelas e, numa base de dados nova, importa o catálogo XML.
+
+        Tudo numa transação exclusiva: quando vários servidores arrancam ao
+        mesmo tempo, só o primeiro cria e preenche a base de dados.
+        """
+        ligacao.execute("BEGIN IMMEDIATE")
+        try:
+            nova = ligacao.execute("SELECT 1 FROM sqlite_master WHERE name = 'livros'").fetchone() is None
+            for instrucao in ESQUEMA:
+                ligacao.execute(instrucao)
+            colunas = {linha[1] for linha in ligacao.execute("PRAGMA table_info(alteracoes)")}
+            for coluna, tipo in COLUNAS_ALTERACOES.items():
+                if coluna not in colunas:
+                    ligacao.execute(f"ALTER TABLE alteracoes ADD COLUMN {coluna} {tipo}")
+            if nova and importar_de and os.path.exists(importar_de):
+                # Só leitura: o XML importado não é compactado nem reescrito ao fechar
+                origem = CatalogoLivros(importar_de, somente_leitura=True)
+                try:
+                    ligacao.executemany(INSERIR, ((normalizar_nome(l.nome), l.nome, l.autor, l.preco)
+                                                  for l in origem.listar()))
+                finally:
+                    origem.fechar()
+            ligacao.execute("COMMIT")
+        except BaseException:
+            ligacao.execute("ROLLBACK")
+            raise
+
+    # Escritas
+    def aplicar(self, operacoes):
+        """Aplica as operações numa só transação e regista-as na tabela `alteracoes`."""
+        operacoes = list(operacoes)
+        ligacao = self._ligacao()
+        alteracoes = []
+        with self._lock_escrita:
+            ligacao.execute("BEGIN IMMEDIATE")
+            try:
+                with etapa("escrever"):
+                    resultados = [self._operacao(ligacao, operacao, alteracoes) for operacao in operacoes]
+                    if alteracoes:
+                        ligacao.executemany(REGISTAR, alteracoes)
+                        fim = ligacao.execute(ULTIMA_ALTERACAO).fetchone()[0]
+                        inicio = fim - len(alteracoes) + 1
+                        # A cada mil alterações descarta as mais antigas que SQLITE_ALTERACOES
+                        if fim > SQLITE_ALTERACOES and fim // 1000 != (inicio - 1) // 1000:
+                            ligacao.execute(APAGAR_ALTERACOES, (fim - SQLITE_ALTERACOES,))
+                # O COMMIT é onde o SQLite sincroniza o WAL com o disco
+                with etapa("fsync"):
+                    ligacao.execute("COMMIT")
+            except BaseException:
+                ligacao.execute("ROLLBACK")
+                raise
+        if alteracoes:
+            with self._lock:
+                self._notificar({alteracao[1] for alteracao in alteracoes})
+                # Sem alterações de outros processos pelo meio, estas já não voltam a ser notificadas
+                publicadas = self._seq == inicio - 1
+                if publicadas:
+                    self._publicar([Alteracao(seq, op, nome, autor, preco) for seq, (op, _, nome, autor, preco)
+                                    in enumerate(alteracoes, inicio)], fim)
+                    self._seq = fim
+            if not publicadas:
+                # As alterações têm de ser publicadas por ordem, depois das dos outros processos
+                self.sincronizar()
+        return resultados
+
+    def _operacao(self, ligacao, operacao, alteracoes):
+        """Executa uma operação e junta (op, chave, nome, autor, preco) a `alteracoes` se mudou o livro."""
+        tipo, nome = operacao[0], operacao[1]
+        chave = normalizar_nome(nome)
+        if tipo == "inserir":
+            _, nome, autor, preco = operacao
+            preco = float(preco)
+            if ligacao.execute(INSERIR, (chave, nome, autor, preco)).rowcount <= 0:
+                return False
+            alteracoes.append(("gravar", chave, nome, autor, preco))
+            return True
+        if tipo not in ("atualizar", "eliminar"):
+            raise ValueError(f"Operação desconhecida: {tipo}")
+
+        # O estado atual (na mesma transação) dá o livro completo a registar
+        atual = ligacao.execute(PROCURAR, (chave,)).fetchone()
+        if atual is None:
+            return False
+        if tipo == "atualizar":
+            _, _, autor, preco = operacao
+            autor = autor or atual[1]
+            preco = float(preco) if preco is not None else atual[2]
+            ligacao.execute(ATUALIZAR, (autor, preco, chave))
+            alteracoes.append(("gravar", chave, atual[0], autor, preco))
+        else:
+            ligacao.execute(ELIMINAR, (chave,))
+            alteracoes.append(("eliminar", chave, atual[0], None, None))
+        return True
+
+    def _identidade(self):
+        return self._ficheiro
+
+    # Alterações de outros processos
+    def alterado_em_disco(self):
+        return self._ligacao().execute(ULTIMA_ALTERACAO).fetchone()[0] != self._seq
+
+    def sincronizar(self):
+        """Avisa os ouvintes dos nomes alterados por outros processos desde a última vez.
+
+        As leituras vão sempre à base de dados, por isso não dependem disto;
+        só as caches e os índices construídos sobre o catálogo precisam.
+        """
+        with self._lock_sincronizar:
+            with etapa("ler_alteracoes"):
+                linhas = self._ligacao().execute(ALTERACOES_DESDE, (self._seq,)).fetchall()
+            if not linhas:
+                return
+            with self._lock:
+                novas = [Alteracao._make(linha[:2] + linha[3:]) for linha in linhas if linha[0] > self._seq]
+                if linhas[0][0] > self._seq + 1:
+                    # As alterações intermédias já foram descartadas: tudo pode ter mudado
+                    self._notificar(None)
+                    self._publicar(None, linhas[-1][0])
+                elif novas:
+                    self._notificar({linha[2] for linha in linhas if linha[0] > self._seq})
+                    if any(alteracao.nome is None for alteracao in novas):
+                        # Linhas de uma versão anterior, sem o estado do livro
+                        self._publicar(None, novas[-1].seq)
+                    else:
+                        self._publicar(novas, novas[-1].seq)
+                self._seq = max(self._seq, linhas[-1][0])
+
+    # Leituras (sincronizar só afeta os ouvintes, a base de dados está sempre atual)
+    def procurar(self, nome, sincronizar=True):
+        if sincronizar:
+            self.sincronizar()
+        with etapa("procurar"):
+            linha = self._ligacao().execute(PROCURAR, (normalizar_nome(nome),)).fetchone()
+        return Livro._make(linha) if linha else None
+
+    def procurar_varios(self, nomes, sincronizar=True):
+        if sincronizar:
+            self.sincronizar()
+        chaves = [normalizar_nome(nome) for nome in nomes]
+        encontrados = {}
+        ligacao = self._ligacao()
+        # Uma transação de leitura: todos os blocos veem o mesmo estado
+        with etapa("procurar"):
+            ligacao.execute("BEGIN")
+            try:
+                for i in range(0, len(chaves), NOMES_POR_CONSULTA):
+                    bloco = chaves[i:i + NOMES_POR_CONSULTA]
+                    consulta = (f"SELECT chave, nome, autor, preco FROM livros "
+                                f"WHERE chave IN ({','.join('?' * len(bloco))})")
+                    for chave, nome, autor, preco in ligacao.execute(consulta, bloco):
+                        encontrados[chave] = Livro(nome, autor, preco)
+            finally:
+                ligacao.execute("COMMIT")
+        return [encontrados.get(chave) for chave in chaves]
+
+    def listar(self, filtro=None, sincronizar=True):
+        if sincronizar:
+            self.sincronizar()
+        with etapa("listar"):
+            livros = map(Livro._make, self._ligacao().execute(LISTAR))
+            if filtro is None:
+                return list(livros)
+            return [livro for livro in livros if filtro(livro)]
+
+    def instantaneo(self):
+        ligacao = self._ligacao()
+        # Uma transação de leitura: o seq e os livros correspondem ao mesmo estado
+        ligacao.execute("BEGIN")
+        try:
+            seq = ligacao.execute(ULTIMA_ALTERACAO).fetchone()[0]
+            livros = list(map(Livro._make, ligacao.execute(LISTAR)))
+        finally:
+            ligacao.execute("COMMIT")
+        return seq, livros
+
+    def ficheiros(self):
+        return [self.caminho, self.caminho + "-wal"]
+
+    def __len__(self):
+        return self._ligacao().execute(CONTAR).fetchone()[0]
+
+    # Manutenção
+    def compactar(self):
+        """Descarta as alterações antigas e passa o WAL para a base de dados."""
+        ligacao = self._ligacao()
+        with self._lock_escrita:
+            ultima = ligacao.execute(ULTIMA_ALTERACAO).fetchone()[0]
+            ligacao.execute(APAGAR_ALTERACOES, (ultima - SQLITE_ALTERACOES,))
+        ligacao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def fechar(self):
+        """Fecha as ligações de todas as threads (usado à saída do processo)."""
+        with self._ligacoes_lock:
+            ligacoes, self._ligacoes = self._ligacoes, []
+        for ligacao in ligacoes:
+            try:
+                ligacao.close()
+            except sqlite3.Error:
+                pass
+        self._locais = threading.local()
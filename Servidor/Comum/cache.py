@@ -0,0 +1,92 @@
+# Cache LRU de respostas, limitada em tamanho e com tempo de vida
+#
+# Usada pelos servidores para guardar respostas já serializadas por nome
+# normalizado (incluindo respostas negativas). A cache é invalidada pelo
+# catálogo: catalogo.adicionar_ouvinte(cache.invalidar) remove os nomes
+# alterados por qualquer servidor assim que a alteração é lida.
+import threading
+import time
+from collections import OrderedDict
+
+# Valor devolvido por obter() quando a chave não está na cache
+AUSENTE = object()
+
+
+class CacheLRU:
+    """Cache LRU thread-safe com capacidade máxima e TTL (segundos, 0 = sem limite)."""
+
+    def __init__(self, capacidade, ttl=0):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # chave -> (valor, expira_em)
+        self._lock = threading.Lock()
+        # Incrementada em cada invalidação; ver guardar()
+        self.geracao = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+        self.invalidacoes = 0
+
+    def obter(self, chave):
+        """Devolve o valor guardado ou AUSENTE (conta um acerto ou uma falha)."""
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                valor, expira_em = entrada
+                if not expira_em or expira_em > time.monotonic():
+                    self._entradas.move_to_end(chave)
+                    self.acertos += 1
+                    return valor
+                del self._entradas[chave]
+            self.falhas += 1
+            return AUSENTE
+
+    def guardar(self, chave, valor, geracao):
+        """Guarda o valor calculado a partir do estado visto na geração indicada.
+
+        A geração deve ser lida antes de consultar o catálogo: se entretanto
+        houve uma invalidação, o valor pode já estar desatualizado e não é guardado.
+        """
+        if self.capacidade <= 0:
+            return
+        with self._lock:
+            if geracao != self.geracao:
+                return
+            self._entradas[chave] = (valor, time.monotonic() + self.ttl if self.ttl > 0 else 0)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+                self.despejos += 1
+
+    def invalidar(self, chaves):
+        """Remove as chaves indicadas, ou todas com chaves=None (ouvinte do catálogo)."""
+        with self._lock:
+            self.geracao += 1
+            if chaves is None:
+                self.invalidacoes += len(self._entradas)
+                self._entradas.clear()
+                return
+            for chave in chaves:
+                if self._entradas.pop(chave, None) is not None:
+                    self.invalidacoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self.geracao += 1
+            self._entradas.clear()
+
+    def estatisticas(self):
+        """Contadores para dimensionar a cache."""
+        with self._lock:
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "despejos": self.despejos,
+                "invalidacoes": self.invalidacoes,
+                "tamanho": len(self._entradas),
+                "capacidade": self.capacidade,
+            }
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entradas)
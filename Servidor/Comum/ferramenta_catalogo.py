@@ -0,0 +1,81 @@
+# Importação e exportação do catálogo entre livros.xml e SQLite
+#
+# Uso:
+#     python ferramenta_catalogo.py importar /data/livros.xml /data/livros.db
+#     python ferramenta_catalogo.py exportar /data/livros.db /data/livros.xml [--substituir]
+#
+# O catálogo de origem é lido por inteiro (no XML, snapshot e diário) e escrito
+# no destino em lotes, cada um numa só escrita. O destino tem de estar vazio,
+# a não ser com --substituir, que apaga primeiro os ficheiros do destino; nesse
+# caso os servidores que usam o destino devem estar parados.
+import argparse
+import os
+import sys
+
+from armazenamento import abrir_catalogo, tipo_armazenamento
+
+# Livros por escrita no destino
+TAMANHO_LOTE = 10000
+
+# Ficheiros auxiliares de cada armazenamento, além do principal (no XML, os
+# caminho_diario, caminho_bloqueio e caminho_binario de CatalogoLivros)
+FICHEIROS_AUXILIARES = {"xml": (".diario", ".lock", ".bin"), "sqlite": ("-wal", "-shm")}
+
+
+def apagar_catalogo(caminho):
+    for sufixo in ("",) + FICHEIROS_AUXILIARES[tipo_armazenamento(caminho)]:
+        try:
+            os.remove(caminho + sufixo)
+        except FileNotFoundError:
+            pass
+
+
+def copiar_catalogo(origem, destino, substituir=False):
+    """Copia todos os livros de `origem` para `destino`. Devolve o número de livros copiados."""
+    if not os.path.exists(origem):
+        raise FileNotFoundError(f"Catálogo de origem não encontrado: {origem}")
+    if substituir:
+        apagar_catalogo(destino)
+
+    # A origem não é alterada: no XML, fechar() normal compactaria o catálogo
+    fonte = abrir_catalogo(origem, somente_leitura=True)
+    try:
+        livros = fonte.listar()
+    finally:
+        fonte.fechar()
+
+    alvo = abrir_catalogo(destino)
+    try:
+        if len(alvo):
+            raise ValueError(f"O catálogo de destino não está vazio: {destino} (use --substituir)")
+        for i in range(0, len(livros), TAMANHO_LOTE):
+            alvo.aplicar(("inserir", l.nome, l.autor, l.preco) for l in livros[i:i + TAMANHO_LOTE])
+    finally:
+        # No XML, fechar() compacta: o destino fica como um snapshot sem diário
+        alvo.fechar()
+    return len(livros)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa e exporta o catálogo de livros entre XML e SQLite.")
+    parser.add_argument("comando", choices=("importar", "exportar"),
+                        help="importar: XML -> SQLite; exportar: SQLite -> XML")
+    parser.add_argument("origem")
+    parser.add_argument("destino")
+    parser.add_argument("--substituir", action="store_true", help="apaga o destino antes de copiar")
+    args = parser.parse_args()
+
+    esperados = ("xml", "sqlite") if args.comando == "importar" else ("sqlite", "xml")
+    if (tipo_armazenamento(args.origem), tipo_armazenamento(args.destino)) != esperados:
+        parser.error(f"{args.comando} copia de {esperados[0]} para {esperados[1]} "
+                     f"(as bases de dados SQLite terminam em .db, .sqlite ou .sqlite3)")
+    try:
+        quantidade = copiar_catalogo(args.origem, args.destino, args.substituir)
+    except (OSError, ValueError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"{quantidade} livros copiados de {args.origem} para {args.destino}.")
+
+
+if __name__ == "__main__":
+    main()
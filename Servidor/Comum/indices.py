@@ -0,0 +1,335 @@
+# Índices em memória sobre o catálogo de livros
+#
+# O catálogo devolve os livros pela ordem de inserção. Para listagens
+# paginadas por cursor é mantida aqui uma vista ordenada pelo nome
+# normalizado, com um índice por autor. A vista não relê o catálogo: é
+# atualizada de forma incremental com os nomes que o catálogo notifica como
+# alterados.
+#
+# Os índices não guardam os livros: só os nomes normalizados, ordenados, e o
+# necessário para os retirar dos índices quando mudam. Os livros devolvidos
+# são lidos do catálogo (procurar_varios), que já os tem em memória.
+#
+# IndicePesquisa acrescenta os índices da pesquisa por texto e preço: um
+# índice invertido (token -> nomes), o vocabulário ordenado para procurar
+# tokens por prefixo e a lista ordenada por preço para intervalos. Não tem
+# vista própria: é uma extensão da vista IndiceLivros do mesmo catálogo.
+import math
+import os
+import re
+import sys
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+
+from armazenamento import normalizar_nome, obter_catalogo
+from metricas import etapa
+
+# Acima desta fração de nomes alterados reconstrói-se a vista inteira
+FRACAO_RECONSTRUCAO = 0.25
+# Nomes lidos de cada vez do catálogo quando a página filtra por preço
+LOTE_LEITURA = 256
+
+
+def _remover(lista, chave):
+    """Remove a chave de uma lista ordenada, se existir."""
+    i = bisect_right(lista, chave) - 1
+    if i >= 0 and lista[i] == chave:
+        del lista[i]
+
+
+class IndiceLivros:
+    """Vista do catálogo ordenada pelo nome normalizado, com índice por autor."""
+
+    def __init__(self, catalogo):
+        self.catalogo = catalogo
+        self._lock = threading.Lock()  # protege a vista e as extensões
+        # Nomes alterados ainda por aplicar (None = reconstruir tudo). Tem um
+        # lock próprio porque é preenchido pelo catálogo enquanto este detém o seu lock.
+        self._pendentes = set()
+        self._pendentes_lock = threading.Lock()
+        self._chaves = []  # nomes normalizados, ordenados
+        self._autores = {}  # nome normalizado -> autor normalizado (com que foi indexado)
+        self._por_autor = {}  # autor normalizado -> nomes normalizados, ordenados
+        self._extensoes = []  # índices (IndicePesquisa) mantidos junto com esta vista
+        # O ouvinte é registado antes da leitura: o que mudar entretanto fica pendente
+        catalogo.adicionar_ouvinte(self._alterados)
+        catalogo.sincronizar()
+        with self._lock:
+            self._reconstruir()
+
+    def _alterados(self, chaves):
+        with self._pendentes_lock:
+            if chaves is None:
+                self._pendentes = None
+            elif self._pendentes is not None:
+                self._pendentes.update(chaves)
+
+    def estender(self, extensao):
+        """Passa a manter a extensão (com _construir, _indexar e _desindexar) junto com a vista."""
+        self.catalogo.sincronizar()
+        with self._lock:
+            self._extensoes.append(extensao)
+            self._reconstruir()
+
+    def _reconstruir(self):
+        with self._pendentes_lock:
+            self._pendentes = set()
+        # Os Livro lidos só existem durante a construção
+        livros = sorted(((normalizar_nome(l.nome), l) for l in self.catalogo.listar(sincronizar=False)),
+                        key=itemgetter(0))
+        self._chaves = [chave for chave, _ in livros]
+        self._construir_indices(livros)
+        for extensao in self._extensoes:
+            extensao._construir(livros)
+
+    def _construir_indices(self, livros):
+        """Constrói de raiz o índice por autor a partir de [(nome normalizado, Livro)] ordenados."""
+        self._autores = {}
+        self._por_autor = {}
+        for chave, livro in livros:
+            autor = self._autores[chave] = sys.intern(normalizar_nome(livro.autor))
+            self._por_autor.setdefault(autor, []).append(chave)
+
+    def atualizar(self):
+        """Sincroniza o catálogo e aplica à vista os nomes alterados desde a última vez."""
+        self.catalogo.sincronizar()
+        with self._lock:
+            with self._pendentes_lock:
+                pendentes, self._pendentes = self._pendentes, set()
+            if pendentes is not None and not pendentes:
+                return
+            if pendentes is None or len(pendentes) > max(1000, len(self._chaves) * FRACAO_RECONSTRUCAO):
+                self._reconstruir()
+                return
+            pendentes = list(pendentes)
+            for chave, livro in zip(pendentes, self.catalogo.procurar_varios(pendentes, sincronizar=False)):
+                self._aplicar(chave, livro)
+
+    def _aplicar(self, chave, livro):
+        indexado = chave in self._autores
+        if indexado:
+            self._desindexar(chave)
+            for extensao in self._extensoes:
+                extensao._desindexar(chave)
+        if livro is None:
+            if indexado:
+                _remover(self._chaves, chave)
+            return
+        if not indexado:
+            insort(self._chaves, chave)
+        self._indexar(chave, livro)
+        for extensao in self._extensoes:
+            extensao._indexar(chave, livro)
+
+    def _indexar(self, chave, livro):
+        """Acrescenta o livro ao índice por autor."""
+        autor = self._autores[chave] = sys.intern(normalizar_nome(livro.autor))
+        insort(self._por_autor.setdefault(autor, []), chave)
+
+    def _desindexar(self, chave):
+        """Retira o livro (com o autor com que foi indexado) do índice por autor."""
+        autor = self._autores.pop(chave)
+        _remover(self._por_autor[autor], chave)
+        if not self._por_autor[autor]:
+            del self._por_autor[autor]
+
+    def pagina(self, quantidade, depois=None, autor=None, preco_min=None, preco_max=None):
+        """Devolve ([(chave, Livro), ...], ha_mais) a seguir ao nome normalizado `depois`.
+
+        Os livros vêm por ordem do nome normalizado; `autor` (sem distinção de
+        maiúsculas) usa o índice por autor e o intervalo de preço é inclusivo.
+        """
+        self.atualizar()
+        filtra_preco = preco_min is not None or preco_max is not None
+        with self._lock:
+            chaves = self._por_autor.get(normalizar_nome(autor), []) if autor else self._chaves
+            i = bisect_right(chaves, depois) if depois is not None else 0
+            resultado = []
+            while i < len(chaves) and len(resultado) <= quantidade:
+                # Sem filtro de preço basta ler os que faltam (um livro eliminado
+                # entretanto vem a None e obriga a ler mais)
+                falta = quantidade + 1 - len(resultado)
+                lote = chaves[i:i + (max(falta, LOTE_LEITURA) if filtra_preco else falta)]
+                i += len(lote)
+                for chave, livro in zip(lote, self.catalogo.procurar_varios(lote, sincronizar=False)):
+                    if livro is not None and (preco_min is None or livro.preco >= preco_min) \
+                            and (preco_max is None or livro.preco <= preco_max):
+                        resultado.append((chave, livro))
+        return resultado[:quantidade], len(resultado) > quantidade
+
+
+_PALAVRAS = re.compile(r"\w+")
+
+
+def tokens(texto):
+    """Palavras do texto em minúsculas e sem acentos ("José Saramago" -> ["jose", "saramago"])."""
+    decomposto = unicodedata.normalize("NFKD", texto.lower())
+    return _PALAVRAS.findall("".join(c for c in decomposto if not unicodedata.combining(c)))
+
+
+class IndicePesquisa:
+    """Pesquisa por partes do título ou do autor e por intervalo de preço.
+
+    Cada termo da pesquisa corresponde aos livros com uma palavra (do título
+    ou do autor) que comece por ele, e todos os termos têm de corresponder.
+    A pesquisa começa pelo critério mais seletivo (o termo com menos livros
+    ou o intervalo de preço) e verifica os restantes só nesses candidatos.
+
+    Os índices são uma extensão da vista IndiceLivros indicada: é ela que os
+    mantém atualizados, com o seu lock, e não há uma segunda cópia dos nomes.
+    """
+
+    def __init__(self, vista):
+        self.vista = vista
+        self._entradas = {}  # nome normalizado -> entrada de _por_preco
+        self._por_token = {}  # palavra -> nomes normalizados
+        self._vocabulario = []
+        # (preço, nome normalizado, palavras): a pesquisa por intervalo percorre só esta
+        # lista. As palavras (do título e do autor) são uma só string " palavra palavra ...",
+        # em que "termo" é prefixo de uma palavra se " termo" estiver contido
+        self._por_preco = []
+        vista.estender(self)
+
+    def _construir(self, livros):
+        self._entradas = {}
+        self._por_token = {}
+        for chave, livro in livros:
+            palavras = self._palavras(livro)
+            self._entradas[chave] = (livro.preco, chave, " " + " ".join(palavras))
+            for palavra in palavras:
+                self._por_token.setdefault(palavra, set()).add(chave)
+        self._vocabulario = sorted(self._por_token)
+        self._por_preco = sorted(self._entradas.values())
+
+    @staticmethod
+    def _palavras(livro):
+        return tuple(set(tokens(livro.nome)) | set(tokens(livro.autor)))
+
+    def _indexar(self, chave, livro):
+        palavras = self._palavras(livro)
+        entrada = self._entradas[chave] = (livro.preco, chave, " " + " ".join(palavras))
+        for palavra in palavras:
+            nomes = self._por_token.get(palavra)
+            if nomes is None:
+                nomes = self._por_token[palavra] = set()
+                insort(self._vocabulario, palavra)
+            nomes.add(chave)
+        insort(self._por_preco, entrada)
+
+    def _desindexar(self, chave):
+        entrada = self._entradas.pop(chave)
+        for palavra in entrada[2].split():
+            nomes = self._por_token[palavra]
+            nomes.discard(chave)
+            if not nomes:
+                del self._por_token[palavra]
+                _remover(self._vocabulario, palavra)
+        _remover(self._por_preco, entrada)
+
+    def _estimar(self, termo, maximo):
+        """Ocorrências de palavras começadas por `termo` (parando acima de `maximo`), sem juntar conjuntos."""
+        i = bisect_left(self._vocabulario, termo)
+        total = 0
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(termo) and total <= maximo:
+            total += len(self._por_token[self._vocabulario[i]])
+            i += 1
+        return total
+
+    def _com_prefixo(self, termo):
+        """Nomes com uma palavra começada por `termo`."""
+        i = bisect_left(self._vocabulario, termo)
+        nomes = set()
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(termo):
+            nomes |= self._por_token[self._vocabulario[i]]
+            i += 1
+        return nomes
+
+    def _corresponde(self, chave, termos):
+        """True se todos os `termos` (já com o espaço à frente) forem prefixo de uma palavra do livro."""
+        palavras = self._entradas[chave][2]
+        return all(map(palavras.__contains__, termos))
+
+    def pesquisar(self, texto="", preco_min=None, preco_max=None, limite=20):
+        """Devolve ([Livro, ...], ha_mais) com os livros que correspondem a todos os critérios.
+
+        Os resultados vêm por ordem de preço (e nome, no mesmo preço); o
+        intervalo de preço é inclusivo.
+        """
+        self.vista.atualizar()
+        # Termos mais longos primeiro: costumam ser os mais seletivos
+        termos = sorted(set(tokens(texto)), key=len, reverse=True)
+        with etapa("pesquisar"), self.vista._lock:
+            preco = itemgetter(0)
+            inicio = bisect_left(self._por_preco, preco_min, key=preco) if preco_min is not None else 0
+            fim = bisect_right(self._por_preco, preco_max, key=preco) if preco_max is not None else len(self._por_preco)
+            # Com k candidatos, ordená-los custa ~k, e percorrer o intervalo de preço até
+            # encontrar `limite` resultados custa ~limite * intervalo / k: acima deste
+            # limiar de candidatos é mais rápido percorrer o intervalo
+            limiar = math.isqrt(max(limite, 1) * max(fim - inicio, 0))
+            escolhido = None
+            for termo in termos:
+                estimativa = self._estimar(termo, limiar)
+                if estimativa <= limiar:
+                    escolhido, limiar = termo, estimativa
+            prefixos = [" " + termo for termo in termos]
+
+            chaves = []
+            if escolhido is None:
+                for i in range(inicio, fim):
+                    _, chave, palavras = self._por_preco[i]
+                    if all(map(palavras.__contains__, prefixos)):
+                        chaves.append(chave)
+                        if len(chaves) > limite:
+                            break
+            else:
+                restantes = [" " + t for t in termos if t != escolhido]
+                ordenados = sorted(self._entradas[c][:2] for c in self._com_prefixo(escolhido)
+                                   if self._corresponde(c, restantes))
+                for valor, chave in ordenados:
+                    if (preco_min is None or valor >= preco_min) and (preco_max is None or valor <= preco_max):
+                        chaves.append(chave)
+                        if len(chaves) > limite:
+                            break
+            livros = self.vista.catalogo.procurar_varios(chaves[:limite], sincronizar=False)
+        return [livro for livro in livros if livro is not None], len(chaves) > limite
+
+
+# Um índice por tipo e ficheiro do catálogo, partilhado por todos os pedidos do processo
+_indices = {}
+_indices_lock = threading.Lock()
+
+
+def _obter(classe, caminho, criar):
+    with _indices_lock:
+        indice = _indices.get((classe, caminho))
+        if indice is None:
+            indice = _indices[(classe, caminho)] = criar()
+        return indice
+
+
+def obter_indice(caminho=None):
+    """Devolve o índice (único no processo) do catálogo associado ao ficheiro indicado.
+
+    Sem caminho usa o catálogo configurado (ver obter_catalogo).
+    """
+    return _obter(IndiceLivros, caminho, lambda: IndiceLivros(obter_catalogo(caminho)))
+
+
+def obter_indice_pesquisa(caminho=None):
+    """Como obter_indice, mas com os índices da pesquisa por texto e preço (sobre a mesma vista)."""
+    vista = obter_indice(caminho)
+    return _obter(IndicePesquisa, caminho, lambda: IndicePesquisa(vista))
+
+
+def _apos_fork():
+    global _indices_lock
+    _indices_lock = threading.Lock()
+    for indice in _indices.values():
+        if isinstance(indice, IndiceLivros):
+            indice._lock = threading.Lock()
+            indice._pendentes_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_apos_fork)
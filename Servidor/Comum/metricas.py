@@ -0,0 +1,464 @@
+# Métricas dos servidores no formato de texto do Prometheus
+#
+# Cada servidor conta os pedidos e mede a sua duração por operação e estado
+# (instrumentar_flask nos servidores Flask, um interceptor no gRPC), e mede as
+# etapas internas com etapa(nome): ler o pedido, validar, ler o catálogo do
+# disco, procurar, escrever o diário, fsync, serializar a resposta... O tamanho
+# do catálogo e dos seus ficheiros é calculado só quando as métricas são lidas.
+#
+# Medir custa um perf_counter e uma atualização protegida por um lock, por
+# isso as métricas podem ficar ligadas em produção (METRICAS=0 desliga-as).
+#
+# Os servidores correm em vários processos (gunicorn, GRPC_PROCESSOS) e o
+# pedido a /metrics chega só a um deles. Cada processo grava periodicamente as
+# suas séries num ficheiro JSON, numa pasta comum aos processos do mesmo
+# servidor, e quem responde soma os ficheiros de todos os processos vivos e os
+# totais acumulados dos que já terminaram.
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICAS = os.environ.get("METRICAS", "1") != "0"
+# Pasta dos ficheiros de cada processo (uma subpasta por servidor em execução)
+METRICAS_DIR = os.environ.get("METRICAS_DIR", os.path.join(tempfile.gettempdir(), "livros_metricas"))
+# Segundos entre gravações das métricas de cada processo
+METRICAS_INTERVALO = float(os.environ.get("METRICAS_INTERVALO", "5"))
+
+TIPO_CONTEUDO = "text/plain; version=0.0.4; charset=utf-8"
+
+# Limites (em segundos) dos intervalos dos histogramas
+LIMITES_PEDIDO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_ETAPA = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+def _rotulos(nomes, valores):
+    if not nomes:
+        return ""
+    pares = ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores))
+    return "{" + pares + "}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Contador:
+    """Contador com rótulos, somado entre processos."""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._iniciar()
+
+    def _iniciar(self):
+        self._lock = threading.Lock()
+        self._series = {}  # valores dos rótulos -> valor
+
+    def incrementar(self, *valores, quantidade=1):
+        with self._lock:
+            self._series[valores] = self._series.get(valores, 0) + quantidade
+
+    def _exportar(self):
+        with self._lock:
+            return [[list(valores), total] for valores, total in self._series.items()]
+
+    @staticmethod
+    def _somar(destino, valores, total):
+        destino[valores] = destino.get(valores, 0) + total
+
+    def _linhas(self, series):
+        for valores, total in sorted(series.items()):
+            yield f"{self.nome}{_rotulos(self.rotulos, valores)} {total}"
+
+
+class Histograma:
+    """Histograma com rótulos (intervalos cumulativos, soma e contagem), somado entre processos."""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_PEDIDO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites)
+        self._iniciar()
+
+    def _iniciar(self):
+        self._lock = threading.Lock()
+        self._series = {}  # valores dos rótulos -> [contagem de cada intervalo..., +Inf, soma]
+
+    def observar(self, valor, *valores):
+        i = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [0] * (len(self.limites) + 1) + [0.0]
+            serie[i] += 1
+            serie[-1] += valor
+
+    def _exportar(self):
+        with self._lock:
+            return [[list(valores), list(serie)] for valores, serie in self._series.items()]
+
+    @staticmethod
+    def _somar(destino, valores, serie):
+        atual = destino.get(valores)
+        destino[valores] = serie if atual is None else [a + b for a, b in zip(atual, serie)]
+
+    def _linhas(self, series):
+        nomes = self.rotulos + ("le",)
+        for valores, serie in sorted(series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.limites + ("+Inf",), serie):
+                acumulado += contagem
+                yield f"{self.nome}_bucket{_rotulos(nomes, valores + (limite,))} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, valores)} {serie[-1]}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, valores)} {acumulado}"
+
+
+class Medidor:
+    """Valor calculado no momento da leitura por funcao(), que devolve [(valores dos rótulos, valor)]."""
+
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, rotulos, funcao):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.funcao = funcao
+
+    def _linhas(self):
+        try:
+            series = list(self.funcao())
+        except Exception:
+            # Uma leitura que falha (por exemplo, o catálogo ainda não existe) não impede as restantes
+            return
+        for valores, valor in series:
+            yield f"{self.nome}{_rotulos(self.rotulos, valores)} {valor}"
+
+
+# Métricas comuns a todos os servidores
+PEDIDOS = Contador("livros_pedidos_total", "Pedidos atendidos, por operação e estado.", ("operacao", "estado"))
+DURACAO_PEDIDOS = Histograma("livros_pedido_duracao_segundos", "Duração dos pedidos, por operação e estado.",
+                             ("operacao", "estado"))
+ETAPAS = Histograma("livros_etapa_duracao_segundos",
+                    "Duração das etapas internas (leitura, validação, catálogo, escrita, serialização).",
+                    ("etapa",), LIMITES_ETAPA)
+_metricas = [PEDIDOS, DURACAO_PEDIDOS, ETAPAS]
+_medidores = []
+
+
+def registar_medidor(nome, ajuda, rotulos, funcao):
+    _medidores.append(Medidor(nome, ajuda, rotulos, funcao))
+
+
+def observar_pedido(operacao, estado, duracao):
+    if METRICAS:
+        PEDIDOS.incrementar(operacao, estado)
+        DURACAO_PEDIDOS.observar(duracao, operacao, estado)
+
+
+class _Cronometro:
+    __slots__ = ("nome", "inicio")
+
+    def __init__(self, nome):
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+
+    def __exit__(self, *excecao):
+        ETAPAS.observar(time.perf_counter() - self.inicio, self.nome)
+
+
+_SEM_MEDICAO = nullcontext()
+
+
+def etapa(nome):
+    """Mede a duração do bloco with como a etapa `nome`."""
+    return _Cronometro(nome) if METRICAS else _SEM_MEDICAO
+
+
+def cronometrar(funcao, nome):
+    """Devolve funcao com cada chamada medida como a etapa `nome` (ou a própria funcao sem métricas)."""
+    if not METRICAS:
+        return funcao
+
+    def medida(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            ETAPAS.observar(time.perf_counter() - inicio, nome)
+    return medida
+
+
+# Tamanho do catálogo, lido só quando as métricas são pedidas
+def _livros_catalogo():
+    from armazenamento import obter_catalogo
+
+    return [((), len(obter_catalogo()))]
+
+
+def _bytes_catalogo():
+    from armazenamento import obter_catalogo
+
+    series = []
+    for caminho in obter_catalogo().ficheiros():
+        try:
+            series.append(((os.path.basename(caminho),), os.path.getsize(caminho)))
+        except OSError:
+            pass
+    return series
+
+
+registar_medidor("livros_catalogo_livros", "Número de livros no catálogo.", (), _livros_catalogo)
+registar_medidor("livros_catalogo_bytes", "Tamanho dos ficheiros do catálogo.", ("ficheiro",), _bytes_catalogo)
+
+
+# Partilha entre os processos do mesmo servidor. A pasta tem o pid do processo
+# que importou o módulo: os processos criados depois com fork herdam-na.
+_pasta = os.path.join(METRICAS_DIR, str(os.getpid()))
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _limpar_pastas_antigas():
+    """Apaga as pastas de servidores que já terminaram."""
+    try:
+        pastas = os.listdir(METRICAS_DIR)
+    except OSError:
+        return
+    for nome in pastas:
+        if nome.isdigit() and not _vivo(int(nome)):
+            caminho = os.path.join(METRICAS_DIR, nome)
+            # Outro processo pode estar a apagar a mesma pasta
+            try:
+                for ficheiro in os.listdir(caminho):
+                    os.remove(os.path.join(caminho, ficheiro))
+                os.rmdir(caminho)
+            except OSError:
+                pass
+
+
+# Séries somadas dos processos que já terminaram, e o lock de quem as atualiza
+MORTOS = "mortos.json"
+MORTOS_LOCK = "mortos.lock"
+
+
+def _escrever_json(ficheiro, dados):
+    temporario = ficheiro + ".tmp"
+    with open(temporario, "w") as f:
+        json.dump(dados, f)
+    os.replace(temporario, ficheiro)
+
+
+def _gravar():
+    """Grava as séries deste processo no seu ficheiro (de forma atómica)."""
+    dados = {metrica.nome: metrica._exportar() for metrica in _metricas}
+    os.makedirs(_pasta, exist_ok=True)
+    # O ficheiro temporário de cada processo é outro: não há dois a escrever no mesmo
+    _escrever_json(os.path.join(_pasta, f"{os.getpid()}.json"), dados)
+
+
+def _gravar_periodicamente():
+    while True:
+        time.sleep(METRICAS_INTERVALO)
+        try:
+            _gravar()
+        except OSError:
+            pass
+
+
+def _ler_series(caminho):
+    """Conteúdo de um ficheiro de séries, ou None se já não existir."""
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        return {}
+
+
+def _somar_series(somas, por_nome, dados):
+    for nome_metrica, series in dados.items():
+        metrica = por_nome.get(nome_metrica)
+        if metrica is None:
+            continue
+        for valores, valor in series:
+            metrica._somar(somas[nome_metrica], tuple(valores), valor)
+
+
+def _recolher_mortos(caminhos, por_nome):
+    """Junta as séries dos processos terminados às de MORTOS e apaga os seus ficheiros.
+
+    Assim os contadores do servidor não descem quando um trabalhador é
+    reiniciado (como o mark_process_dead do prometheus_client). O flock
+    impede que dois processos a responder a /metrics recolham o mesmo
+    ficheiro duas vezes.
+    """
+    with open(os.path.join(_pasta, MORTOS_LOCK), "a") as trinco:
+        fcntl.flock(trinco, fcntl.LOCK_EX)
+        somas = {nome: {} for nome in por_nome}
+        _somar_series(somas, por_nome, _ler_series(os.path.join(_pasta, MORTOS)) or {})
+        recolhidos = []
+        for caminho in caminhos:
+            dados = _ler_series(caminho)
+            if dados is not None:  # None: já recolhido por outro processo
+                _somar_series(somas, por_nome, dados)
+                recolhidos.append(caminho)
+        if not recolhidos:
+            return
+        _escrever_json(os.path.join(_pasta, MORTOS),
+                       {nome: [[list(valores), valor] for valores, valor in series.items()]
+                        for nome, series in somas.items()})
+        for caminho in recolhidos:
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+def _agregar():
+    """Soma as séries dos ficheiros deste servidor: processos vivos e MORTOS."""
+    somas = {metrica.nome: {} for metrica in _metricas}
+    por_nome = {metrica.nome: metrica for metrica in _metricas}
+    try:
+        nomes = os.listdir(_pasta)
+    except FileNotFoundError:
+        nomes = []
+    # Processos que terminaram (por exemplo, trabalhadores reiniciados pelo gunicorn)
+    mortos = [os.path.join(_pasta, nome) for nome in nomes
+              if nome.endswith(".json") and nome[:-5].isdigit() and not _vivo(int(nome[:-5]))]
+    if mortos:
+        try:
+            _recolher_mortos(mortos, por_nome)
+        except OSError:
+            pass
+        nomes = os.listdir(_pasta)
+    for nome in nomes:
+        if not nome.endswith(".json") or os.path.join(_pasta, nome) in mortos:
+            continue
+        dados = _ler_series(os.path.join(_pasta, nome))
+        if dados:
+            _somar_series(somas, por_nome, dados)
+    return somas
+
+
+def texto_metricas():
+    """Todas as métricas do servidor no formato de texto do Prometheus."""
+    linhas = []
+    if METRICAS:
+        _gravar()
+        somas = _agregar()
+        for metrica in _metricas:
+            linhas += [f"# HELP {metrica.nome} {metrica.ajuda}", f"# TYPE {metrica.nome} {metrica.tipo}"]
+            linhas.extend(metrica._linhas(somas[metrica.nome]))
+    for medidor in _medidores:
+        linhas += [f"# HELP {medidor.nome} {medidor.ajuda}", f"# TYPE {medidor.nome} {medidor.tipo}"]
+        linhas.extend(medidor._linhas())
+    return "\n".join(linhas) + "\n"
+
+
+# Exposição em /metrics
+def instrumentar_flask(app):
+    """Conta e mede os pedidos da aplicação Flask e acrescenta a rota /metrics.
+
+    A operação é o método e a regra da rota (por exemplo "POST /REST"), não o
+    caminho pedido, para o número de séries não crescer com os URLs.
+    """
+    from flask import Response, g, request
+
+    partilhar()
+    if METRICAS:
+        @app.before_request
+        def _iniciar_medicao():
+            g.inicio_pedido = time.perf_counter()
+
+        @app.after_request
+        def _terminar_medicao(resposta):
+            inicio = g.pop("inicio_pedido", None)
+            if inicio is not None:
+                regra = request.url_rule.rule if request.url_rule is not None else "desconhecida"
+                observar_pedido(f"{request.method} {regra}", str(resposta.status_code),
+                                time.perf_counter() - inicio)
+            return resposta
+
+    app.add_url_rule("/metrics", "metricas", lambda: Response(texto_metricas(), content_type=TIPO_CONTEUDO))
+
+
+def servir_http(porta):
+    """Serve /metrics numa thread, num servidor HTTP próprio (usado pelo gRPC)."""
+
+    class PedidoMetricas(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            corpo = texto_metricas().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", TIPO_CONTEUDO)
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    partilhar()
+    servidor = ThreadingHTTPServer(("", porta), PedidoMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True).start()
+    return servidor
+
+
+_partilhado = False
+
+
+def _iniciar_gravacao():
+    if METRICAS_INTERVALO > 0:
+        threading.Thread(target=_gravar_periodicamente, name="metricas", daemon=True).start()
+
+
+def partilhar():
+    """Começa a gravar periodicamente as métricas deste processo, para as somar às dos outros.
+
+    Chamado pelos servidores (as ferramentas que só usam o catálogo não gravam
+    nada). Os processos criados depois com fork também gravam as suas.
+    """
+    global _partilhado
+    if METRICAS and not _partilhado:
+        _partilhado = True
+        _limpar_pastas_antigas()
+        _iniciar_gravacao()
+
+
+def _apos_fork():
+    # O filho começa com as suas próprias séries; as do pai continuam no ficheiro do pai
+    for metrica in _metricas:
+        metrica._iniciar()
+    if _partilhado:
+        _iniciar_gravacao()
+
+
+if METRICAS:
+    os.register_at_fork(after_in_child=_apos_fork)
@@ -0,0 +1,80 @@
+# Arranque dos servidores Flask (REST, SOAP e GraphQL)
+#
+# Em produção as aplicações correm no gunicorn com vários processos, threads
+# (gthread) ou greenlets (gevent) e keep-alive. O servidor de desenvolvimento
+# do Flask (app.run) fica disponível com SERVIDOR_MODO=desenvolvimento.
+import os
+
+# Configuração (variáveis de ambiente)
+SERVIDOR_MODO = os.environ.get("SERVIDOR_MODO", "producao")  # "producao" ou "desenvolvimento"
+WSGI_PROCESSOS = int(os.environ.get("WSGI_PROCESSOS", str(os.cpu_count() or 1)))
+WSGI_CLASSE = os.environ.get("WSGI_CLASSE", "gthread")  # "gthread" ou "gevent"
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", "8"))  # threads por processo (gthread)
+WSGI_LIGACOES = int(os.environ.get("WSGI_LIGACOES", "1000"))  # ligações por processo (gevent)
+WSGI_KEEPALIVE = int(os.environ.get("WSGI_KEEPALIVE", "5"))  # segundos
+WSGI_TIMEOUT = int(os.environ.get("WSGI_TIMEOUT", "30"))  # segundos
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # por exemplo em Windows, onde o gunicorn não corre
+    BaseApplication = None
+
+
+def opcoes_gunicorn(porta, inicializar=None, processos=None, classe=None):
+    """Configuração do gunicorn para uma aplicação a escutar na porta indicada.
+
+    `processos` e `classe` substituem WSGI_PROCESSOS e WSGI_CLASSE.
+    """
+    classe = classe or WSGI_CLASSE
+    opcoes = {
+        "bind": f"0.0.0.0:{porta}",
+        "workers": processos or WSGI_PROCESSOS,
+        "worker_class": classe,
+        "keepalive": WSGI_KEEPALIVE,
+        "timeout": WSGI_TIMEOUT,
+        "accesslog": None,
+    }
+    if classe == "gevent":
+        opcoes["worker_connections"] = WSGI_LIGACOES
+    else:
+        opcoes["threads"] = WSGI_THREADS
+    if inicializar is not None:
+        # O armazenamento é criado uma vez em cada processo, já no trabalhador: com
+        # gevent só depois do monkey-patch (feito em init_process, após o post_fork),
+        # para os locks, Events e threads do catálogo serem os do gevent
+        opcoes["post_worker_init"] = lambda trabalhador: inicializar()
+    return opcoes
+
+
+if BaseApplication is not None:
+    class AplicacaoGunicorn(BaseApplication):
+        """Corre uma aplicação WSGI já importada no gunicorn, sem ficheiro de configuração."""
+
+        def __init__(self, app, opcoes):
+            self.aplicacao = app
+            self.opcoes = opcoes
+            super().__init__()
+
+        def load_config(self):
+            for chave, valor in self.opcoes.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            return self.aplicacao
+
+
+def servir_app(app, porta, inicializar=None, debug=False, processos=None, classe=None):
+    """Inicia a aplicação Flask no modo configurado em SERVIDOR_MODO.
+
+    `inicializar` é chamado em cada processo do gunicorn antes de servir o
+    primeiro pedido, ou antes de arrancar o servidor de desenvolvimento (por
+    exemplo para abrir o catálogo). `debug` só é usado em desenvolvimento.
+    `processos` e `classe` fixam o número de processos e a classe de
+    trabalhadores do gunicorn, em vez de WSGI_PROCESSOS e WSGI_CLASSE.
+    """
+    if SERVIDOR_MODO == "desenvolvimento" or BaseApplication is None:
+        if inicializar is not None:
+            inicializar()
+        app.run(host="0.0.0.0", port=porta, debug=debug)
+    else:
+        AplicacaoGunicorn(app, opcoes_gunicorn(porta, inicializar, processos, classe)).run()
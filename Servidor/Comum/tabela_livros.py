@@ -0,0 +1,429 @@
+# Representação do catálogo em memória e snapshot binário
+#
+# Um dict {nome normalizado: Livro} custa mais de 400 bytes por livro (a chave,
+# o tuplo e três objetos por livro), pagos por cada processo servidor. A
+# TabelaLivros guarda os mesmos dados em colunas, com cerca de 70 bytes por
+# livro: os nomes em UTF-8 num só bytearray, o autor como índice numa tabela
+# de autores distintos, o preço num array('d') e o hash do nome normalizado.
+# O índice por nome é uma tabela de endereçamento aberto com os números das
+# linhas. Os Livro só são criados quando são lidos.
+#
+# Uma linha eliminada fica marcada (autor MORTO) até a tabela ser reempacotada,
+# quando as linhas mortas passam de REEMPACOTAR_FRACAO. Cada compactação do
+# catálogo também produz uma tabela nova, lida do snapshot.
+#
+# Snapshot binário (livros.xml.bin)
+#
+# Ler o XML custa segundos por cada milhão de livros, pagos por cada processo
+# que arranca ou recarrega o catálogo, e cada um fica com a sua cópia das
+# colunas. O snapshot binário guarda as colunas e o índice por nome já
+# construídos, no formato em que são usados: os processos abrem-no com mmap e
+# procuram diretamente no mapeamento, sem o ler nem copiar, e as páginas são
+# as da cache do sistema de ficheiros, partilhadas por todos os processos (e
+# contentores) que usam o mesmo ficheiro.
+#
+# Formato (versão 1, little-endian): o CABECALHO e as secções seguintes, cada
+# uma alinhada a 8 bytes:
+#   inicio_nome    uint64[livros + 1]  posição de cada nome em nomes (a última é o fim)
+#   autor          uint32[livros]      índice em nomes_autores
+#   preco          float64[livros]
+#   hash           uint32[livros]      hash_chave do nome normalizado
+#   indice         int32[posicoes]     linhas por hash, endereçamento aberto (VAZIO = livre)
+#   inicio_autor   uint64[autores + 1]
+#   nomes          UTF-8
+#   nomes_autores  UTF-8
+#
+# O cabeçalho guarda a identidade (inode, mtime, tamanho) do XML de onde o
+# snapshot saiu: o XML continua a ser o formato de importação e exportação e,
+# se mudar, o snapshot binário é gerado de novo.
+#
+# O mapeamento é privado (MAP_PRIVATE): as atualizações e eliminações lidas do
+# diário escrevem diretamente nas colunas autor e preco, e só essas páginas
+# passam a ser do processo. Os livros novos vão para as colunas próprias da
+# TabelaLivros, numeradas a seguir às do snapshot, e os raros nomes do
+# snapshot gravados com outra grafia para um dict.
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from collections import namedtuple
+
+# Registo imutável de um livro
+Livro = namedtuple("Livro", ["nome", "autor", "preco"])
+
+MORTO = 0xFFFFFFFF  # autor das linhas eliminadas
+VAZIO = -1  # posição livre do índice
+REEMPACOTAR_FRACAO = 0.5
+REEMPACOTAR_MINIMO = 1024
+
+# Snapshot binário
+MAGIA = b"LIVROSB\0"
+VERSAO = 1
+# magia, versão, seq, inode/mtime/tamanho do XML, livros, autores, posições do índice,
+# bytes dos nomes, bytes dos nomes dos autores
+CABECALHO = struct.Struct("<8sI4xqQqQQQQQQ")
+SECCOES = (("inicio_nome", "Q"), ("autor", "I"), ("preco", "d"), ("hash", "I"),
+           ("indice", "i"), ("inicio_autor", "Q"), ("nomes", "B"), ("nomes_autores", "B"))
+
+
+def normalizar_nome(nome):
+    """Chave usada no índice: nome sem espaços nas pontas e em minúsculas."""
+    return nome.strip().lower()
+
+
+def hash_chave(chave):
+    """Hash do nome normalizado, igual em todos os processos (ao contrário de hash())."""
+    return zlib.crc32(chave.encode("utf-8"))
+
+
+def _posicoes_indice(linhas):
+    """Tamanho do índice por nome (potência de 2) para uma ocupação máxima de 2/3."""
+    tamanho = 8
+    while tamanho * 2 < linhas * 3:
+        tamanho *= 2
+    return tamanho
+
+
+def _seccoes(livros, autores, posicoes, bytes_nomes, bytes_autores):
+    """Posições (início, fim) das secções do snapshot binário."""
+    itens = (livros + 1, livros, livros, livros, posicoes, autores + 1, bytes_nomes, bytes_autores)
+    posicao, seccoes = CABECALHO.size, []
+    for (_, tipo), quantidade in zip(SECCOES, itens):
+        fim = posicao + quantidade * array(tipo).itemsize
+        seccoes.append((posicao, fim))
+        posicao = (fim + 7) & ~7
+    return seccoes
+
+
+def escrever_snapshot_binario(caminho, livros, seq, origem):
+    """Escreve o snapshot binário dos livros (Livro com nomes distintos) de forma atómica.
+
+    origem é a identidade (inode, mtime, tamanho) do XML com o mesmo conteúdo.
+    """
+    nomes, inicio_nome = bytearray(), array("Q")
+    autor, preco, hashes = array("I"), array("d"), array("I")
+    autores = {}
+    for livro in livros:
+        inicio_nome.append(len(nomes))
+        nomes += livro.nome.encode("utf-8")
+        indice_autor = autores.get(livro.autor)
+        if indice_autor is None:
+            indice_autor = autores[livro.autor] = len(autores)
+        autor.append(indice_autor)
+        preco.append(livro.preco)
+        hashes.append(hash_chave(normalizar_nome(livro.nome)))
+    inicio_nome.append(len(nomes))
+
+    posicoes = _posicoes_indice(len(autor))
+    indice, mascara = array("i", [VAZIO]) * posicoes, posicoes - 1
+    for linha, h in enumerate(hashes):
+        i = h & mascara
+        while indice[i] != VAZIO:
+            i = (i + 1) & mascara
+        indice[i] = linha
+
+    nomes_autores, inicio_autor = bytearray(), array("Q")
+    for nome_autor in autores:  # pela ordem dos índices
+        inicio_autor.append(len(nomes_autores))
+        nomes_autores += nome_autor.encode("utf-8")
+    inicio_autor.append(len(nomes_autores))
+
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(CABECALHO.pack(MAGIA, VERSAO, seq, *origem, len(autor), len(autores),
+                               posicoes, len(nomes), len(nomes_autores)))
+        dados = (inicio_nome, autor, preco, hashes, indice, inicio_autor, nomes, nomes_autores)
+        for (inicio, _), coluna in zip(_seccoes(len(autor), len(autores), posicoes, len(nomes),
+                                                len(nomes_autores)), dados):
+            f.write(b"\0" * (inicio - f.tell()))
+            f.write(coluna)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+
+class SnapshotBinario:
+    """Snapshot binário aberto com mmap. As secções são memoryview sobre o mapeamento.
+
+    Lança ValueError se o ficheiro não for um snapshot binário desta versão.
+    """
+
+    def __init__(self, caminho):
+        with open(caminho, "rb") as f:
+            tamanho = os.fstat(f.fileno()).st_size
+            if tamanho < CABECALHO.size:
+                raise ValueError("Snapshot binário incompleto")
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        magia, versao, self.seq, inode, mtime, tamanho_xml, self.livros, self.autores, posicoes, \
+            bytes_nomes, bytes_autores = CABECALHO.unpack_from(self._mapa)
+        if magia != MAGIA or versao != VERSAO:
+            raise ValueError("Formato do snapshot binário desconhecido")
+        self.origem = (inode, mtime, tamanho_xml)
+        seccoes = _seccoes(self.livros, self.autores, posicoes, bytes_nomes, bytes_autores)
+        if seccoes[-1][1] > tamanho:
+            raise ValueError("Snapshot binário incompleto")
+        memoria = memoryview(self._mapa)
+        for (nome, tipo), (inicio, fim) in zip(SECCOES, seccoes):
+            setattr(self, nome, memoria[inicio:fim].cast(tipo))
+        self.mascara = posicoes - 1
+
+    def nome(self, linha):
+        return str(self.nomes[self.inicio_nome[linha]:self.inicio_nome[linha + 1]], "utf-8")
+
+    def nome_autor(self, indice):
+        return str(self.nomes_autores[self.inicio_autor[indice]:self.inicio_autor[indice + 1]], "utf-8")
+
+
+class TabelaLivros:
+    """Livros em colunas compactas, indexados pelo nome normalizado.
+
+    Tem a parte da interface de um dict {nome normalizado: Livro} usada pelo
+    catálogo (get, [chave] = livro, pop, in, len, values, items) e a mesma
+    ordem: a de inserção, que se mantém quando um livro é atualizado.
+
+    Com base (um SnapshotBinario), as primeiras linhas são as do snapshot e as
+    colunas próprias só guardam os livros acrescentados depois. Os índices dos
+    autores próprios continuam a numeração dos do snapshot.
+    """
+
+    def __init__(self, capacidade=0, base=None):
+        self._base = base
+        self._linhas_base = self._autores_base = self._vivos_base = 0
+        self._nomes_base = {}  # linha do snapshot -> nome gravado com outra grafia
+        if base is not None:
+            self._linhas_base = self._vivos_base = base.livros
+            self._autores_base = base.autores
+            self._autor_base, self._preco_base = base.autor, base.preco
+        self._criar_colunas()
+        self._criar_indice(capacidade)
+
+    def _criar_colunas(self):
+        self._nomes = bytearray()
+        self._inicio_nome = array("Q")
+        self._tamanho_nome = array("I")
+        self._autor = array("I")
+        self._preco = array("d")
+        self._hash = array("I")
+        self._autores = []  # índice - _autores_base -> autor
+        self._indice_autor = {}  # autor -> índice
+        self._vivos = 0
+
+    # Índice por nome das colunas próprias (endereçamento aberto com sondagem linear)
+    def _criar_indice(self, linhas):
+        tamanho = _posicoes_indice(linhas)
+        self._indice = array("i", [VAZIO]) * tamanho
+        self._mascara = tamanho - 1
+        indice, mascara = self._indice, self._mascara
+        for linha, h in enumerate(self._hash):
+            if self._autor[linha] != MORTO:
+                i = h & mascara
+                while indice[i] != VAZIO:
+                    i = (i + 1) & mascara
+                indice[i] = linha
+
+    def _localizar(self, chave, h):
+        """Devolve (linha da chave ou None, posição do índice próprio onde parou)."""
+        base = self._base
+        if base is not None:
+            indice, mascara, hashes, autores = base.indice, base.mascara, base.hash, self._autor_base
+            i = h & mascara
+            while True:
+                linha = indice[i]
+                if linha == VAZIO:
+                    break
+                if hashes[linha] == h and autores[linha] != MORTO and normalizar_nome(self._nome_base(linha)) == chave:
+                    return linha, None
+                i = (i + 1) & mascara
+
+        indice, mascara, hashes = self._indice, self._mascara, self._hash
+        i = h & mascara
+        while True:
+            linha = indice[i]
+            if linha == VAZIO:
+                return None, i
+            # O nome só é descodificado e comparado quando o hash coincide
+            if hashes[linha] == h and self._autor[linha] != MORTO:
+                inicio = self._inicio_nome[linha]
+                nome = self._nomes[inicio:inicio + self._tamanho_nome[linha]].decode("utf-8")
+                if normalizar_nome(nome) == chave:
+                    return self._linhas_base + linha, i
+            i = (i + 1) & mascara
+
+    # Colunas (as linhas próprias começam em _linhas_base)
+    def _nome(self, linha):
+        inicio = self._inicio_nome[linha]
+        return self._nomes[inicio:inicio + self._tamanho_nome[linha]].decode("utf-8")
+
+    def _nome_base(self, linha):
+        nome = self._nomes_base.get(linha)
+        return self._base.nome(linha) if nome is None else nome
+
+    def _id_autor(self, autor):
+        indice = self._indice_autor.get(autor)
+        if indice is None:
+            indice = self._indice_autor[autor] = self._autores_base + len(self._autores)
+            self._autores.append(autor)
+        return indice
+
+    def _nome_autor(self, indice):
+        if indice < self._autores_base:
+            return self._base.nome_autor(indice)
+        return self._autores[indice - self._autores_base]
+
+    def _livro(self, linha):
+        if linha < self._linhas_base:
+            return Livro(self._nome_base(linha), self._nome_autor(self._autor_base[linha]), self._preco_base[linha])
+        linha -= self._linhas_base
+        return Livro(self._nome(linha), self._nome_autor(self._autor[linha]), self._preco[linha])
+
+    # Interface de dict
+    def __len__(self):
+        return self._vivos_base + self._vivos
+
+    def __contains__(self, chave):
+        return self._localizar(chave, hash_chave(chave))[0] is not None
+
+    def get(self, chave, omissao=None):
+        linha = self._localizar(chave, hash_chave(chave))[0]
+        return omissao if linha is None else self._livro(linha)
+
+    def acrescentar(self, chave, livro):
+        """Acrescenta o livro se a chave ainda não existir. Devolve False se já existir."""
+        h = hash_chave(chave)
+        linha, posicao = self._localizar(chave, h)
+        if linha is not None:
+            return False
+        self._nova_linha(h, posicao, livro)
+        return True
+
+    def __setitem__(self, chave, livro):
+        h = hash_chave(chave)
+        linha, posicao = self._localizar(chave, h)
+        if linha is None:
+            self._nova_linha(h, posicao, livro)
+        elif linha < self._linhas_base:
+            if self._nome_base(linha) != livro.nome:
+                self._nomes_base[linha] = livro.nome
+            self._autor_base[linha] = self._id_autor(livro.autor)
+            self._preco_base[linha] = livro.preco
+        else:
+            linha -= self._linhas_base
+            autor = self._id_autor(livro.autor)
+            if self._nome(linha) != livro.nome:
+                # Nome com outra grafia: o novo vai para o fim do bytearray (recuperado ao reempacotar)
+                inicio = len(self._nomes)
+                self._nomes += livro.nome.encode("utf-8")
+                self._inicio_nome[linha] = inicio
+                self._tamanho_nome[linha] = len(self._nomes) - inicio
+            self._autor[linha] = autor
+            self._preco[linha] = livro.preco
+
+    def _nova_linha(self, h, posicao, livro):
+        self._indice[posicao] = len(self._autor)
+        dados = livro.nome.encode("utf-8")
+        self._inicio_nome.append(len(self._nomes))
+        self._tamanho_nome.append(len(dados))
+        self._nomes += dados
+        self._autor.append(self._id_autor(livro.autor))
+        self._preco.append(livro.preco)
+        self._hash.append(h)
+        self._vivos += 1
+        if len(self._autor) * 3 > len(self._indice) * 2:
+            if len(self._autor) - self._vivos > self._vivos:
+                self.reempacotar()
+            else:
+                self._criar_indice(len(self._autor) * 2)
+
+    def pop(self, chave, omissao=None):
+        linha = self._localizar(chave, hash_chave(chave))[0]
+        if linha is None:
+            return omissao
+        livro = self._livro(linha)
+        if linha < self._linhas_base:
+            # As linhas do snapshot só desaparecem na próxima compactação do catálogo
+            self._autor_base[linha] = MORTO
+            self._vivos_base -= 1
+            return livro
+        self._autor[linha - self._linhas_base] = MORTO
+        self._vivos -= 1
+        mortos = len(self._autor) - self._vivos
+        if mortos >= REEMPACOTAR_MINIMO and mortos > len(self._autor) * REEMPACOTAR_FRACAO:
+            self.reempacotar()
+        return livro
+
+    def values(self):
+        if self._base is not None:
+            yield from self._valores_base()
+        nomes, inicios, tamanhos, precos = self._nomes, self._inicio_nome, self._tamanho_nome, self._preco
+        autores, autores_base, nome_autor = self._autores, self._autores_base, self._nome_autor
+        for linha, autor in enumerate(self._autor):
+            if autor != MORTO:
+                inicio = inicios[linha]
+                yield Livro(nomes[inicio:inicio + tamanhos[linha]].decode("utf-8"),
+                            autores[autor - autores_base] if autor >= autores_base else nome_autor(autor),
+                            precos[linha])
+
+    def _valores_base(self):
+        nomes, inicios, precos, alterados = self._base.nomes, self._base.inicio_nome, self._preco_base, self._nomes_base
+        autores = {}  # autores já descodificados
+        for linha, autor in enumerate(self._autor_base):
+            if autor != MORTO:
+                nome_autor = autores.get(autor)
+                if nome_autor is None:
+                    nome_autor = autores[autor] = self._nome_autor(autor)
+                nome = alterados.get(linha) if alterados else None
+                if nome is None:
+                    nome = str(nomes[inicios[linha]:inicios[linha + 1]], "utf-8")
+                yield Livro(nome, nome_autor, precos[linha])
+
+    def items(self):
+        for livro in self.values():
+            yield normalizar_nome(livro.nome), livro
+
+    # Manutenção
+    def reempacotar(self):
+        """Remove as linhas eliminadas, os nomes e os autores que já não são usados.
+
+        Só reempacota as colunas próprias: as linhas do snapshot binário são
+        removidas pela compactação do catálogo.
+        """
+        livros = list(self.values() if self._base is None else self._copia_propria().values())
+        autores, indice_autor = self._autores, self._indice_autor
+        self._criar_colunas()
+        if self._base is not None:
+            # As linhas do snapshot atualizadas podem usar os autores próprios
+            self._autores, self._indice_autor = autores, indice_autor
+        self._criar_indice(len(livros))
+        for livro in livros:
+            self[normalizar_nome(livro.nome)] = livro
+
+    def copia(self):
+        """Cópia das colunas (sem o índice por nome), para percorrer fora do lock com values().
+
+        Do snapshot binário só são copiadas as colunas que mudam (autor e preco).
+        """
+        copia = self._copia_propria()
+        if self._base is not None:
+            copia._base = self._base
+            copia._linhas_base, copia._vivos_base = self._linhas_base, self._vivos_base
+            copia._nomes_base = dict(self._nomes_base)
+            copia._autor_base = memoryview(self._autor_base.tobytes()).cast("I")
+            copia._preco_base = memoryview(self._preco_base.tobytes()).cast("d")
+        return copia
+
+    def _copia_propria(self):
+        """Como copia(), mas só com as linhas das colunas próprias."""
+        copia = TabelaLivros.__new__(TabelaLivros)
+        copia._base = None
+        copia._linhas_base = copia._vivos_base = 0
+        copia._nomes_base = {}
+        copia._autores_base = self._autores_base
+        copia._nomes = bytes(self._nomes)
+        copia._inicio_nome = self._inicio_nome[:]
+        copia._tamanho_nome = self._tamanho_nome[:]
+        copia._autor = self._autor[:]
+        copia._preco = self._preco[:]
+        copia._autores = list(self._autores)
+        copia._vivos = self._vivos
+        return copia
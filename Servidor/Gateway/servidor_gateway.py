@@ -0,0 +1,72 @@
+# Servidor unificado: os quatro protocolos num só processo
+#
+# Alternativa aos quatro contentores separados para máquinas pequenas. As
+# aplicações Flask do REST (/REST), SOAP (/soap) e GraphQL (/graphql) ficam
+# atrás de uma só aplicação WSGI e o LivroService gRPC corre no mesmo processo,
+# na sua porta. Há um único catálogo em memória (obter_catalogo), por isso as
+# escritas feitas por um protocolo ficam logo visíveis nos outros, sem passar
+# pelo ficheiro, e as caches de todos são invalidadas pelos mesmos ouvintes.
+#
+# O gunicorn corre com um só processo de trabalho (gthread): mais processos
+# voltariam a ter um catálogo cada um e disputariam a porta do gRPC.
+import os
+import sys
+
+# Módulos dos servidores e partilhados (no Docker são todos copiados para /app)
+_pasta = os.path.dirname(os.path.abspath(__file__))
+for _servidor in ("Comum", "Rest", "Soap", "graphQL", "gRPC"):
+    sys.path.append(os.path.join(_pasta, "..", _servidor))
+
+from flask import Flask
+
+import servidor_GraphQL
+import servidor_Grpc
+import servidor_REST
+import servidor_soap
+from armazenamento import obter_catalogo
+from metricas import instrumentar_flask
+from servidor_wsgi import servir_app
+
+# Configuração (variáveis de ambiente)
+GATEWAY_PORTA = int(os.environ.get("GATEWAY_PORTA", "8080"))
+
+
+class EncaminhadorProtocolos:
+    """Middleware WSGI que entrega cada pedido à aplicação do primeiro segmento do caminho.
+
+    Ao contrário do DispatcherMiddleware do werkzeug, o prefixo não é retirado
+    do caminho: as rotas das aplicações já o incluem (por exemplo '/REST/lote').
+    """
+
+    def __init__(self, omissao, aplicacoes):
+        self.omissao = omissao
+        self.aplicacoes = aplicacoes  # primeiro segmento do caminho -> aplicação WSGI
+
+    def __call__(self, environ, start_response):
+        segmento = environ.get("PATH_INFO", "").lstrip("/").split("/", 1)[0]
+        return self.aplicacoes.get(segmento, self.omissao)(environ, start_response)
+
+
+# Os restantes caminhos (/metrics e 404) são servidos pela aplicação do gateway.
+# As métricas são as do processo, comuns aos quatro protocolos.
+app = Flask(__name__)
+instrumentar_flask(app)
+app.wsgi_app = EncaminhadorProtocolos(app.wsgi_app, {
+    "REST": servidor_REST.app,
+    "soap": servidor_soap.app,
+    "graphql": servidor_GraphQL.app,
+})
+
+_servidor_grpc = None
+
+
+def inicializar():
+    """Abre o catálogo e inicia o gRPC no processo que serve os pedidos."""
+    global _servidor_grpc
+    obter_catalogo()
+    _servidor_grpc = servidor_Grpc.iniciar_em_segundo_plano()
+
+
+# Inicialização do servidor
+if __name__ == "__main__":
+    servir_app(app, GATEWAY_PORTA, inicializar=inicializar, processos=1, classe="gthread")
@@ -1,13 +1,40 @@
 # Importação das bibliotecas necessárias
+import base64
+import binascii
+import codecs
+import json
 import os
-import xml.etree.ElementTree as ET
-from flask import Flask, request, jsonify
+import re
+import sys
+import threading
+import zlib
+from urllib.parse import urlencode
+from flask import Flask, Response, request, jsonify
 from flask_restful import Api, Resource
-from jsonschema import validate, ValidationError
+from flask_restful.representations.json import output_json
+from jsonschema import validators
+from jsonschema.exceptions import best_match
+
+try:
+    import brotli
+except ImportError:  # sem brotli as respostas só são comprimidas com gzip
+    brotli = None
+
+# Módulos partilhados entre os servidores (no Docker são copiados para /app)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comum"))
+from alteracoes import assinar
+from armazenamento import obter_catalogo
+from indices import obter_indice, obter_indice_pesquisa
+from metricas import cronometrar, etapa, instrumentar_flask
+from servidor_wsgi import WSGI_CLASSE, WSGI_LIGACOES, WSGI_THREADS, servir_app
 
 # Configuração inicial do Flask e Flask-RESTful
 app = Flask(__name__)
 api = Api(app)
+instrumentar_flask(app)  # Métricas dos pedidos e rota /metrics
+
+# Serialização das respostas JSON, medida como etapa das métricas
+api.representation("application/json")(cronometrar(output_json, "serializar"))
 
 # Definição do schema JSON para validação de entrada
 book_schema = {
@@ -20,54 +47,533 @@ book_schema = {
     "required": ["nome", "autor", "preco"]
 }
 
-# Configuração do caminho do arquivo XML
-XML_FILE_PATH = "/data/livros.xml"
+# Validador compilado uma única vez (o schema é verificado aqui e não em cada registo)
+_ValidadorLivro = validators.validator_for(book_schema)
+_ValidadorLivro.check_schema(book_schema)
+validador_livro = _ValidadorLivro(book_schema)
+
+# Caminho rápido: função Python gerada a partir do schema (desativável com VALIDACAO_RAPIDA=0)
+_VERIFICACOES_TIPO = {
+    "string": "not isinstance(v, str)",
+    "number": "type(v) is bool or not isinstance(v, (int, float))",
+    "integer": "type(v) is bool or not (isinstance(v, int) or (isinstance(v, float) and v.is_integer()))",
+    "boolean": "type(v) is not bool",
+}
+
+def compilar_validador_rapido(schema):
+    """Gera uma função que devolve True se a instância for válida.
+
+    Só suporta objetos com "properties" tipadas e "required"; para outros
+    schemas devolve None e a validação fica toda a cargo do jsonschema.
+    """
+    if schema.get("type") != "object" or set(schema) - {"type", "properties", "required", "title", "description"}:
+        return None
+    linhas = ["def valido(instancia):", "    if not isinstance(instancia, dict):", "        return False"]
+    for campo in schema.get("required", []):
+        linhas += [f"    if {campo!r} not in instancia:", "        return False"]
+    for campo, definicao in schema.get("properties", {}).items():
+        if set(definicao) - {"type", "description"} or definicao.get("type") not in _VERIFICACOES_TIPO:
+            return None
+        linhas += [
+            f"    v = instancia.get({campo!r}, _AUSENTE)",
+            f"    if v is not _AUSENTE and ({_VERIFICACOES_TIPO[definicao['type']]}):",
+            "        return False",
+        ]
+    linhas.append("    return True")
+    ambiente = {"_AUSENTE": object()}
+    exec(compile("\n".join(linhas), "<validador_rapido>", "exec"), ambiente)
+    return ambiente["valido"]
+
+validar_rapido = compilar_validador_rapido(book_schema) if os.environ.get("VALIDACAO_RAPIDA", "1") != "0" else None
+
+def validar_livro(livro):
+    """Devolve a mensagem de erro de validação do livro, ou None se for válido.
 
-# Funções auxiliares para manipulação do XML
-def inicializar_xml():
-    """Cria o diretório e o arquivo XML com a raiz <livros> se não existirem."""
-    xml_dir = os.path.dirname(XML_FILE_PATH)
-    os.makedirs(xml_dir, exist_ok=True)
-    if not os.path.exists(XML_FILE_PATH):
-        root = ET.Element("livros")
-        tree = ET.ElementTree(root)
-        tree.write(XML_FILE_PATH, encoding="utf-8", xml_declaration=True)
+    Os pedidos válidos passam só pelo caminho rápido; o jsonschema só é usado
+    para descrever o erro quando o caminho rápido rejeita o registo.
+    """
+    if validar_rapido is not None and validar_rapido(livro):
+        return None
+    falha = best_match(validador_livro.iter_errors(livro))
+    return None if falha is None else falha.message
 
+# Funções auxiliares para manipulação do catálogo
 def adicionar_livro_xml(nome, autor, preco):
-    """Adiciona um novo livro ao arquivo XML."""
-    inicializar_xml()
-    tree = ET.parse(XML_FILE_PATH)
-    root = tree.getroot()
-    
-    # Criação da estrutura do elemento livro
-    livro_elem = ET.Element("livro")
-    ET.SubElement(livro_elem, "nome").text = nome
-    ET.SubElement(livro_elem, "autor").text = autor
-    ET.SubElement(livro_elem, "preco").text = str(preco)
-    root.append(livro_elem)
-    tree.write(XML_FILE_PATH, encoding="utf-8", xml_declaration=True)
+    """Adiciona um novo livro ao catálogo. Devolve False se o nome já existir."""
+    return obter_catalogo().inserir(nome, autor, preco)
+
+# Leitura em streaming do corpo dos pedidos em lote
+TAMANHO_BLOCO = 64 * 1024
+TAMANHO_MAX_REGISTO = 1024 * 1024
+_ESPACOS = re.compile(r"[ \t\r\n]*")
+
+def _ler_blocos(stream):
+    """Lê o corpo do pedido em blocos de tamanho fixo."""
+    return iter(lambda: stream.read(TAMANHO_BLOCO), b"")
+
+def _registos_ndjson(blocos):
+    """Gera (registo, erro) para cada linha de um corpo NDJSON."""
+    resto = b""
+    descartar = False  # a linha atual excedeu o tamanho máximo
+    for bloco in blocos:
+        linhas = (resto + bloco).split(b"\n")
+        resto = linhas.pop()
+        for linha in linhas:
+            if descartar:
+                descartar = False
+                yield None, "Registo demasiado grande."
+            elif linha.strip():
+                yield _descodificar_linha(linha)
+        if len(resto) > TAMANHO_MAX_REGISTO:
+            resto, descartar = b"", True
+    if descartar:
+        yield None, "Registo demasiado grande."
+    elif resto.strip():
+        yield _descodificar_linha(resto)
+
+def _descodificar_linha(linha):
+    """Converte uma linha NDJSON em (registo, erro)."""
+    try:
+        return json.loads(linha), None
+    except ValueError as e:
+        return None, f"JSON inválido: {e}"
+
+def _registos_array(blocos):
+    """Gera (registo, None) para cada elemento de um array JSON, sem ler o corpo inteiro.
+
+    Um erro de sintaxe no array impede a leitura do resto e é lançado como ValueError.
+    """
+    descodificador = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    texto, pos, terminado = "", 0, False
+    estado = "inicio"  # inicio -> valor -> separador -> ... -> fim
+
+    while True:
+        pos = _ESPACOS.match(texto, pos).end()
+        if pos == len(texto):
+            if terminado:
+                break
+            bloco = next(blocos, b"")
+            terminado = not bloco
+            texto, pos = texto[pos:] + utf8.decode(bloco, final=terminado), 0
+            continue
+
+        if estado == "inicio":
+            if texto[pos] != "[":
+                raise ValueError("Esperado um array JSON.")
+            pos, estado = pos + 1, "primeiro"
+        elif estado in ("primeiro", "valor"):
+            if estado == "primeiro" and texto[pos] == "]":
+                pos, estado = pos + 1, "fim"
+                continue
+            try:
+                valor, fim = descodificador.raw_decode(texto, pos)
+                completo = fim < len(texto) or terminado
+            except json.JSONDecodeError:
+                if terminado:
+                    raise ValueError("JSON inválido no array.")
+                completo = False
+            if not completo:
+                # O elemento pode continuar no próximo bloco
+                if len(texto) - pos > TAMANHO_MAX_REGISTO:
+                    raise ValueError("Registo demasiado grande.")
+                bloco = next(blocos, b"")
+                terminado = not bloco
+                texto, pos = texto[pos:] + utf8.decode(bloco, final=terminado), 0
+                continue
+            pos, estado = fim, "separador"
+            yield valor, None
+        elif estado == "separador":
+            if texto[pos] == ",":
+                estado = "valor"
+            elif texto[pos] == "]":
+                estado = "fim"
+            else:
+                raise ValueError("Esperado ',' ou ']' no array.")
+            pos += 1
+        else:
+            raise ValueError("Conteúdo após o fim do array.")
+
+    if estado != "fim":
+        raise ValueError("Array JSON incompleto.")
+
+def ler_registos_lote(stream):
+    """Gera (registo, erro) a partir de um array JSON ou de NDJSON, conforme o primeiro carácter."""
+    blocos = _ler_blocos(stream)
+    primeiro = b""
+    for bloco in blocos:
+        primeiro = bloco
+        if bloco.strip():
+            break
+    if not primeiro.strip():
+        return iter(())
+
+    def com_primeiro():
+        yield primeiro
+        yield from blocos
+
+    if primeiro.lstrip()[:1] == b"[":
+        return _registos_array(com_primeiro())
+    return _registos_ndjson(com_primeiro())
+
+# Leitura do catálogo (GET /REST e GET /REST/livros/<nome>)
+CAMPOS_LIVRO = ("nome", "autor", "preco")
+LIMITE_LISTAGEM_OMISSAO = 100
+LIMITE_LISTAGEM_MAXIMO = int(os.environ.get("REST_LISTAGEM_MAXIMO", "10000"))  # livros por página
+LISTAGEM_STREAMING = int(os.environ.get("REST_LISTAGEM_STREAMING", "1000"))  # páginas maiores vão em blocos
+COMPRIMIR_MINIMO = int(os.environ.get("REST_COMPRIMIR_MINIMO", "1024"))  # bytes
+LIVROS_POR_BLOCO = 500
+# Compressões aceites, por ordem de preferência para a mesma qualidade no Accept-Encoding
+CODIFICACOES = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def codificar_cursor(chave):
+    """O cursor é o nome normalizado do último livro da página, opaco para o cliente."""
+    return base64.urlsafe_b64encode(chave.encode("utf-8")).decode("ascii")
+
+def descodificar_cursor(cursor):
+    """Inverso de codificar_cursor: só aceita cursores que ele possa ter gerado."""
+    try:
+        chave = base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Cursor inválido.")
+    # Recusa também o que b64decode aceita mas codificar_cursor nunca gera ("+", "/", bits no fim)
+    if codificar_cursor(chave) != cursor:
+        raise ValueError("Cursor inválido.")
+    return chave
+
+def campos_pedidos(args):
+    """Campos a devolver de cada livro (parâmetro campos, separados por vírgulas)."""
+    valor = args.get("campos")
+    if not valor:
+        return CAMPOS_LIVRO
+    campos = tuple(campo.strip() for campo in valor.split(",") if campo.strip())
+    desconhecidos = [campo for campo in campos if campo not in CAMPOS_LIVRO]
+    if desconhecidos or not campos:
+        raise ValueError(f"campos só pode ter {', '.join(CAMPOS_LIVRO)}.")
+    return campos
+
+def parametros_listagem(args):
+    """Converte a query string nos argumentos de IndiceLivros.pagina.
+
+    Lança ValueError com a mensagem a devolver ao cliente se algum for inválido.
+    """
+    parametros = {"autor": args.get("autor") or None}
+    for campo in ("preco_min", "preco_max"):
+        valor = args.get(campo)
+        try:
+            parametros[campo] = float(valor) if valor not in (None, "") else None
+        except ValueError:
+            raise ValueError(f"{campo} tem de ser um número.")
+    if (parametros["preco_min"] is not None and parametros["preco_max"] is not None
+            and parametros["preco_min"] > parametros["preco_max"]):
+        raise ValueError("preco_min não pode ser maior que preco_max.")
+    try:
+        limite = int(args.get("limite") or LIMITE_LISTAGEM_OMISSAO)
+    except ValueError:
+        raise ValueError("limite tem de ser um número inteiro.")
+    if limite < 0:
+        raise ValueError("limite não pode ser negativo.")
+    parametros["quantidade"] = min(limite or LIMITE_LISTAGEM_OMISSAO, LIMITE_LISTAGEM_MAXIMO)
+    parametros["depois"] = descodificar_cursor(args["depois"]) if args.get("depois") else None
+    return parametros
+
+def blocos_listagem(livros, campos, ha_mais, seguinte):
+    """Gera o JSON da página em blocos de LIVROS_POR_BLOCO livros (bytes UTF-8)."""
+    texto = '{"livros": ['
+    inicio = 0
+    while True:
+        with etapa("serializar"):
+            fim = min(inicio + LIVROS_POR_BLOCO, len(livros))
+            partes = [json.dumps({campo: getattr(livro, campo) for campo in campos}, ensure_ascii=False)
+                      for livro in livros[inicio:fim]]
+            texto += ("," if inicio and partes else "") + ",".join(partes)
+            if fim == len(livros):
+                texto += f'], "ha_mais": {json.dumps(ha_mais)}, "seguinte": {json.dumps(seguinte)}}}'
+        yield texto.encode("utf-8")
+        if fim == len(livros):
+            return
+        inicio, texto = fim, ""
+
+def comprimir_blocos(blocos, codificacao):
+    """Comprime os blocos à medida que são gerados ("gzip" ou "br")."""
+    if codificacao == "br":
+        compressor = brotli.Compressor()
+        comprimir, terminar = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = cabeçalho gzip
+        comprimir, terminar = compressor.compress, compressor.flush
+    for bloco in blocos:
+        dados = comprimir(bloco)
+        if dados:
+            yield dados
+    yield terminar()
+
+def cabecalhos_leitura(etag):
+    # no-cache: as caches podem guardar a resposta, mas revalidam-na sempre com If-None-Match
+    return {"ETag": f'"{etag}"', "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+
+def resposta_leitura(blocos, etag, codificacao, em_blocos, cabecalhos=None):
+    """Resposta JSON de um GET, comprimida se o cliente aceitar e valer a pena.
+
+    Com em_blocos o corpo é enviado à medida que é gerado (chunked) e nunca
+    está inteiro em memória; caso contrário só é comprimido a partir de
+    COMPRIMIR_MINIMO bytes.
+    """
+    cabecalhos = {**cabecalhos_leitura(etag), **(cabecalhos or {})}
+    if em_blocos:
+        corpo = blocos
+    else:
+        corpo = b"".join(blocos)
+        if len(corpo) < COMPRIMIR_MINIMO:
+            codificacao = None
+    if codificacao:
+        cabecalhos["Content-Encoding"] = codificacao
+        corpo = comprimir_blocos([corpo] if isinstance(corpo, bytes) else corpo, codificacao)
+        if not em_blocos:
+            corpo = b"".join(corpo)
+    return Response(corpo, mimetype="application/json", headers=cabecalhos)
 
 # Definição do recurso RESTful para operações com livros
 class LivroResource(Resource):
-    def post(self):
+    def get(self, nome=None):
+        """
+        GET /REST lista o catálogo por ordem do nome, em páginas de `limite`
+        livros a seguir ao cursor `depois` (o `seguinte` da página anterior),
+        com filtros opcionais por autor e preço (preco_min, preco_max).
+        GET /REST/livros/<nome> devolve um livro. Em ambos, `campos` escolhe os
+        campos devolvidos.
+
+        O ETag vem da versão do catálogo (identidade do ficheiro e seq): com
+        If-None-Match igual a resposta é 304, sem consultar nem serializar os livros.
+        """
+        try:
+            campos = campos_pedidos(request.args)
+            parametros = parametros_listagem(request.args) if nome is None else None
+        except ValueError as e:
+            return {"erro": str(e)}, 400
+        try:
+            codificacao = request.accept_encodings.best_match(CODIFICACOES)
+            # A versão é lida antes dos livros: a resposta pode ser mais recente que o
+            # ETag (o cliente só perde um 304), mas nunca mais antiga
+            catalogo = obter_catalogo()
+            versao = catalogo.versao()
+            etag = f"{versao}-{codificacao}" if codificacao else versao
+            if request.if_none_match.contains_weak(etag):
+                return Response(status=304, headers=cabecalhos_leitura(etag))
+
+            if nome is not None:
+                with etapa("procurar"):
+                    livro = catalogo.procurar(nome, sincronizar=False)
+                if livro is None:
+                    return {"erro": "Livro não encontrado."}, 404
+                with etapa("serializar"):
+                    corpo = json.dumps({campo: getattr(livro, campo) for campo in campos}, ensure_ascii=False)
+                return resposta_leitura([corpo.encode("utf-8")], etag, codificacao, em_blocos=False)
+
+            pagina, ha_mais = obter_indice().pagina(**parametros)
+            seguinte = codificar_cursor(pagina[-1][0]) if ha_mais else None
+            cabecalhos = {}
+            if seguinte is not None:
+                args = {**request.args.to_dict(), "depois": seguinte}
+                cabecalhos["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+            livros = [livro for _, livro in pagina]
+            return resposta_leitura(blocos_listagem(livros, campos, ha_mais, seguinte), etag, codificacao,
+                                    em_blocos=len(livros) > LISTAGEM_STREAMING, cabecalhos=cabecalhos)
+        except Exception as e:
+            return {"erro": f"Erro inesperado: {str(e)}"}, 500
+
+    def post(self, nome=None):
         """
         POST para inserir um novo livro.
-        Valida o JSON com JSON Schema e salva no XML.
+        Valida o JSON com JSON Schema e salva no catálogo.
         """
+        if nome is not None:
+            return {"erro": "Use POST /REST para inserir livros."}, 405
         try:
-            livro = request.json
-            validate(instance=livro, schema=book_schema)
-            adicionar_livro_xml(livro["nome"], livro["autor"], livro["preco"])
+            with etapa("ler_pedido"):
+                livro = request.json
+            with etapa("validar"):
+                erro = validar_livro(livro)
+            if erro is not None:
+                return {"erro": f"Erro de validação: {erro}"}, 400
+            if not adicionar_livro_xml(livro["nome"], livro["autor"], livro["preco"]):
+                return {"erro": "Já existe um livro com esse nome."}, 409
             return {"mensagem": "Livro inserido com sucesso!"}, 201
-        except ValidationError as e:
-            return {"erro": f"Erro de validação: {e.message}"}, 400
         except Exception as e:
             return {"erro": f"Erro inesperado: {str(e)}"}, 500
 
-# Registro do recurso na API
-api.add_resource(LivroResource, '/REST')
+# Definição do recurso RESTful para inserções em lote
+# Livros gravados em cada escrita do POST /REST/lote: a memória do pedido não cresce com o corpo
+LOTE_ESCRITA = int(os.environ.get("REST_LOTE_ESCRITA", "10000"))
+
+class LivroLoteResource(Resource):
+    def post(self):
+        """
+        POST para inserir vários livros de uma vez (array JSON ou NDJSON).
+        O corpo é lido em streaming e cada registo é validado à medida que chega;
+        os válidos são gravados em escritas de LOTE_ESCRITA livros, cada uma
+        numa transação. Os erros são devolvidos por registo sem abortar o lote.
+        """
+        operacoes, indices, erros = [], [], []
+        inseridos = 0
+        indice = -1
+        registos = enumerate(ler_registos_lote(request.stream))
+        try:
+            fim = False
+            while not fim:
+                # Leitura e validação em streaming até LOTE_ESCRITA livros válidos,
+                # medidas em conjunto como uma etapa (a escrita tem as suas)
+                with etapa("ler_pedido"):
+                    try:
+                        for indice, (livro, erro) in registos:
+                            if erro is None:
+                                erro = validar_livro(livro)
+                                if erro is not None:
+                                    erro = f"Erro de validação: {erro}"
+                            if erro is not None:
+                                erros.append({"indice": indice, "erro": erro})
+                                continue
+                            operacoes.append(("inserir", livro["nome"], livro["autor"], livro["preco"]))
+                            indices.append(indice)
+                            if len(operacoes) >= LOTE_ESCRITA:
+                                break
+                        else:
+                            fim = True
+                    except ValueError as e:
+                        # Erro de sintaxe no array: os registos anteriores continuam a ser gravados
+                        erros.append({"indice": indice + 1, "erro": f"Corpo inválido: {e}"})
+                        fim = True
+
+                if operacoes:
+                    resultados = obter_catalogo().aplicar(operacoes)
+                    for posicao, inserido in zip(indices, resultados):
+                        if not inserido:
+                            erros.append({"indice": posicao, "erro": "Já existe um livro com esse nome."})
+                    inseridos += sum(resultados)
+                    operacoes, indices = [], []
+            erros.sort(key=lambda e: e["indice"])
+            return {"inseridos": inseridos, "erros": erros}, 200
+        except Exception as e:
+            # As escritas anteriores ao erro já ficaram gravadas
+            return {"erro": f"Erro inesperado: {str(e)}", "inseridos": inseridos}, 500
+
+# Número de resultados da pesquisa
+LIMITE_PESQUISA_OMISSAO = 20
+LIMITE_PESQUISA_MAXIMO = 100
+
+def parametros_pesquisa(args):
+    """Converte os parâmetros da query string nos argumentos de IndicePesquisa.pesquisar.
+
+    Lança ValueError com a mensagem a devolver ao cliente se algum for inválido.
+    """
+    parametros = {"texto": args.get("q", "")}
+    for campo in ("preco_min", "preco_max"):
+        valor = args.get(campo)
+        try:
+            parametros[campo] = float(valor) if valor not in (None, "") else None
+        except ValueError:
+            raise ValueError(f"{campo} tem de ser um número.")
+    if (parametros["preco_min"] is not None and parametros["preco_max"] is not None
+            and parametros["preco_min"] > parametros["preco_max"]):
+        raise ValueError("preco_min não pode ser maior que preco_max.")
+    try:
+        limite = int(args.get("limite") or LIMITE_PESQUISA_OMISSAO)
+    except ValueError:
+        raise ValueError("limite tem de ser um número inteiro.")
+    if limite < 0:
+        raise ValueError("limite não pode ser negativo.")
+    parametros["limite"] = min(limite or LIMITE_PESQUISA_OMISSAO, LIMITE_PESQUISA_MAXIMO)
+    return parametros
+
+# Definição do recurso RESTful para a pesquisa por texto e preço
+class PesquisaResource(Resource):
+    def get(self):
+        """
+        GET para pesquisar livros por palavras do título e do autor (q) e por
+        intervalo de preço (preco_min, preco_max), usando os índices em memória.
+        Os resultados vêm por ordem de preço, no máximo `limite`.
+        """
+        try:
+            parametros = parametros_pesquisa(request.args)
+        except ValueError as e:
+            return {"erro": str(e)}, 400
+        try:
+            livros, ha_mais = obter_indice_pesquisa().pesquisar(**parametros)
+            return {"livros": [livro._asdict() for livro in livros], "ha_mais": ha_mais}, 200
+        except Exception as e:
+            return {"erro": f"Erro inesperado: {str(e)}"}, 500
+
+# Feed de alterações em Server-Sent Events
+TAMANHO_BLOCO_SSE = 64 * 1024  # o catálogo inteiro (depois de "reinicio") é enviado em blocos
+# Assinantes SSE em simultâneo por processo. Com gthread cada um ocupa uma thread
+# enquanto está ligado: por omissão fica pelo menos metade das threads para os
+# restantes pedidos. Acima do limite a resposta é 503 e o EventSource volta a tentar.
+SSE_MAXIMO = int(os.environ.get("REST_SSE_MAXIMO", str(
+    max(1, (WSGI_LIGACOES if WSGI_CLASSE == "gevent" else WSGI_THREADS) // 2))))
+_assinantes_sse = threading.BoundedSemaphore(SSE_MAXIMO)
+
+def evento_sse(alteracao, com_id):
+    """Formata uma alteração como evento SSE (event: op, data: JSON)."""
+    dados = {campo: valor for campo, valor in alteracao._asdict().items() if valor is not None}
+    linhas = [f"id: {alteracao.seq}"] if com_id else []
+    linhas += [f"event: {alteracao.op}", f"data: {json.dumps(dados, ensure_ascii=False)}", "", ""]
+    return "\n".join(linhas)
+
+def eventos_sse(desde_seq):
+    """Gera o corpo da resposta SSE a partir do feed de alterações.
+
+    Os livros enviados depois de "reinicio" não levam id: se a ligação cair
+    a meio, o EventSource volta a pedir a partir do id anterior e recebe o
+    catálogo de novo. Sem alterações é enviado um comentário de keep-alive.
+    """
+    yield "retry: 3000\n\n"
+    bloco, tamanho, no_instantaneo = [], 0, False
+    for alteracao in assinar(desde_seq):
+        if alteracao is None:
+            yield ": keep-alive\n\n"
+            continue
+        if alteracao.op == "reinicio":
+            no_instantaneo = True
+        elif alteracao.op == "atualizado":
+            no_instantaneo = False
+        evento = evento_sse(alteracao, com_id=not no_instantaneo and alteracao.op != "reinicio")
+        bloco.append(evento)
+        tamanho += len(evento)
+        if not no_instantaneo or tamanho >= TAMANHO_BLOCO_SSE:
+            yield "".join(bloco)
+            bloco, tamanho = [], 0
+
+# Definição do recurso do feed de alterações (SSE)
+class AlteracoesResource(Resource):
+    def get(self):
+        """
+        GET em Server-Sent Events com as alterações ao catálogo feitas em
+        qualquer servidor, a seguir a desde_seq (ou ao cabeçalho Last-Event-ID
+        enviado pelo EventSource ao voltar a ligar). Sem nenhum dos dois, começa
+        pelo catálogo inteiro.
+        """
+        valor = request.headers.get("Last-Event-ID") or request.args.get("desde_seq")
+        try:
+            desde_seq = int(valor) if valor else None
+        except ValueError:
+            return {"erro": "desde_seq tem de ser um número inteiro."}, 400
+        if not _assinantes_sse.acquire(blocking=False):
+            return ({"erro": "Demasiados assinantes ligados; tente mais tarde."}, 503,
+                    {"Retry-After": "5"})
+        resposta = Response(eventos_sse(desde_seq), mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        # O lugar é libertado quando a resposta é fechada, também se o cliente desligar
+        resposta.call_on_close(_assinantes_sse.release)
+        return resposta
+
+# Registro dos recursos na API
+# Os livros têm um prefixo próprio: qualquer nome ("lote", "pesquisa", ...) é acessível
+api.add_resource(LivroResource, '/REST', '/REST/livros/<path:nome>')
+api.add_resource(LivroLoteResource, '/REST/lote')
+api.add_resource(PesquisaResource, '/REST/pesquisa')
+api.add_resource(AlteracoesResource, '/REST/alteracoes')
 
 # Inicialização do servidor
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    servir_app(app, 5000, inicializar=obter_catalogo)
 
@@ -1,101 +1,321 @@
 # Importação das bibliotecas necessárias
 import os
+import sys
 import xml.etree.ElementTree as ET
+from xml.parsers import expat
+from xml.sax.saxutils import escape
 from flask import Flask, request, Response
 
+# Módulos partilhados entre os servidores (no Docker são copiados para /app)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comum"))
+from armazenamento import obter_catalogo
+from metricas import etapa, instrumentar_flask
+from servidor_wsgi import servir_app
+
 # Inicialização do Flask
 app = Flask(__name__)
+instrumentar_flask(app)  # Métricas dos pedidos e rota /metrics
 
-# Configuração do caminho do arquivo XML
-XML_FILE_PATH = "/data/livros.xml"
-
-# Funções auxiliares para manipulação do XML
-def inicializar_xml():
-    xml_dir = os.path.dirname(XML_FILE_PATH)
-    os.makedirs(xml_dir, exist_ok=True)
-    if not os.path.exists(XML_FILE_PATH):
-        root = ET.Element("livros")
-        tree = ET.ElementTree(root)
-        tree.write(XML_FILE_PATH, encoding="utf-8", xml_declaration=True)
-
+# Funções auxiliares para manipulação do catálogo
 def atualizar_livro_xml(nome, novo_autor=None, novo_preco=None):
 
-    #Atualiza o autor e/ou preço do livro identificado pelo nome no arquivo XML.
+    #Atualiza o autor e/ou preço do livro identificado pelo nome no catálogo.
     #Retorna True se o livro for encontrado.
 
-    inicializar_xml()
-    tree = ET.parse(XML_FILE_PATH)
-    root = tree.getroot()
-    updated = False
-
-    # Busca e atualiza o livro
-    for livro in root.findall("livro"):
-        if livro.findtext("nome", "").strip().lower() == nome.strip().lower():
-            if novo_autor:
-                livro.find("autor").text = novo_autor
-            if novo_preco is not None:
-                livro.find("preco").text = str(novo_preco)
-            updated = True
-            break
-
-    # Salva as alterações se houve atualização
-    if updated:
-        tree.write(XML_FILE_PATH, encoding="utf-8", xml_declaration=True)
-    return updated
+    return obter_catalogo().atualizar(nome, novo_autor, novo_preco)
+
+def atualizar_livros_xml(atualizacoes):
+    """Aplica várias atualizações (nome, autor, preco) numa só escrita no catálogo.
+    Devolve uma lista de booleanos (livro encontrado) pela mesma ordem."""
+    return obter_catalogo().aplicar(
+        ("atualizar", nome, autor, preco) for nome, autor, preco in atualizacoes
+    )
+
+# Limites dos pedidos SOAP (protegem o servidor de envelopes grandes ou maliciosos)
+SOAP_TAMANHO_MAXIMO = int(os.environ.get("SOAP_TAMANHO_MAXIMO", str(8 * 1024 * 1024)))  # bytes
+SOAP_PROFUNDIDADE_MAXIMA = int(os.environ.get("SOAP_PROFUNDIDADE_MAXIMA", "16"))
+TAMANHO_BLOCO = 64 * 1024
+
+# Campos reconhecidos num LivroUpdateRequest
+CAMPOS_ATUALIZACAO = ("nome", "autor", "preco")
+
+class PedidoDemasiadoGrande(ValueError):
+    """O envelope excede SOAP_TAMANHO_MAXIMO."""
+
+def ler_envelope(stream):
+    """Lê um envelope SOAP em streaming (expat) e devolve (pedidos, em_lote).
+
+    `pedidos` são os LivroUpdateRequest do Body, diretamente no Body ou dentro
+    de um LivroBatchUpdateRequest, e `em_lote` indica se o pedido é um lote
+    (o invólucro ou mais de um LivroUpdateRequest).
+
+    Não é construída nenhuma árvore: só são guardados os campos de cada pedido,
+    como dicionários {campo: texto}. Os elementos são reconhecidos pelo nome
+    local, com ou sem namespace (por exemplo soapenv:Envelope). Pedidos com
+    DOCTYPE (e por isso entidades) são rejeitados.
+    """
+    parser = expat.ParserCreate(namespace_separator=" ")
+    pilha = []  # nomes locais dos elementos abertos
+    estado = {"body": False, "lote": False, "pedido": None, "nivel": 0, "campo": None}
+    pedidos = []
+    texto = []
+
+    def inicio(nome, atributos):
+        local = nome.rpartition(" ")[2]
+        pilha.append(local)
+        profundidade = len(pilha)
+        if profundidade > SOAP_PROFUNDIDADE_MAXIMA:
+            raise ValueError("Envelope com demasiados níveis.")
+        if profundidade == 1:
+            if local != "Envelope":
+                raise ValueError("Elemento Envelope não encontrado.")
+        elif profundidade == 2:
+            estado["body"] = estado["body"] or local == "Body"
+        elif pilha[1] != "Body":
+            return
+        elif estado["pedido"] is not None:
+            if profundidade == estado["nivel"] + 1 and local in CAMPOS_ATUALIZACAO:
+                estado["campo"] = local
+                texto.clear()
+        elif local == "LivroUpdateRequest" and (
+            profundidade == 3 or (profundidade == 4 and pilha[2] == "LivroBatchUpdateRequest")
+        ):
+            estado["pedido"], estado["nivel"] = {}, profundidade
+        elif profundidade == 3 and local == "LivroBatchUpdateRequest":
+            estado["lote"] = True
+
+    def fim(nome):
+        profundidade = len(pilha)
+        pilha.pop()
+        if estado["pedido"] is None:
+            return
+        if estado["campo"] is not None and profundidade == estado["nivel"] + 1:
+            estado["pedido"].setdefault(estado["campo"], "".join(texto))
+            estado["campo"] = None
+        elif profundidade == estado["nivel"]:
+            pedidos.append(estado["pedido"])
+            estado["pedido"] = None
+
+    def caracteres(dados):
+        if estado["campo"] is not None:
+            texto.append(dados)
+
+    def doctype(*args):
+        raise ValueError("DOCTYPE não é permitido em pedidos SOAP.")
+
+    parser.StartElementHandler = inicio
+    parser.EndElementHandler = fim
+    parser.CharacterDataHandler = caracteres
+    parser.StartDoctypeDeclHandler = doctype
+
+    try:
+        lidos = 0
+        for bloco in iter(lambda: stream.read(TAMANHO_BLOCO), b""):
+            lidos += len(bloco)
+            if lidos > SOAP_TAMANHO_MAXIMO:
+                raise PedidoDemasiadoGrande("Pedido SOAP demasiado grande.")
+            parser.Parse(bloco, False)
+        parser.Parse(b"", True)
+    except expat.ExpatError as e:
+        raise ValueError(f"XML inválido: {expat.ErrorString(e.code)} (linha {e.lineno}, coluna {e.offset}).")
+
+    if not estado["body"]:
+        raise ValueError("Elemento Body não encontrado.")
+    if not pedidos:
+        raise ValueError("Operação não reconhecida. Use LivroUpdateRequest para atualizar.")
+    return pedidos, estado["lote"] or len(pedidos) > 1
+
+def validar_atualizacao(campos):
+    """Converte os campos de um LivroUpdateRequest em (nome, autor, preco).
+    Lança ValueError se os dados forem insuficientes ou o preço não for um número."""
+    nome = campos.get("nome", "").strip()
+    novo_autor = campos.get("autor", "").strip() or None
+    novo_preco_text = campos.get("preco", "").strip()
+    try:
+        novo_preco = float(novo_preco_text) if novo_preco_text else None
+    except ValueError:
+        raise ValueError(f"Preço inválido: {novo_preco_text}")
+    if not nome or (not novo_autor and novo_preco is None):
+        raise ValueError("Dados insuficientes para atualização via SOAP.")
+    return nome, novo_autor, novo_preco
+
+# Respostas pré-codificadas: só o texto das falhas é escapado e inserido em cada pedido
+def _envelope(corpo):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+        f"<soapenv:Body>{corpo}</soapenv:Body></soapenv:Envelope>"
+    ).encode("utf-8")
+
+RESPOSTA_ATUALIZADO = _envelope(
+    "<LivroUpdateResponse><mensagem>Livro atualizado com sucesso!</mensagem></LivroUpdateResponse>"
+)
+_LOTE_INICIO, _LOTE_FIM = _envelope("<LivroUpdateResponse>\0</resultados></LivroUpdateResponse>").split(b"\0")
+_RESULTADO = b"<resultado><indice>%d</indice><nome>%s</nome><estado>%s</estado></resultado>"
+_RESULTADO_ERRO = b"<resultado><indice>%d</indice><nome>%s</nome><estado>%s</estado><erro>%s</erro></resultado>"
+
+def resposta_lote(resultados):
+    """Resposta a um lote com o estado de cada LivroUpdateRequest, pela ordem do pedido.
+
+    `resultados` são tuplos (nome, estado, erro), com estado "atualizado",
+    "nao_encontrado" ou "invalido" e erro None ou a mensagem de validação.
+    """
+    atualizados = sum(estado == "atualizado" for _, estado, _ in resultados)
+    partes = [
+        _LOTE_INICIO,
+        f"<mensagem>{atualizados} de {len(resultados)} livro(s) atualizado(s).</mensagem><resultados>".encode(),
+    ]
+    for indice, (nome, estado, erro) in enumerate(resultados):
+        nome = escape(nome).encode("utf-8")
+        if erro is None:
+            partes.append(_RESULTADO % (indice, nome, estado.encode()))
+        else:
+            partes.append(_RESULTADO_ERRO % (indice, nome, estado.encode(), escape(erro).encode("utf-8")))
+    partes.append(_LOTE_FIM)
+    return Response(b"".join(partes), mimetype="text/xml")
+
+_FALHAS = {
+    codigo: tuple(_envelope(
+        f"<soapenv:Fault><faultcode>soapenv:{codigo}</faultcode><faultstring>\0</faultstring></soapenv:Fault>"
+    ).split(b"\0"))
+    for codigo in ("Client", "Server")
+}
+
+def resposta_falha(mensagem, status=400, codigo="Client"):
+    """Resposta SOAP Fault com a mensagem escapada."""
+    antes, depois = _FALHAS[codigo]
+    return Response(antes + escape(mensagem).encode("utf-8") + depois, status=status, mimetype="text/xml")
 
 # Endpoint SOAP para processamento das requisições
 @app.route('/soap', methods=['POST'])
 def soap_service():
-    xml_request = request.data.decode('utf-8')
     try:
+        # Rejeita logo os pedidos que anunciam um corpo acima do limite
+        if request.content_length is not None and request.content_length > SOAP_TAMANHO_MAXIMO:
+            raise PedidoDemasiadoGrande("Pedido SOAP demasiado grande.")
+
         # Processamento da requisição SOAP
-        root_req = ET.fromstring(xml_request)
-        body = root_req.find("Body")
-        if body is None:
-            raise ValueError("Elemento Body não encontrado.")
-
-        # Processamento da atualização do livro
-        livro_update = body.find("LivroUpdateRequest")
-        if livro_update is not None:
-            # Extração dos dados da requisição
-            nome = livro_update.findtext("nome")
-            novo_autor = livro_update.findtext("autor")
-            novo_preco_text = livro_update.findtext("preco")
-            novo_preco = float(novo_preco_text) if novo_preco_text else None
-
-            # Validação dos dados
-            if not nome or (not novo_autor and novo_preco is None):
-                raise ValueError("Dados insuficientes para atualização via SOAP.")
-
-            # Atualização do livro e geração da resposta
-            if atualizar_livro_xml(nome, novo_autor, novo_preco):
-                response_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-                    <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
-                        <soapenv:Body>
-                            <LivroUpdateResponse>
-                                <mensagem>Livro atualizado com sucesso!</mensagem>
-                            </LivroUpdateResponse>
-                        </soapenv:Body>
-                    </soapenv:Envelope>"""
-                return Response(response_xml, mimetype="text/xml")
-            else:
-                raise ValueError("Livro não encontrado para atualização.")
-        else:
-            raise ValueError("Operação não reconhecida. Use LivroUpdateRequest para atualizar.")
+        with etapa("ler_pedido"):
+            pedidos, em_lote = ler_envelope(request.stream)
+        if em_lote:
+            return atualizar_lote(pedidos)
+
+        # Extração e validação dos dados da requisição
+        with etapa("validar"):
+            nome, novo_autor, novo_preco = validar_atualizacao(pedidos[0])
+
+        # Atualização do livro e geração da resposta
+        if atualizar_livro_xml(nome, novo_autor, novo_preco):
+            return Response(RESPOSTA_ATUALIZADO, mimetype="text/xml")
+        raise ValueError("Livro não encontrado para atualização.")
 
     # Tratamento de erros e geração da mensagem de falha
+    except PedidoDemasiadoGrande as e:
+        return resposta_falha(str(e), status=413)
+    except ValueError as e:
+        return resposta_falha(str(e))
     except Exception as e:
-        fault_xml = f"""<?xml version="1.0" encoding="UTF-8"?>
-            <soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">
-                <soapenv:Body>
-                    <soapenv:Fault>
-                        <faultcode>SOAP-ENV:Client</faultcode>
-                        <faultstring>{str(e)}</faultstring>
-                    </soapenv:Fault>
-                </soapenv:Body>
-            </soapenv:Envelope>"""
-        return Response(fault_xml, status=400, mimetype="text/xml")
+        return resposta_falha(f"Erro inesperado: {str(e)}", status=500, codigo="Server")
+
+def atualizar_lote(pedidos):
+    """Valida cada pedido do lote e aplica os válidos numa só passagem e escrita.
+    Os pedidos inválidos ou sem livro não impedem a atualização dos restantes."""
+    resultados = []
+    atualizacoes, posicoes = [], []
+    with etapa("validar"):
+        for campos in pedidos:
+            try:
+                atualizacao = validar_atualizacao(campos)
+            except ValueError as e:
+                resultados.append((campos.get("nome", "").strip(), "invalido", str(e)))
+                continue
+            posicoes.append(len(resultados))
+            atualizacoes.append(atualizacao)
+            resultados.append((atualizacao[0], None, None))
+
+    encontrados = atualizar_livros_xml(atualizacoes) if atualizacoes else []
+    for posicao, encontrado in zip(posicoes, encontrados):
+        nome = resultados[posicao][0]
+        resultados[posicao] = (nome, "atualizado", None) if encontrado else (nome, "nao_encontrado", None)
+    with etapa("serializar"):
+        return resposta_lote(resultados)
+
+# Descrição WSDL do serviço, gerada a partir das operações suportadas
+NAMESPACE_LIVROS = "urn:livros"
+OPERACOES_SOAP = (
+    # (operação, elemento do pedido, elemento da resposta, descrição)
+    ("AtualizarLivro", "LivroUpdateRequest", "LivroUpdateResponse", "Atualiza o autor e/ou preço de um livro."),
+    ("AtualizarLivros", "LivroBatchUpdateRequest", "LivroUpdateResponse",
+     "Atualiza vários livros numa só escrita e devolve o estado de cada um."),
+)
+
+def gerar_wsdl(endereco):
+    """Gera o WSDL 1.1 (document/literal) do serviço para o endereço indicado."""
+    wsdl, xsd, soap = ("http://schemas.xmlsoap.org/wsdl/", "http://www.w3.org/2001/XMLSchema",
+                       "http://schemas.xmlsoap.org/wsdl/soap/")
+    ET.register_namespace("wsdl", wsdl)
+    ET.register_namespace("xsd", xsd)
+    ET.register_namespace("soap", soap)
+    w = lambda tag: f"{{{wsdl}}}{tag}"
+    x = lambda tag: f"{{{xsd}}}{tag}"
+    sp = lambda tag: f"{{{soap}}}{tag}"
+
+    raiz = ET.Element(w("definitions"), name="LivroService", targetNamespace=NAMESPACE_LIVROS)
+    # O prefixo tns só aparece em valores de atributos, por isso é declarado à mão
+    raiz.set("xmlns:tns", NAMESPACE_LIVROS)
+    esquema = ET.SubElement(ET.SubElement(raiz, w("types")), x("schema"),
+                            targetNamespace=NAMESPACE_LIVROS, elementFormDefault="unqualified")
+
+    def tipo(campos, nome=None, elemento=None):
+        """Tipo complexo com uma sequência de (campo, tipo, minOccurs, maxOccurs)."""
+        pai = esquema if elemento is None else elemento
+        complexo = ET.SubElement(pai, x("complexType"), name=nome) if nome else ET.SubElement(pai, x("complexType"))
+        seq = ET.SubElement(complexo, x("sequence"))
+        for campo, tipo_campo, minimo, maximo in campos:
+            ET.SubElement(seq, x("element"), name=campo, type=tipo_campo, minOccurs=minimo, maxOccurs=maximo)
+
+    tipo([("nome", "xsd:string", "1", "1"), ("autor", "xsd:string", "0", "1"), ("preco", "xsd:double", "0", "1")],
+         nome="LivroUpdate")
+    tipo([("indice", "xsd:int", "1", "1"), ("nome", "xsd:string", "1", "1"),
+          ("estado", "xsd:string", "1", "1"), ("erro", "xsd:string", "0", "1")], nome="Resultado")
+    tipo([("resultado", "tns:Resultado", "0", "unbounded")], nome="Resultados")
+    ET.SubElement(esquema, x("element"), name="LivroUpdateRequest", type="tns:LivroUpdate")
+    tipo([("LivroUpdateRequest", "tns:LivroUpdate", "1", "unbounded")],
+         elemento=ET.SubElement(esquema, x("element"), name="LivroBatchUpdateRequest"))
+    tipo([("mensagem", "xsd:string", "1", "1"), ("resultados", "tns:Resultados", "0", "1")],
+         elemento=ET.SubElement(esquema, x("element"), name="LivroUpdateResponse"))
+
+    elementos = sorted({e for _, pedido, resposta, _ in OPERACOES_SOAP for e in (pedido, resposta)})
+    for elemento in elementos:
+        ET.SubElement(ET.SubElement(raiz, w("message"), name=elemento), w("part"),
+                      name="parameters", element=f"tns:{elemento}")
+
+    tipo_porta = ET.SubElement(raiz, w("portType"), name="LivroServicePortType")
+    ligacao = ET.SubElement(raiz, w("binding"), name="LivroServiceBinding", type="tns:LivroServicePortType")
+    ET.SubElement(ligacao, sp("binding"), style="document", transport="http://schemas.xmlsoap.org/soap/http")
+    for operacao, pedido, resposta, descricao in OPERACOES_SOAP:
+        op = ET.SubElement(tipo_porta, w("operation"), name=operacao)
+        ET.SubElement(op, w("documentation")).text = descricao
+        ET.SubElement(op, w("input"), message=f"tns:{pedido}")
+        ET.SubElement(op, w("output"), message=f"tns:{resposta}")
+        op = ET.SubElement(ligacao, w("operation"), name=operacao)
+        ET.SubElement(op, sp("operation"), soapAction=f"{NAMESPACE_LIVROS}#{operacao}")
+        for sentido in ("input", "output"):
+            ET.SubElement(ET.SubElement(op, w(sentido)), sp("body"), use="literal")
+
+    porta = ET.SubElement(ET.SubElement(raiz, w("service"), name="LivroService"), w("port"),
+                          name="LivroServicePort", binding="tns:LivroServiceBinding")
+    ET.SubElement(porta, sp("address"), location=endereco)
+    return ET.tostring(raiz, encoding="utf-8", xml_declaration=True)
+
+@app.route('/soap', methods=['GET'])
+def soap_wsdl():
+    """GET /soap?wsdl devolve a descrição WSDL do serviço."""
+    if "wsdl" not in request.args:
+        return resposta_falha("Use POST para pedidos SOAP ou GET /soap?wsdl para o WSDL.", status=405)
+    return Response(gerar_wsdl(request.base_url), mimetype="text/xml")
 
 # Inicialização do servidor
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    # O modo debug só se aplica ao servidor de desenvolvimento (SERVIDOR_MODO=desenvolvimento)
+    servir_app(app, 8000, inicializar=obter_catalogo, debug=True)
@@ -39,6 +39,36 @@ class LivroServiceStub(object):
                 request_serializer=livro__pb2.LivroRequest.SerializeToString,
                 response_deserializer=livro__pb2.LivroResponse.FromString,
                 _registered_method=True)
+        self.ProcurarLivros = channel.unary_unary(
+                '/LivroService/ProcurarLivros',
+                request_serializer=livro__pb2.LivrosRequest.SerializeToString,
+                response_deserializer=livro__pb2.LivrosResponse.FromString,
+                _registered_method=True)
+        self.ListarLivros = channel.unary_stream(
+                '/LivroService/ListarLivros',
+                request_serializer=livro__pb2.ListarLivrosRequest.SerializeToString,
+                response_deserializer=livro__pb2.LivrosPagina.FromString,
+                _registered_method=True)
+        self.ProcurarLivrosStream = channel.stream_stream(
+                '/LivroService/ProcurarLivrosStream',
+                request_serializer=livro__pb2.LivroRequest.SerializeToString,
+                response_deserializer=livro__pb2.LivroResultado.FromString,
+                _registered_method=True)
+        self.EstatisticasCache = channel.unary_unary(
+                '/LivroService/EstatisticasCache',
+                request_serializer=livro__pb2.EstatisticasCacheRequest.SerializeToString,
+                response_deserializer=livro__pb2.EstatisticasCacheResponse.FromString,
+                _registered_method=True)
+        self.PesquisarLivros = channel.unary_unary(
+                '/LivroService/PesquisarLivros',
+                request_serializer=livro__pb2.PesquisaRequest.SerializeToString,
+                response_deserializer=livro__pb2.PesquisaResponse.FromString,
+                _registered_method=True)
+        self.AssinarAlteracoes = channel.unary_stream(
+                '/LivroService/AssinarAlteracoes',
+                request_serializer=livro__pb2.AssinarAlteracoesRequest.SerializeToString,
+                response_deserializer=livro__pb2.Alteracao.FromString,
+                _registered_method=True)
 
 
 class LivroServiceServicer(object):
@@ -50,6 +80,48 @@ class LivroServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ProcurarLivros(self, request, context):
+        """Procura vários livros de uma vez (um resultado por nome, pela mesma ordem)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ListarLivros(self, request, context):
+        """Lista o catálogo em páginas, com filtros opcionais por autor e preço
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def ProcurarLivrosStream(self, request_iterator, context):
+        """Pesquisas em pipeline: um resultado por cada pedido recebido
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def EstatisticasCache(self, request, context):
+        """Contadores da cache de respostas de ProcurarLivro (do processo que responde)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def PesquisarLivros(self, request, context):
+        """Pesquisa por palavras (ou inícios de palavras) do título e do autor e por intervalo de preço
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def AssinarAlteracoes(self, request, context):
+        """Alterações ao catálogo, por ordem de seq, à medida que acontecem em qualquer servidor
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_LivroServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -58,6 +130,36 @@ def add_LivroServiceServicer_to_server(servicer, server):
                     request_deserializer=livro__pb2.LivroRequest.FromString,
                     response_serializer=livro__pb2.LivroResponse.SerializeToString,
             ),
+            'ProcurarLivros': grpc.unary_unary_rpc_method_handler(
+                    servicer.ProcurarLivros,
+                    request_deserializer=livro__pb2.LivrosRequest.FromString,
+                    response_serializer=livro__pb2.LivrosResponse.SerializeToString,
+            ),
+            'ListarLivros': grpc.unary_stream_rpc_method_handler(
+                    servicer.ListarLivros,
+                    request_deserializer=livro__pb2.ListarLivrosRequest.FromString,
+                    response_serializer=livro__pb2.LivrosPagina.SerializeToString,
+            ),
+            'ProcurarLivrosStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.ProcurarLivrosStream,
+                    request_deserializer=livro__pb2.LivroRequest.FromString,
+                    response_serializer=livro__pb2.LivroResultado.SerializeToString,
+            ),
+            'EstatisticasCache': grpc.unary_unary_rpc_method_handler(
+                    servicer.EstatisticasCache,
+                    request_deserializer=livro__pb2.EstatisticasCacheRequest.FromString,
+                    response_serializer=livro__pb2.EstatisticasCacheResponse.SerializeToString,
+            ),
+            'PesquisarLivros': grpc.unary_unary_rpc_method_handler(
+                    servicer.PesquisarLivros,
+                    request_deserializer=livro__pb2.PesquisaRequest.FromString,
+                    response_serializer=livro__pb2.PesquisaResponse.SerializeToString,
+            ),
+            'AssinarAlteracoes': grpc.unary_stream_rpc_method_handler(
+                    servicer.AssinarAlteracoes,
+                    request_deserializer=livro__pb2.AssinarAlteracoesRequest.FromString,
+                    response_serializer=livro__pb2.Alteracao.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'LivroService', rpc_method_handlers)
@@ -95,3 +197,165 @@ class LivroService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ProcurarLivros(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/LivroService/ProcurarLivros',
+            livro__pb2.LivrosRequest.SerializeToString,
+            livro__pb2.LivrosResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ListarLivros(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/LivroService/ListarLivros',
+            livro__pb2.ListarLivrosRequest.SerializeToString,
+            livro__pb2.LivrosPagina.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def ProcurarLivrosStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/LivroService/ProcurarLivrosStream',
+            livro__pb2.LivroRequest.SerializeToString,
+            livro__pb2.LivroResultado.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def EstatisticasCache(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/LivroService/EstatisticasCache',
+            livro__pb2.EstatisticasCacheRequest.SerializeToString,
+            livro__pb2.EstatisticasCacheResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def PesquisarLivros(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/LivroService/PesquisarLivros',
+            livro__pb2.PesquisaRequest.SerializeToString,
+            livro__pb2.PesquisaResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def AssinarAlteracoes(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/LivroService/AssinarAlteracoes',
+            livro__pb2.AssinarAlteracoesRequest.SerializeToString,
+            livro__pb2.Alteracao.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
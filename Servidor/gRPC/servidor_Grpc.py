@@ -1,52 +1,573 @@
 # Importação das bibliotecas necessárias
 from concurrent import futures
+import asyncio
+import gc
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import threading
+import time
 import grpc
 import livro_pb2
 import livro_pb2_grpc
-import xml.etree.ElementTree as ET
+
+# Módulos partilhados entre os servidores (no Docker são copiados para /app)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comum"))
+from alteracoes import assinar, assinar_async
+from armazenamento import normalizar_nome, obter_catalogo
+from cache import AUSENTE, CacheLRU
+from indices import obter_indice_pesquisa
+from metricas import METRICAS, cronometrar, observar_pedido, partilhar, servir_http
+
+# Configuração do servidor (variáveis de ambiente)
+GRPC_ENDERECO = os.environ.get("GRPC_ENDERECO", "[::]:50051")
+GRPC_MODO = os.environ.get("GRPC_MODO", "threads")  # "threads" ou "aio"
+GRPC_TRABALHADORES = int(os.environ.get("GRPC_TRABALHADORES", "10"))
+GRPC_MAX_STREAMS = int(os.environ.get("GRPC_MAX_STREAMS", "0"))  # 0 = valor do gRPC
+GRPC_MAX_MENSAGEM = int(os.environ.get("GRPC_MAX_MENSAGEM", "0"))  # bytes, 0 = valor do gRPC
+GRPC_PROCESSOS = int(os.environ.get("GRPC_PROCESSOS", "1"))  # >1 = vários processos na mesma porta
+GRPC_CACHE_TAMANHO = int(os.environ.get("GRPC_CACHE_TAMANHO", "10000"))  # respostas, 0 = sem cache
+GRPC_CACHE_TTL = float(os.environ.get("GRPC_CACHE_TTL", "60"))  # segundos, 0 = sem limite
+GRPC_METRICAS_PORTA = int(os.environ.get("GRPC_METRICAS_PORTA", "9100"))  # HTTP /metrics, 0 = desligado
+
+# Tamanho das páginas de ListarLivros (livros por mensagem da stream)
+TAMANHO_PAGINA_OMISSAO = 100
+TAMANHO_PAGINA_MAXIMO = 1000
+
+# Número de resultados de PesquisarLivros
+LIMITE_PESQUISA_OMISSAO = 20
+LIMITE_PESQUISA_MAXIMO = 100
+
+def livro_para_resposta(livro):
+    """Converte um Livro do catálogo na mensagem LivroResponse."""
+    return livro_pb2.LivroResponse(nome=livro.nome, autor=livro.autor, preco=livro.preco)
+
+def resultado_pesquisa(nome, livro):
+    """Resultado de uma pesquisa por nome, encontrado ou não."""
+    if livro is None:
+        return livro_pb2.LivroResultado(nome_procurado=nome, encontrado=False)
+    return livro_pb2.LivroResultado(nome_procurado=nome, encontrado=True, livro=livro_para_resposta(livro))
+
+def criar_cache():
+    """Cache das respostas de ProcurarLivro, invalidada pelo catálogo a cada alteração."""
+    cache = CacheLRU(GRPC_CACHE_TAMANHO, GRPC_CACHE_TTL)
+    obter_catalogo().adicionar_ouvinte(cache.invalidar)
+    return cache
+
+def procurar_serializado(cache, catalogo, nome):
+    """Devolve a LivroResponse já serializada do livro, ou None se não existir.
+
+    O catálogo tem de estar sincronizado: é a sincronização que invalida na
+    cache os nomes alterados pelos outros servidores.
+    """
+    chave = normalizar_nome(nome)
+    resposta = cache.obter(chave)
+    if resposta is AUSENTE:
+        geracao = cache.geracao
+        livro = catalogo.procurar(nome, sincronizar=False)
+        resposta = None if livro is None else livro_para_resposta(livro).SerializeToString()
+        cache.guardar(chave, resposta, geracao)
+    return resposta
+
+def estatisticas_cache(cache):
+    return livro_pb2.EstatisticasCacheResponse(**cache.estatisticas())
+
+def filtro_listagem(request):
+    """Cria o filtro de ListarLivros (autor sem distinção de maiúsculas e intervalo de preço)."""
+    autor = request.autor.strip().lower()
+    preco_min = request.preco_min if request.HasField("preco_min") else None
+    preco_max = request.preco_max if request.HasField("preco_max") else None
+    if preco_min is not None and preco_max is not None and preco_min > preco_max:
+        raise ValueError("preco_min não pode ser maior que preco_max.")
+    if not autor and preco_min is None and preco_max is None:
+        return None
+
+    def filtro(livro):
+        if autor and livro.autor.lower() != autor:
+            return False
+        if preco_min is not None and livro.preco < preco_min:
+            return False
+        if preco_max is not None and livro.preco > preco_max:
+            return False
+        return True
+    return filtro
+
+def tamanho_pagina(request):
+    """Livros por mensagem: o pedido é apenas uma sugestão, limitada pelo servidor."""
+    if request.tamanho_pagina < 0:
+        raise ValueError("tamanho_pagina não pode ser negativo.")
+    return min(request.tamanho_pagina or TAMANHO_PAGINA_OMISSAO, TAMANHO_PAGINA_MAXIMO)
+
+def parametros_pesquisa(request):
+    """Converte um PesquisaRequest nos argumentos de IndicePesquisa.pesquisar."""
+    preco_min = request.preco_min if request.HasField("preco_min") else None
+    preco_max = request.preco_max if request.HasField("preco_max") else None
+    if preco_min is not None and preco_max is not None and preco_min > preco_max:
+        raise ValueError("preco_min não pode ser maior que preco_max.")
+    if request.limite < 0:
+        raise ValueError("limite não pode ser negativo.")
+    limite = min(request.limite or LIMITE_PESQUISA_OMISSAO, LIMITE_PESQUISA_MAXIMO)
+    return dict(texto=request.texto, preco_min=preco_min, preco_max=preco_max, limite=limite)
+
+def pesquisar(parametros):
+    """Executa a pesquisa no índice do processo (construído no primeiro pedido)."""
+    livros, ha_mais = obter_indice_pesquisa().pesquisar(**parametros)
+    return livro_pb2.PesquisaResponse(livros=[livro_para_resposta(l) for l in livros], ha_mais=ha_mais)
+
+# Tipos das alterações do feed (ver alteracoes.py) na mensagem Alteracao
+TIPOS_ALTERACAO = {
+    "gravar": livro_pb2.Alteracao.GRAVAR,
+    "eliminar": livro_pb2.Alteracao.ELIMINAR,
+    "reinicio": livro_pb2.Alteracao.REINICIO,
+    "atualizado": livro_pb2.Alteracao.ATUALIZADO,
+}
+
+def alteracao_para_mensagem(alteracao):
+    mensagem = livro_pb2.Alteracao(seq=alteracao.seq, tipo=TIPOS_ALTERACAO[alteracao.op])
+    if alteracao.nome is not None:
+        mensagem.livro.nome = alteracao.nome
+    if alteracao.op == "gravar":
+        mensagem.livro.autor = alteracao.autor
+        mensagem.livro.preco = alteracao.preco
+    return mensagem
+
+def desde_seq(request):
+    return request.desde_seq if request.HasField("desde_seq") else None
 
 # Definição do serviço gRPC para gerenciamento de livros
 class LivroServiceServicer(livro_pb2_grpc.LivroServiceServicer):
-    # Implementação do método de procura de livros
+    def __init__(self):
+        self.cache = criar_cache()
+
+    # Implementação do método de procura de livros (devolve a resposta já serializada)
     def ProcurarLivro(self, request, context):
-        nome_procurado = request.nome.strip().lower()
+        try:
+            # Consulta o catálogo em memória (só relê o disco se este mudou) através da cache
+            catalogo = obter_catalogo()
+            catalogo.sincronizar()
+            resposta = procurar_serializado(self.cache, catalogo, request.nome)
+            if resposta is not None:
+                return resposta
+
+            # Retorna erro se o livro não for encontrado
+            context.set_code(grpc.StatusCode.NOT_FOUND)
+            context.set_details("Livro não encontrado.")
+            return b""
+
+        except Exception as e:
+            # Tratamento de erros durante a leitura do catálogo
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Erro ao ler o catálogo: {str(e)}")
+            return b""
 
+    # Procura de vários livros num só pedido
+    def ProcurarLivros(self, request, context):
         try:
-            # Carrega e processa o XML para mexer nos livros
-            tree = ET.parse("/data/livros.xml")
-            root = tree.getroot()
+            # Todas as pesquisas são feitas sobre o mesmo estado do catálogo
+            livros = obter_catalogo().procurar_varios(request.nomes)
+            return livro_pb2.LivrosResponse(
+                resultados=[resultado_pesquisa(nome, livro) for nome, livro in zip(request.nomes, livros)]
+            )
+        except Exception as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Erro ao ler o catálogo: {str(e)}")
+            return livro_pb2.LivrosResponse()
 
-            # Procura o livro pelo nome
-            for livro in root.findall("livro"):
-                nome = livro.find("nome").text.strip()
-                if nome.lower() == nome_procurado:
-                    autor = livro.find("autor").text.strip()
-                    preco = float(livro.find("preco").text.strip())
-                    return livro_pb2.LivroResponse(nome=nome, autor=autor, preco=preco)
+    # Listagem do catálogo em páginas (server streaming)
+    def ListarLivros(self, request, context):
+        try:
+            filtro = filtro_listagem(request)
+            pagina = tamanho_pagina(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        try:
+            # A listagem é tirada de uma só vez e depois enviada aos poucos
+            livros = obter_catalogo().listar(filtro)
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+        for inicio in range(0, len(livros), pagina):
+            if not context.is_active():
+                return
+            yield livro_pb2.LivrosPagina(livros=[livro_para_resposta(l) for l in livros[inicio:inicio + pagina]])
+
+    # Pesquisas em pipeline (streaming bidirecional)
+    def ProcurarLivrosStream(self, request_iterator, context):
+        catalogo = obter_catalogo()
+        try:
+            for request in request_iterator:
+                yield resultado_pesquisa(request.nome, catalogo.procurar(request.nome))
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+
+    # Contadores da cache de ProcurarLivro
+    def EstatisticasCache(self, request, context):
+        return estatisticas_cache(self.cache)
+
+    # Pesquisa por texto e preço nos índices em memória
+    def PesquisarLivros(self, request, context):
+        try:
+            parametros = parametros_pesquisa(request)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        try:
+            return pesquisar(parametros)
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+
+    # Feed de alterações (server streaming, ocupa uma thread do pool enquanto dura)
+    def AssinarAlteracoes(self, request, context):
+        alteracoes = assinar(desde_seq(request))
+        try:
+            for alteracao in alteracoes:
+                if not context.is_active():
+                    return
+                if alteracao is not None:  # None: sinal de vida, só para verificar a ligação
+                    yield alteracao_para_mensagem(alteracao)
+        except Exception as e:
+            context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+        finally:
+            alteracoes.close()
+
+# Versão assíncrona do serviço para o servidor grpc.aio
+class LivroServiceServicerAsync(livro_pb2_grpc.LivroServiceServicer):
+    def __init__(self):
+        self.cache = criar_cache()
+
+    async def _catalogo(self):
+        """Devolve o catálogo já sincronizado, lendo o disco fora do event loop."""
+        catalogo = obter_catalogo()
+        if catalogo.alterado_em_disco():
+            await asyncio.get_running_loop().run_in_executor(None, catalogo.sincronizar)
+        return catalogo
+
+    async def ProcurarLivro(self, request, context):
+        try:
+            catalogo = await self._catalogo()
+            resposta = procurar_serializado(self.cache, catalogo, request.nome)
+            if resposta is not None:
+                return resposta
 
             # Retorna erro se o livro não for encontrado
             context.set_code(grpc.StatusCode.NOT_FOUND)
             context.set_details("Livro não encontrado.")
-            return livro_pb2.LivroResponse()
+            return b""
 
         except Exception as e:
-            # Tratamento de erros durante a leitura do XML
             context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(f"Erro ao ler o XML: {str(e)}")
-            return livro_pb2.LivroResponse()
+            context.set_details(f"Erro ao ler o catálogo: {str(e)}")
+            return b""
+
+    async def ProcurarLivros(self, request, context):
+        try:
+            catalogo = await self._catalogo()
+            livros = catalogo.procurar_varios(request.nomes, sincronizar=False)
+            return livro_pb2.LivrosResponse(
+                resultados=[resultado_pesquisa(nome, livro) for nome, livro in zip(request.nomes, livros)]
+            )
+        except Exception as e:
+            context.set_code(grpc.StatusCode.INTERNAL)
+            context.set_details(f"Erro ao ler o catálogo: {str(e)}")
+            return livro_pb2.LivrosResponse()
+
+    async def ListarLivros(self, request, context):
+        try:
+            filtro = filtro_listagem(request)
+            pagina = tamanho_pagina(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        try:
+            catalogo = await self._catalogo()
+            # Copiar as colunas e criar os Livro demora com catálogos grandes: fora do ciclo de eventos
+            livros = await asyncio.get_running_loop().run_in_executor(None, catalogo.listar, filtro, False)
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+        for inicio in range(0, len(livros), pagina):
+            yield livro_pb2.LivrosPagina(livros=[livro_para_resposta(l) for l in livros[inicio:inicio + pagina]])
+
+    async def ProcurarLivrosStream(self, request_iterator, context):
+        try:
+            async for request in request_iterator:
+                catalogo = await self._catalogo()
+                yield resultado_pesquisa(request.nome, catalogo.procurar(request.nome, sincronizar=False))
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+
+    async def EstatisticasCache(self, request, context):
+        return estatisticas_cache(self.cache)
+
+    async def PesquisarLivros(self, request, context):
+        try:
+            parametros = parametros_pesquisa(request)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        try:
+            # A sincronização e a construção do índice (no primeiro pedido) leem o disco
+            return await asyncio.get_running_loop().run_in_executor(None, pesquisar, parametros)
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+
+    async def AssinarAlteracoes(self, request, context):
+        try:
+            async for alteracao in assinar_async(desde_seq(request)):
+                if alteracao is not None:
+                    yield alteracao_para_mensagem(alteracao)
+        except Exception as e:
+            await context.abort(grpc.StatusCode.INTERNAL, f"Erro ao ler o catálogo: {str(e)}")
+
+# Registo do serviço com serialização própria para as respostas em cache
+SERIALIZACAO_DIRETA = {"ProcurarLivro"}  # o servicer devolve bytes já serializados
+
+def registar_servico(servicer, server):
+    """Equivalente a add_LivroServiceServicer_to_server, mas os métodos em
+    SERIALIZACAO_DIRETA enviam os bytes devolvidos pelo servicer sem os serializar."""
+    fabricas = {
+        (False, False): grpc.unary_unary_rpc_method_handler,
+        (False, True): grpc.unary_stream_rpc_method_handler,
+        (True, False): grpc.stream_unary_rpc_method_handler,
+        (True, True): grpc.stream_stream_rpc_method_handler,
+    }
+    servico = livro_pb2.DESCRIPTOR.services_by_name["LivroService"]
+    handlers = {}
+    for metodo in servico.methods:
+        pedido = getattr(livro_pb2, metodo.input_type.name)
+        resposta = getattr(livro_pb2, metodo.output_type.name)
+        fabrica = fabricas[(metodo.client_streaming, metodo.server_streaming)]
+        handlers[metodo.name] = fabrica(
+            getattr(servicer, metodo.name),
+            request_deserializer=cronometrar(pedido.FromString, "ler_pedido"),
+            response_serializer=cronometrar((lambda dados: dados) if metodo.name in SERIALIZACAO_DIRETA
+                                            else resposta.SerializeToString, "serializar"),
+        )
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(servico.full_name, handlers),))
+    if hasattr(server, "add_registered_method_handlers"):
+        server.add_registered_method_handlers(servico.full_name, handlers)
+
+# Métricas: interceptores que contam e medem cada RPC por método e código de estado
+def estado_rpc(context, excecao=None):
+    """Código de estado com que o RPC terminou (o definido no contexto, ou o implícito)."""
+    if isinstance(excecao, (GeneratorExit, asyncio.CancelledError)):
+        return "CANCELLED"  # o cliente cancelou ou desligou a meio da stream
+    codigo = context.code()
+    if codigo is None:
+        return "OK" if excecao is None else "UNKNOWN"
+    return codigo.name
+
+def medir_unario(comportamento, operacao):
+    def medido(pedido, context):
+        inicio, excecao = time.perf_counter(), None
+        try:
+            return comportamento(pedido, context)
+        except BaseException as e:
+            excecao = e
+            raise
+        finally:
+            observar_pedido(operacao, estado_rpc(context, excecao), time.perf_counter() - inicio)
+    return medido
+
+def medir_stream(comportamento, operacao):
+    # A duração de uma stream vai até à última mensagem (ou ao cancelamento)
+    def medido(pedido, context):
+        inicio, excecao = time.perf_counter(), None
+        try:
+            yield from comportamento(pedido, context)
+        except BaseException as e:
+            excecao = e
+            raise
+        finally:
+            observar_pedido(operacao, estado_rpc(context, excecao), time.perf_counter() - inicio)
+    return medido
+
+def medir_unario_async(comportamento, operacao):
+    async def medido(pedido, context):
+        inicio, excecao = time.perf_counter(), None
+        try:
+            return await comportamento(pedido, context)
+        except BaseException as e:
+            excecao = e
+            raise
+        finally:
+            observar_pedido(operacao, estado_rpc(context, excecao), time.perf_counter() - inicio)
+    return medido
+
+def medir_stream_async(comportamento, operacao):
+    async def medido(pedido, context):
+        inicio, excecao = time.perf_counter(), None
+        try:
+            async for resposta in comportamento(pedido, context):
+                yield resposta
+        except BaseException as e:
+            excecao = e
+            raise
+        finally:
+            observar_pedido(operacao, estado_rpc(context, excecao), time.perf_counter() - inicio)
+    return medido
+
+def handler_medido(handler, metodo, unario, stream):
+    """Cópia do handler com o comportamento do RPC envolvido pelas funções de medição."""
+    operacao = metodo.rsplit("/", 1)[-1]
+    campos = {}
+    for campo, medir in (("unary_unary", unario), ("stream_unary", unario),
+                         ("unary_stream", stream), ("stream_stream", stream)):
+        comportamento = getattr(handler, campo)
+        if comportamento is not None:
+            campos[campo] = medir(comportamento, operacao)
+    return handler._replace(**campos)
+
+class InterceptorMetricas(grpc.ServerInterceptor):
+    def __init__(self):
+        self._handlers = {}  # método -> (handler original, handler medido)
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        metodo = handler_call_details.method
+        em_cache = self._handlers.get(metodo)
+        if em_cache is None or em_cache[0] is not handler:
+            em_cache = self._handlers[metodo] = (handler, handler_medido(handler, metodo, medir_unario, medir_stream))
+        return em_cache[1]
+
+class InterceptorMetricasAsync(grpc.aio.ServerInterceptor):
+    def __init__(self):
+        self._handlers = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        metodo = handler_call_details.method
+        em_cache = self._handlers.get(metodo)
+        if em_cache is None or em_cache[0] is not handler:
+            em_cache = self._handlers[metodo] = (
+                handler, handler_medido(handler, metodo, medir_unario_async, medir_stream_async))
+        return em_cache[1]
+
+def servir_metricas():
+    """Expõe /metrics por HTTP (o gRPC não serve HTTP/1.1)."""
+    if GRPC_METRICAS_PORTA > 0:
+        servir_http(GRPC_METRICAS_PORTA)
+
+# Opções comuns aos dois modos de servidor
+def opcoes_servidor():
+    # Aceita os pings de keepalive dos clientes com canais de longa duração
+    opcoes = [
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.min_ping_interval_without_data_ms", 30000),
+    ]
+    if GRPC_PROCESSOS > 1:
+        # Todos os processos fazem bind à mesma porta e o kernel distribui as ligações
+        opcoes.append(("grpc.so_reuseport", 1))
+    if GRPC_MAX_STREAMS > 0:
+        opcoes.append(("grpc.max_concurrent_streams", GRPC_MAX_STREAMS))
+    if GRPC_MAX_MENSAGEM > 0:
+        opcoes.append(("grpc.max_send_message_length", GRPC_MAX_MENSAGEM))
+        opcoes.append(("grpc.max_receive_message_length", GRPC_MAX_MENSAGEM))
+    return opcoes
 
 # Configuração e inicialização do servidor gRPC
-def servir():
+def iniciar():
+    """Cria e inicia o servidor com um pool de threads, sem bloquear. Devolve o servidor."""
     # Cria o servidor com um pool de threads
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=GRPC_TRABALHADORES), options=opcoes_servidor(),
+                         interceptors=[InterceptorMetricas()] if METRICAS else [])
     # Registra o serviço no servidor
-    livro_pb2_grpc.add_LivroServiceServicer_to_server(LivroServiceServicer(), server)
+    registar_servico(LivroServiceServicer(), server)
     # Configura a porta de escuta
-    server.add_insecure_port('[::]:50051')
-    # Inicia o servidor e aguarda
+    server.add_insecure_port(GRPC_ENDERECO)
+    # Inicia o servidor
     server.start()
-    server.wait_for_termination()
+    return server
+
+def servir():
+    iniciar().wait_for_termination()
+
+# Configuração e inicialização do servidor gRPC assíncrono (grpc.aio)
+async def servir_aio():
+    loop = asyncio.get_running_loop()
+    # As leituras do disco (sincronizações do catálogo) correm neste pool de threads
+    loop.set_default_executor(futures.ThreadPoolExecutor(max_workers=GRPC_TRABALHADORES))
+    await loop.run_in_executor(None, obter_catalogo)
+
+    server = grpc.aio.server(options=opcoes_servidor(),
+                             interceptors=[InterceptorMetricasAsync()] if METRICAS else [])
+    registar_servico(LivroServiceServicerAsync(), server)
+    server.add_insecure_port(GRPC_ENDERECO)
+    await server.start()
+    await server.wait_for_termination()
+
+# Servidor de um processo, no modo configurado
+def servir_processo():
+    partilhar()  # as métricas deste processo são somadas às dos outros em /metrics
+    if GRPC_MODO == "aio":
+        asyncio.run(servir_aio())
+    else:
+        servir()
+
+def iniciar_em_segundo_plano():
+    """Inicia o servidor no modo configurado sem bloquear a thread atual.
+
+    Usado pelo servidor unificado, em que o gRPC partilha o processo (e o
+    catálogo) com as aplicações Flask. No modo aio o ciclo de eventos corre
+    numa thread própria. Devolve o servidor (ou essa thread): o servidor pára
+    se deixar de ser referido.
+    """
+    if GRPC_MODO == "aio":
+        thread = threading.Thread(target=asyncio.run, args=(servir_aio(),), name="grpc-aio", daemon=True)
+        thread.start()
+        return thread
+    return iniciar()
+
+# Lançador pré-fork: vários processos servidores na mesma porta (SO_REUSEPORT)
+def servir_multiprocesso(processos):
+    # O catálogo é carregado uma vez antes do fork e partilhado em copy-on-write.
+    # Cada processo volta a sincronizar sozinho quando o catálogo muda em disco.
+    # O gRPC não pode ter sido iniciado neste processo antes do fork.
+    obter_catalogo().sincronizar()
+    gc.collect()
+    gc.freeze()  # evita que o GC dos filhos toque (e copie) as páginas do catálogo
+
+    contexto = multiprocessing.get_context("fork")
+    trabalhadores = []
+
+    def trabalhador():
+        # Os sinais de terminação do lançador não se aplicam aos filhos
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        servir_processo()
+
+    def arrancar():
+        processo = contexto.Process(target=trabalhador, daemon=True)
+        processo.start()
+        return processo
+
+    def terminar(signum, frame):
+        for processo in trabalhadores:
+            processo.terminate()
+        for processo in trabalhadores:
+            processo.join()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, terminar)
+    signal.signal(signal.SIGINT, terminar)
+    trabalhadores.extend(arrancar() for _ in range(processos))
+    # As métricas de todos os processos são servidas pelo lançador
+    servir_metricas()
+
+    # Repõe os processos que terminem inesperadamente
+    while True:
+        multiprocessing.connection.wait([p.sentinel for p in trabalhadores])
+        for i, processo in enumerate(trabalhadores):
+            if not processo.is_alive():
+                processo.join()
+                time.sleep(1)
+                trabalhadores[i] = arrancar()
 
 # Ponto de entrada do programa
 if __name__ == "__main__":
-    servir()
+    if GRPC_PROCESSOS > 1:
+        servir_multiprocesso(GRPC_PROCESSOS)
+    else:
+        servir_metricas()
+        servir_processo()
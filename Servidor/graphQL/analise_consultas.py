@@ -0,0 +1,182 @@
+# Preparação dos documentos GraphQL antes da execução
+#
+# - Os documentos são analisados e validados uma só vez e guardados em cache
+#   pelo texto, por isso consultas repetidas não voltam a ser processadas.
+# - Um analisador de custo e profundidade rejeita documentos demasiado caros
+#   (por exemplo a mesma mutação repetida com muitos aliases) antes de executar.
+# - Consultas persistidas: o cliente pode enviar apenas o hash SHA-256 da
+#   consulta (extensions.persistedQuery, como no Apollo) em vez do texto.
+import hashlib
+import json
+import os
+import sys
+from functools import partial
+
+from graphql import GraphQLError
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+from graphql.language import ast
+from graphql.language.parser import parse
+from graphql.validation import validate
+from graphql_server import HttpQueryError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comum"))
+from cache import AUSENTE, CacheLRU
+from metricas import etapa
+
+# Limites (variáveis de ambiente)
+GRAPHQL_CUSTO_MAXIMO = int(os.environ.get("GRAPHQL_CUSTO_MAXIMO", "20000"))
+GRAPHQL_PROFUNDIDADE_MAXIMA = int(os.environ.get("GRAPHQL_PROFUNDIDADE_MAXIMA", "10"))
+GRAPHQL_CACHE_DOCUMENTOS = int(os.environ.get("GRAPHQL_CACHE_DOCUMENTOS", "1000"))
+
+# Modelo de custo: cada campo custa 1, cada campo de uma mutação custa
+# CUSTO_MUTACAO e as listas multiplicam o custo dos campos que contêm.
+CUSTO_MUTACAO = 10
+# Campo -> (argumento com o tamanho da página, valor por omissão, máximo)
+CAMPOS_PAGINADOS = {"livros": ("first", 20, 100)}
+# Mutação em lote -> argumento com a lista de itens (cada item custa 1)
+CAMPOS_LOTE = {"eliminarLivros": "nomes", "inserirLivros": "livros", "atualizarLivros": "livros"}
+
+
+def _valor(valor, variaveis):
+    """Valor Python de um argumento (literal ou variável) usado no cálculo do custo."""
+    if isinstance(valor, ast.Variable):
+        return (variaveis or {}).get(valor.name.value)
+    if isinstance(valor, ast.IntValue):
+        return int(valor.value)
+    if isinstance(valor, ast.ListValue):
+        return valor.values
+    return None
+
+
+def _argumento(campo, nome, variaveis):
+    for argumento in campo.arguments or ():
+        if argumento.name.value == nome:
+            return _valor(argumento.value, variaveis)
+    return None
+
+
+def _selecoes(selection_set, fragmentos):
+    """Campos de um conjunto de seleções, expandindo os fragmentos."""
+    for selecao in selection_set.selections if selection_set else ():
+        if isinstance(selecao, ast.Field):
+            yield selecao
+        elif isinstance(selecao, ast.InlineFragment):
+            yield from _selecoes(selecao.selection_set, fragmentos)
+        elif isinstance(selecao, ast.FragmentSpread) and selecao.name.value in fragmentos:
+            yield from _selecoes(fragmentos[selecao.name.value].selection_set, fragmentos)
+
+
+def _custo(selection_set, fragmentos, variaveis, mutacao=False):
+    total = 0
+    for campo in _selecoes(selection_set, fragmentos):
+        nome = campo.name.value
+        custo = CUSTO_MUTACAO if mutacao else 1
+        multiplicador = 1
+        if nome in CAMPOS_PAGINADOS:
+            argumento, omissao, maximo = CAMPOS_PAGINADOS[nome]
+            pedido = _argumento(campo, argumento, variaveis)
+            multiplicador = min(pedido if isinstance(pedido, int) and pedido >= 0 else omissao, maximo)
+        if mutacao and nome in CAMPOS_LOTE:
+            itens = _argumento(campo, CAMPOS_LOTE[nome], variaveis)
+            custo += len(itens) if isinstance(itens, list) else 1
+        total += custo + multiplicador * _custo(campo.selection_set, fragmentos, variaveis)
+    return total
+
+
+def _profundidade(selection_set, fragmentos):
+    # A introspeção (__schema, __type) tem profundidade limitada pelo próprio schema
+    campos = [c for c in _selecoes(selection_set, fragmentos) if not c.name.value.startswith("__")]
+    return max((1 + _profundidade(c.selection_set, fragmentos) for c in campos), default=0)
+
+
+def _fragmentos(documento):
+    return {d.name.value: d for d in documento.definitions if isinstance(d, ast.FragmentDefinition)}
+
+
+def _operacoes(documento):
+    return [d for d in documento.definitions if isinstance(d, ast.OperationDefinition)]
+
+
+def custo_documento(documento, variaveis=None):
+    """Custo estimado da operação mais cara do documento."""
+    fragmentos = _fragmentos(documento)
+    return max(
+        (_custo(op.selection_set, fragmentos, variaveis, mutacao=op.operation == "mutation")
+         for op in _operacoes(documento)),
+        default=0,
+    )
+
+
+def profundidade_documento(documento):
+    fragmentos = _fragmentos(documento)
+    return max((_profundidade(op.selection_set, fragmentos) for op in _operacoes(documento)), default=0)
+
+
+def _executar_com_limite(schema, documento, *args, **kwargs):
+    """Executa o documento (já validado) se o custo, com as variáveis do pedido, o permitir."""
+    custo = custo_documento(documento, kwargs.get("variable_values"))
+    if custo > GRAPHQL_CUSTO_MAXIMO:
+        erro = GraphQLError(f"Consulta demasiado cara: custo {custo}, máximo {GRAPHQL_CUSTO_MAXIMO}.")
+        return ExecutionResult(errors=[erro], invalid=True)
+    return execute(schema, documento, *args, **kwargs)
+
+
+def _resultado_invalido(erros, *args, **kwargs):
+    return ExecutionResult(errors=erros, invalid=True)
+
+
+class BackendLivros(GraphQLBackend):
+    """Backend do graphql-core com cache de documentos compilados e limites de custo."""
+
+    def __init__(self, capacidade=GRAPHQL_CACHE_DOCUMENTOS):
+        self.documentos = CacheLRU(capacidade)
+
+    def document_from_string(self, schema, texto):
+        documento = self.documentos.obter(texto)
+        if documento is AUSENTE:
+            geracao = self.documentos.geracao
+            with etapa("compilar"):
+                documento = self._compilar(schema, texto)
+            self.documentos.guardar(texto, documento, geracao)
+        return documento
+
+    def _compilar(self, schema, texto):
+        documento = parse(texto)
+        erros = validate(schema, documento)
+        if not erros and profundidade_documento(documento) > GRAPHQL_PROFUNDIDADE_MAXIMA:
+            erros = [GraphQLError(f"Consulta demasiado profunda: máximo {GRAPHQL_PROFUNDIDADE_MAXIMA} níveis.")]
+        executar = partial(_resultado_invalido, erros) if erros else partial(_executar_com_limite, schema, documento)
+        return GraphQLDocument(schema=schema, document_string=texto, document_ast=documento, execute=executar)
+
+
+class ConsultasPersistidas:
+    """Consultas persistidas automaticamente, indexadas pelo hash SHA-256 do texto."""
+
+    def __init__(self, capacidade=GRAPHQL_CACHE_DOCUMENTOS):
+        self.consultas = CacheLRU(capacidade)
+
+    def resolver(self, consulta, extensoes):
+        """Devolve o texto da consulta a executar para o pedido com estas extensões.
+
+        Sem texto, a consulta tem de já ter sido registada; com texto, o hash
+        é verificado e a consulta fica registada para os próximos pedidos.
+        """
+        if isinstance(extensoes, str):
+            try:
+                extensoes = json.loads(extensoes)
+            except ValueError:
+                raise HttpQueryError(400, "Extensões inválidas.")
+        persistida = extensoes.get("persistedQuery") if isinstance(extensoes, dict) else None
+        if not isinstance(persistida, dict) or not isinstance(persistida.get("sha256Hash"), str):
+            return consulta
+        chave = persistida["sha256Hash"].lower()
+        if not consulta:
+            consulta = self.consultas.obter(chave)
+            if consulta is AUSENTE:
+                raise HttpQueryError(400, "PersistedQueryNotFound")
+            return consulta
+        if hashlib.sha256(consulta.encode("utf-8")).hexdigest() != chave:
+            raise HttpQueryError(400, "O hash não corresponde à consulta.")
+        self.consultas.guardar(chave, consulta, self.consultas.geracao)
+        return consulta
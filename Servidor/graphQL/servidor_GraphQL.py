@@ -1,11 +1,115 @@
 # Importação das bibliotecas necessárias
-import xml.etree.ElementTree as ET  # Para manipulação de arquivos XML
-from flask import Flask  # Framework web
+import base64
+import binascii
+import os
+import sys
+from flask import Flask, request  # Framework web
 from flask_graphql import GraphQLView  # Integração GraphQL com Flask
 import graphene  # Framework GraphQL para Python
+from graphene import relay
+from graphql import GraphQLError
+from graphql_server import json_encode  # Serialização das respostas
+from promise import Promise
+from promise.dataloader import DataLoader  # Agrupamento das pesquisas de um pedido
 
-# Configuração do caminho do arquivo XML
-CAMINHO_XML = "/data/livros.xml"
+# Módulos partilhados entre os servidores (no Docker são copiados para /app)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Comum"))
+from armazenamento import normalizar_nome, obter_catalogo  # Catálogo de livros partilhado
+from indices import obter_indice  # Vista ordenada do catálogo para listagens
+from analise_consultas import BackendLivros, ConsultasPersistidas  # Cache, limites e consultas persistidas
+from metricas import cronometrar, etapa, instrumentar_flask  # Métricas dos pedidos e rota /metrics
+from servidor_wsgi import servir_app  # Arranque em produção (gunicorn) ou desenvolvimento
+
+# Tamanho das páginas da listagem de livros
+TAMANHO_PAGINA_OMISSAO = 20
+TAMANHO_PAGINA_MAXIMO = 100
+
+# Definição do tipo de objeto livro para as consultas
+class Livro(graphene.ObjectType):
+    nome = graphene.String()
+    autor = graphene.String()
+    preco = graphene.Float()
+
+# Ligação paginada (edges, pageInfo) da listagem de livros
+class LivroConnection(relay.Connection):
+    class Meta:
+        node = Livro
+
+# Filtros da listagem: autor (sem distinção de maiúsculas) e intervalo de preço
+class FiltroLivros(graphene.InputObjectType):
+    autor = graphene.String()
+    preco_min = graphene.Float()
+    preco_max = graphene.Float()
+
+def codificar_cursor(chave):
+    """O cursor é o nome normalizado do último livro da página, opaco para o cliente."""
+    return base64.urlsafe_b64encode(chave.encode("utf-8")).decode("ascii")
+
+def descodificar_cursor(cursor):
+    """Inverso de codificar_cursor: só aceita cursores que ele possa ter gerado."""
+    try:
+        chave = base64.b64decode(cursor.encode("ascii"), altchars=b"-_", validate=True).decode("utf-8")
+    except (binascii.Error, UnicodeError, ValueError):
+        raise GraphQLError("Cursor inválido.")
+    # Recusa também o que b64decode aceita mas codificar_cursor nunca gera ("+", "/", bits no fim)
+    if codificar_cursor(chave) != cursor:
+        raise GraphQLError("Cursor inválido.")
+    return chave
+
+# Pesquisas por nome agrupadas: uma só consulta ao catálogo por pedido
+class CarregadorLivros(DataLoader):
+    def batch_load_fn(self, chaves):
+        return Promise.resolve(obter_catalogo().procurar_varios(chaves))
+
+# Contexto de cada pedido GraphQL
+class Contexto:
+    def __init__(self, pedido):
+        self.request = pedido
+        self.carregador_livros = CarregadorLivros()
+
+# Consultas
+class Query(graphene.ObjectType):
+    livro = graphene.Field(Livro, nome=graphene.String(required=True))
+    livros = graphene.Field(
+        LivroConnection,
+        filtro=FiltroLivros(),
+        first=graphene.Int(),
+        after=graphene.String(),
+    )
+
+    def resolve_livro(root, info, nome):
+        # Os vários campos livro(...) de um documento são resolvidos com uma só pesquisa
+        return info.context.carregador_livros.load(normalizar_nome(nome))
+
+    def resolve_livros(root, info, filtro=None, first=None, after=None):
+        quantidade = TAMANHO_PAGINA_OMISSAO if first is None else first
+        if quantidade < 0:
+            raise GraphQLError("first não pode ser negativo.")
+        quantidade = min(quantidade, TAMANHO_PAGINA_MAXIMO)
+        filtro = filtro or {}
+        preco_min, preco_max = filtro.get("preco_min"), filtro.get("preco_max")
+        if preco_min is not None and preco_max is not None and preco_min > preco_max:
+            raise GraphQLError("precoMin não pode ser maior que precoMax.")
+
+        livros, ha_mais = obter_indice().pagina(
+            quantidade,
+            depois=descodificar_cursor(after) if after else None,
+            autor=filtro.get("autor"),
+            preco_min=preco_min,
+            preco_max=preco_max,
+        )
+        arestas = [
+            LivroConnection.Edge(node=livro, cursor=codificar_cursor(chave)) for chave, livro in livros
+        ]
+        return LivroConnection(
+            edges=arestas,
+            page_info=relay.PageInfo(
+                has_next_page=ha_mais,
+                has_previous_page=after is not None,
+                start_cursor=arestas[0].cursor if arestas else None,
+                end_cursor=arestas[-1].cursor if arestas else None,
+            ),
+        )
 
 # Definição do tipo de objeto para retorno das operações
 class Resultado(graphene.ObjectType):
@@ -21,45 +125,136 @@ class EliminarLivro(graphene.Mutation):
 
     def mutate(root, info, nome):
         try:
-            # Carrega e processa o XML para mexer nos livros
-            tree = ET.parse(CAMINHO_XML)
-            root_xml = tree.getroot()
-            livros = root_xml.findall("livro")
-
-            # Procura e remove livros com o nome especificado
-            encontrados = 0
-            for livro in livros:
-                if livro.find("nome").text.strip().lower() == nome.strip().lower():
-                    root_xml.remove(livro)
-                    encontrados += 1
-
-            # Salva as alterações e retorna o resultado
-            if encontrados > 0:
-                tree.write(CAMINHO_XML, encoding="utf-8", xml_declaration=True)
-                return Resultado(sucesso=True, mensagem=f"{encontrados} livro(s) removido(s).")
+            # Remove o livro do catálogo (indexado pelo nome normalizado)
+            if obter_catalogo().eliminar(nome):
+                return Resultado(sucesso=True, mensagem="1 livro(s) removido(s).")
             else:
                 return Resultado(sucesso=False, mensagem="Livro não encontrado.")
 
         except Exception as e:
             return Resultado(sucesso=False, mensagem=f"Erro: {str(e)}")
 
+# Resultado de cada item das mutações em lote
+class ResultadoItem(graphene.ObjectType):
+    nome = graphene.String()
+    sucesso = graphene.Boolean()
+    mensagem = graphene.String()
+
+# Resultado das mutações em lote (uma só transação no catálogo)
+class ResultadoLote(graphene.ObjectType):
+    sucesso = graphene.Boolean()  # True se todos os itens foram aplicados
+    mensagem = graphene.String()
+    resultados = graphene.List(ResultadoItem)
+
+# Dados de entrada das mutações em lote
+class LivroInput(graphene.InputObjectType):
+    nome = graphene.String(required=True)
+    autor = graphene.String(required=True)
+    preco = graphene.Float(required=True)
+
+class LivroAtualizacaoInput(graphene.InputObjectType):
+    nome = graphene.String(required=True)
+    autor = graphene.String()
+    preco = graphene.Float()
+
+def aplicar_lote(operacoes, nomes, sucesso, falha, resumo):
+    """Aplica as operações numa só escrita no catálogo e descreve o resultado de cada uma."""
+    try:
+        resultados = obter_catalogo().aplicar(operacoes) if operacoes else []
+    except Exception as e:
+        return ResultadoLote(sucesso=False, mensagem=f"Erro: {str(e)}", resultados=[])
+    itens = [
+        ResultadoItem(nome=nome, sucesso=ok, mensagem=sucesso if ok else falha)
+        for nome, ok in zip(nomes, resultados)
+    ]
+    return ResultadoLote(
+        sucesso=all(resultados),
+        mensagem=resumo.format(sum(resultados)),
+        resultados=itens,
+    )
+
+# Definição das mutações em lote
+class EliminarLivros(graphene.Mutation):
+    class Arguments:
+        nomes = graphene.List(graphene.NonNull(graphene.String), required=True)
+
+    Output = ResultadoLote
+
+    def mutate(root, info, nomes):
+        return aplicar_lote(
+            [("eliminar", nome) for nome in nomes], nomes,
+            "Livro removido.", "Livro não encontrado.", "{} livro(s) removido(s).",
+        )
+
+class InserirLivros(graphene.Mutation):
+    class Arguments:
+        livros = graphene.List(graphene.NonNull(LivroInput), required=True)
+
+    Output = ResultadoLote
+
+    def mutate(root, info, livros):
+        return aplicar_lote(
+            [("inserir", l.nome, l.autor, l.preco) for l in livros], [l.nome for l in livros],
+            "Livro inserido.", "Já existe um livro com esse nome.", "{} livro(s) inserido(s).",
+        )
+
+class AtualizarLivros(graphene.Mutation):
+    class Arguments:
+        livros = graphene.List(graphene.NonNull(LivroAtualizacaoInput), required=True)
+
+    Output = ResultadoLote
+
+    def mutate(root, info, livros):
+        return aplicar_lote(
+            [("atualizar", l.nome, l.autor, l.preco) for l in livros], [l.nome for l in livros],
+            "Livro atualizado.", "Livro não encontrado.", "{} livro(s) atualizado(s).",
+        )
+
 # Configuração do schema GraphQL
 class Mutation(graphene.ObjectType):
     eliminar_livro = EliminarLivro.Field()  # Registro da mutação
+    eliminar_livros = EliminarLivros.Field()
+    inserir_livros = InserirLivros.Field()
+    atualizar_livros = AtualizarLivros.Field()
+
+schema = graphene.Schema(query=Query, mutation=Mutation)
+
+# Consultas persistidas (hash SHA-256 -> texto), partilhadas pelos pedidos do processo
+consultas_persistidas = ConsultasPersistidas()
+
+# Vista GraphQL com um contexto novo (e um DataLoader novo) em cada pedido
+class VistaGraphQL(GraphQLView):
+    # Serialização do resultado em JSON, medida como etapa das métricas
+    encode = staticmethod(cronometrar(json_encode, "serializar"))
+
+    def get_context(self):
+        return Contexto(request)
 
-schema = graphene.Schema(mutation=Mutation)
+    def parse_body(self):
+        with etapa("ler_pedido"):
+            dados = super().parse_body()
+        # Consultas persistidas: o texto pode vir só como hash em extensions
+        if isinstance(dados, dict):
+            extensoes = dados.get("extensions") or request.args.get("extensions")
+            if extensoes:
+                consulta = dados.get("query") or request.args.get("query")
+                dados = dict(dados, query=consultas_persistidas.resolver(consulta, extensoes))
+        return dados
 
 # Configuração do servidor Flask e endpoint GraphQL
 app = Flask(__name__)
 app.add_url_rule(
     "/graphql",
-    view_func=GraphQLView.as_view(
+    view_func=VistaGraphQL.as_view(
         "graphql",
         schema=schema,
+        backend=BackendLivros(),  # Documentos compilados em cache e limites de custo
         graphiql=True  # Habilita interface gráfica para testes
     ),
 )
+instrumentar_flask(app)
 
 # Inicialização do servidor
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=4000)  # Servidor disponível em todas as interfaces na porta 4000
+    # Servidor disponível em todas as interfaces na porta 4000
+    servir_app(app, 4000, inicializar=obter_catalogo)